@@ -37,13 +37,16 @@ setup(
     install_requires=[
         "click>=8.2.1,<9.0.0",
         "requests>=2.32.3,<3.0.0",
+        "httpx>=0.28.1,<1.0.0",
         "urllib3>=2.4.0,<3.0.0",
         "pathspec>=0.12.1,<0.13.0",
         "GitPython>=3.1.44,<4.0.0",
-        "markdown>=3.8,<4.0",
-        "beautifulsoup4>=4.13.4,<5.0",
     ],
 
+    extras_require={
+        "pdf": ["pypdf>=5.0,<7.0"],
+    },
+
     entry_points={
         'console_scripts': [
             "codebuddy=src:cli"
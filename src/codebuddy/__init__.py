@@ -1,27 +1,11 @@
 
-import logging
-
 from .console import cli
-from .modules import config
+from .modules.logs import setup_logging
 
 
 __all__ = [
     'cli'
 ]
 
-# Configuring logging
-handlers = [
-    logging.StreamHandler()
-]
-
-log_file = config.LOGGER.get("log_file")
-if log_file:
-    handlers.append(
-        logging.FileHandler(log_file)
-    )
-
-logging.basicConfig(
-    level=config.LOGGER.get("level"),
-    format=config.LOGGER.get("format"),
-    handlers=handlers
-)
+# Configuring logging, the records are written by a background thread
+setup_logging()
@@ -1,11 +1,10 @@
 
+import os
+import sys
 import click
 import pathlib
 import logging
 
-from .modules import assistant
-from .modules import reports
-from .modules import repository
 from .modules import types
 
 
@@ -23,9 +22,11 @@ logger = logging.getLogger(__name__)
 )
 @click.option(
     "--api",                                # Option to specify the API URL
-    "api_url",                              # Name of the variable to store the API URL
+    "api_url",                              # Name of the variable to store the API URLs
     type=types.APIURL(),                          # Custom type for API URLs
-    help="URL of the language model API."
+    multiple=True,                          # Requests are balanced between several servers
+    help="URL of the language model API, can be repeated to balance requests between servers. "
+         "Append ',weight=W' and ',concurrency=N' to tune a server."
 )
 @click.option(
     "--clone",                              # Option to clone a repository from a URL
@@ -33,6 +34,30 @@ logger = logging.getLogger(__name__)
     type=types.GitURL(),                          # Custom type for Git URLs
     help="Cloning a remote repository before analyzing it."
 )
+@click.option(
+    "--depth",                              # Option to limit the cloned history
+    "clone_depth",                          # Name of the variable to store the number of commits
+    type=click.IntRange(min=1),             # At least one commit must be cloned
+    help="Clone only the given number of latest commits (with --clone)."
+)
+@click.option(
+    "--branch",                             # Option to clone a specific branch, tag or commit
+    "clone_ref",                            # Name of the variable to store the reference
+    metavar="REF",
+    help="Clone and analyze a branch, tag or full commit hash instead of the default branch (with --clone)."
+)
+@click.option(
+    "--blobless",                           # Option to make a partial clone
+    "clone_blobless",                       # Name of the variable to store the flag
+    is_flag=True,                           # This option acts as a boolean flag
+    help="Download the contents of files only when they are checked out (with --clone)."
+)
+@click.option(
+    "--sparse",                             # Option to check out only the reviewed files
+    "clone_sparse",                         # Name of the variable to store the flag
+    is_flag=True,                           # This option acts as a boolean flag
+    help="Check out only files with reviewed extensions (with --clone)."
+)
 @click.option(
     "--reports",                            # Option to specify the directory for storing reports
     "reports_dir",                          # Name of the variable to store the reports directory
@@ -45,99 +70,554 @@ logger = logging.getLogger(__name__)
     is_flag=True,                           # This option acts as a boolean flag
     help="Display all reports in the terminal."
 )
+@click.option(
+    "--jobs",                               # Option to set the number of concurrent reviews
+    "jobs",                                 # Name of the variable to store the number of jobs
+    type=click.IntRange(min=1),             # At least one review must be running
+    default=1,                              # Files are reviewed one by one by default
+    show_default=True,
+    help="Number of files reviewed concurrently."
+)
+@click.option(
+    "--no-cache",                           # Option to disable the review cache
+    "no_cache",                             # Name of the variable to store the flag
+    is_flag=True,                           # This option acts as a boolean flag
+    help="Request all reviews from the API, ignoring cached ones."
+)
+@click.option(
+    "--since",                              # Option to analyze only recently changed files
+    "since",                                # Name of the variable to store the git revision
+    metavar="REV",
+    help="Analyze only files added or modified since the git revision."
+)
+@click.option(
+    "--rev",                                # Option to analyze a revision without checking it out
+    "rev",                                  # Name of the variable to store the git revision
+    metavar="REF",
+    help="Analyze the files of a git revision read from the git objects, without a checkout (works in bare repositories)."
+)
+@click.option(
+    "--stream",                             # Option to stream reviews while they are generated
+    "stream",                               # Name of the variable to store the stream flag
+    is_flag=True,                           # This option acts as a boolean flag
+    help="Receive reviews token by token and write them as they arrive."
+)
+@click.option(
+    "--batch",                              # Option to review several small files in one request
+    "batch",                                # Name of the variable to store the batch flag
+    is_flag=True,                           # This option acts as a boolean flag
+    help="Review several small files of the same category in one request."
+)
+@click.option(
+    "--resume",                             # Option to continue an interrupted analysis
+    "resume",                               # Name of the variable to store the resume flag
+    is_flag=True,                           # This option acts as a boolean flag
+    help="Continue the latest interrupted analysis, reviewing only files missing from its report."
+)
+@click.option(
+    "--metrics",                            # Option to export the metrics of the run
+    "save_metrics",                         # Name of the variable to store the metrics flag
+    is_flag=True,                           # This option acts as a boolean flag
+    help="Save the timing of every stage and the token usage next to the report (JSON and Prometheus)."
+)
+@click.option(
+    "--dedup",                              # Option to skip the reviews of near-duplicate files
+    "dedup",                                # Name of the variable to store the dedup flag
+    is_flag=True,                           # This option acts as a boolean flag
+    help="Review only one of several nearly identical files, the others refer to its review."
+)
+@click.option(
+    "--compact",                            # Option to compact files before reviewing them
+    "compact",                              # Name of the variable to store the compact flag
+    is_flag=True,                           # This option acts as a boolean flag
+    help="Remove license headers, banners, data literals and extra whitespace from files before they are sent, keeping line numbers."
+)
+@click.option(
+    "--plan",                               # Option to estimate the cost of the analysis
+    "plan",                                 # Name of the variable to store the plan flag
+    is_flag=True,                           # This option acts as a boolean flag
+    help="Estimate the tokens, requests and time of the analysis for the number of jobs, then exit without reviewing."
+)
 def cli(
         repository_dir,     # Directory containing the repository
-        api_url,            # URL of the language model API
+        api_url,            # URLs of the language model API
         repository_url,     # URL of the repository to clone
+        clone_depth,        # Number of commits to clone
+        clone_ref,          # Branch, tag or commit to clone
+        clone_blobless,     # Flag to make a partial clone
+        clone_sparse,       # Flag to check out only the reviewed files
         reports_dir,        # Directory to store reports
-        print_reports       # Flag to print reports to the terminal
+        print_reports,      # Flag to print reports to the terminal
+        jobs,               # Number of concurrent reviews
+        no_cache,           # Flag to disable the review cache
+        since,              # Git revision to compare the working tree with
+        rev,                # Git revision to analyze instead of the working tree
+        stream,             # Flag to stream reviews
+        batch,              # Flag to batch small files
+        resume,             # Flag to resume an interrupted analysis
+        save_metrics,       # Flag to export the metrics of the run
+        dedup,              # Flag to skip near-duplicate files
+        compact,            # Flag to compact files before reviewing them
+        plan                # Flag to estimate the cost of the analysis
     ):
 
+    # The modules of the analysis are imported once the arguments are valid,
+    # so that --help and usage errors don't wait for their dependencies
+    from .modules import assistant
+    from .modules import batching
+    from .modules import cache
+    from .modules import chunking
+    from .modules import compaction
+    from .modules import dedup as deduplication
+    from .modules import engine
+    from .modules import ingest
+    from .modules import journal
+    from .modules import metrics
+    from .modules import planning
+    from .modules import render
+    from .modules import reports
+    from .modules import repository
+    from .modules.config import DUPLICATE_NOTE
+
     try:
         # Resolving the repository directory path
         repository_dir = pathlib.Path(repository_dir).resolve()
-        logger.info(f"Repository directory: {repository_dir}")
+        logger.info("Repository directory: %s", repository_dir)
 
         # Creating the repository directory if it doesn't exist
         if not repository_dir.exists():
             repository_dir.mkdir(parents=True, exist_ok=True)
-            logger.debug(f"Create repository directory: {repository_dir}")
+            logger.debug("Create repository directory: %s", repository_dir)
 
         # Resolving the reports directory path if provided
         if reports_dir:
             reports_dir = pathlib.Path(reports_dir).resolve()
-            logger.info(f"Reports directory: {reports_dir}")
+            logger.info("Reports directory: %s", reports_dir)
 
-            # Creating the reports directory if it doesn't exist
-            if not reports_dir.exists():
+            # Creating the reports directory if it doesn't exist (a plan writes no report)
+            if not reports_dir.exists() and not plan:
                 reports_dir.mkdir(parents=True, exist_ok=True)
-                logger.debug(f"Created reports directory: {reports_dir}")
+                logger.debug("Created reports directory: %s", reports_dir)
 
         # Cloning the repository from the provided URL if specified
         if repository_url:
             try:
                 # Check if the repository is available
                 if (repository_dir / ".git").exists():
-                    logger.warning(f"Repository cloning failed ('{repository_dir.name}' already exists)")
+                    logger.warning("Repository cloning failed ('%s' already exists)", repository_dir.name)
                 else:
-                    logger.info(f"Cloning repository from {repository_url} to {repository_dir}")
-                    repository.RepositoryTools.clone_from(repository_url, repository_dir)
+                    logger.info("Cloning repository from %s to %s", repository_url, repository_dir)
+                    repository.RepositoryTools.clone_from(
+                        repository_url,
+                        repository_dir,
+                        depth=clone_depth,
+                        ref=clone_ref,
+                        blobless=clone_blobless,
+                        sparse=clone_sparse
+                    )
             except Exception as e:
-                logger.error(f"Repository cloning error: {e}")
+                logger.error("Repository cloning error: %s", e)
                 return
+        elif clone_depth or clone_ref or clone_blobless or clone_sparse:
+            logger.warning("Cloning options are ignored without --clone")
 
-        # Initializing the assistant with the API URL
-        ai = assistant.Assistant(api_url)
+        # Collecting the timing of the pipeline stages and the token usage
+        run_metrics = metrics.RunMetrics()
 
         # Initializing tools for handling the repository
-        repo_tools = repository.RepositoryTools(repository_dir)
+        if rev:
+            logger.info("Analyzing revision '%s'", rev)
+        if since:
+            logger.info("Analyzing files changed since '%s'", since)
+        with run_metrics.timer("discovery"):
+            repo_tools = repository.RepositoryTools(repository_dir, since, rev=rev)
 
         # Initializing the report generator with the repository and reports directories
-        report_generator = reports.ReportGenerator(repository_dir, reports_dir)
+        report_generator = reports.ReportGenerator(repository_dir, reports_dir, resume, rev, create_dir=not plan)
 
         # Logging the path of the report file
-        logger.info(f"Report file: {report_generator.report_file_path}")
+        if not plan:
+            logger.info("Report file: %s", report_generator.report_file_path)
+
+        if resume and not report_generator.journal_file_path.exists():
+            logger.info("No interrupted analysis is found, starting a new report")
+
+        # Opening the journal of reported files, it allows resuming the analysis after a crash
+        # (a plan only reads it, to leave out the files an interrupted analysis has reported)
+        progress_journal = journal.ProgressJournal(report_generator.journal_file_path, read_only=plan)
+        if resume and not plan:
+            progress_journal.restore_report(report_generator.report_file_path)
 
         # Logging the start of the analysis
-        logger.info(f"Running analysis for repository '{repository_dir.name}'...")
+        logger.info("Running analysis for repository '%s'...", repository_dir.name)
 
         # Getting all files categorized by their types from the repository
         files = repo_tools.get_files()
 
-        errors_counter = 0
-        for category in files.keys():
-            for file_path in files.get(category):
+        def file_name(file_path):
+            return file_path.relative_to(repository_dir).as_posix()
+
+        # Leaving out the files reported before the interruption
+        if progress_journal.files:
+            files = {
+                category: [file_path for file_path in file_paths if not progress_journal.is_done(file_name(file_path))]
+                for category, file_paths in files.items()
+            }
+            logger.info("Resuming analysis, %s file(s) are already reported", len(progress_journal.files))
+
+        def read_file(file_path):
+            with run_metrics.timer("read"):
+                file_data = repo_tools.get_file_data(file_path)
+
+            if not compact:
+                return file_data
+
+            # Leaving out the parts of the file that cost tokens without helping the review
+            with run_metrics.timer("compact"):
+                compacted = compaction.compact(file_data, file_path.suffix)
+
+            saved_tokens = compacted.original_tokens - compacted.tokens
+            run_metrics.add("compaction_saved_tokens", saved_tokens)
+            if saved_tokens > 0:
+                logger.info(
+                    "Compacted file '%s' from %s to %s estimated token(s) (-%.0f%%)",
+                    file_path, compacted.original_tokens, compacted.tokens, saved_tokens / compacted.original_tokens * 100
+                )
+
+            return compacted.text
+
+        # Leaving out near-duplicate files, their report entries refer to the review of their representative
+        duplicates = {}
+        if dedup:
+            with run_metrics.timer("dedup"):
+                duplicates = deduplication.find_duplicates(files, repo_tools.get_file_data)
+
+            if duplicates:
+                files = {
+                    category: [file_path for file_path in file_paths if file_path not in duplicates]
+                    for category, file_paths in files.items()
+                }
+                logger.info("%s near-duplicate file(s) refer to the review of another file", len(duplicates))
+
+        # Flattening the categorized files into an ordered sequence of review tasks,
+        # each task contains one file or (when batching) several small files.
+        # Single-file tasks are created while the reviews run (also when they are ordered
+        # by size), so the paths of all files are never held in memory at the same time
+        if batch and stream:
+            logger.warning("Batching is not available when streaming, files are reviewed one by one")
+
+        if batch and not stream:
+            tasks = batching.plan_batches(files, get_size=repo_tools.get_file_size)
+        else:
+            tasks = planning.FileTasks(files)
+
+        # Estimating the tokens of the reviews, calibrated against the usage reported in past runs
+        token_estimator = planning.TokenEstimator()
+
+        if plan:
+            estimates = []
+            for category, file_paths in tasks:
+                batch_files = []
+                for file_path in file_paths:
+                    try:
+                        batch_files.append((file_path, read_file(file_path)))
+                    except ingest.FileSkipped as e:
+                        logger.info("Skipped file '%s': %s", file_path, e)
+                    except Exception as e:
+                        logger.error("Error reading file '%s': %s", file_path, e)
+
+                if len(batch_files) > 1:
+                    estimates.append(token_estimator.estimate_batch(
+                        category,
+                        [(file_name(file_path), file_data) for file_path, file_data in batch_files]
+                    ))
+                elif batch_files:
+                    file_path, file_data = batch_files[0]
+                    estimates.append(token_estimator.estimate_review(category, file_data, file_path.suffix))
+
+            print(planning.summarize_plan(estimates, jobs, token_estimator))
+
+            repo_tools.close()
+            progress_journal.close()
+            return
+
+        # Opening the cache of reviews unless it is disabled
+        review_cache = None
+        if not no_cache:
+            try:
+                review_cache = cache.ReviewCache()
+                logger.info("Review cache: %s", review_cache.path)
+            except Exception as e:
+                logger.warning("Review cache is disabled (%s)", e)
+
+        # Initializing the assistant with the API URL
+        ai = assistant.Assistant(api_url, review_cache, run_metrics)
+
+        # Concurrent reviews start with the largest files, so that they don't drag out the end of the run.
+        # Their entries are written as they are done and moved into the order of the tasks at the end
+        # (streamed reviews keep that order)
+        indexed_tasks = enumerate(tasks)
+        if jobs > 1 and not stream:
+            indexed_tasks = planning.order_largest_first(tasks, repo_tools.get_file_size)
+
+        def review_file(category, file_path, file_data=None):
+            # Getting the data of the current file
+            if file_data is None:
+                file_data = read_file(file_path)
+
+            # Logging the start of the analysis for the current file
+            logger.info("[%s] Analyzing file '%s'...", category, file_path)
+
+            # Splitting large files into parts reviewed in parallel
+            chunks = chunking.split_source(file_data, file_path.suffix)
+            if len(chunks) > 1:
+                logger.info("[%s] File '%s' is split into %s parts", category, file_path, len(chunks))
+
+                if stream:
+                    return ai.review_chunks_stream(category, chunks)
+
+                return ai.review_chunks(category, chunks)
+
+            # Getting the review of the current file from the assistant
+            if stream:
+                return ai.review_stream(category, file_data)
+
+            return ai.review(category, file_data)
+
+        def review_files(task):
+            category, file_paths = task
+
+            if len(file_paths) == 1:
+                return [(file_paths[0], review_file(category, file_paths[0]), None)]
+
+            # Reading the files of the batch, files that can't be read are reported separately
+            results = {}
+            batch_files = {}
+            for file_path in file_paths:
                 try:
-                    # Getting the data of the current file
-                    file_data = repo_tools.get_file_data(file_path)
+                    batch_files[file_name(file_path)] = (file_path, read_file(file_path))
+                except Exception as e:
+                    results[file_path] = (file_path, None, e)
+
+            # Reviewing a batch of small files in one request
+            if len(batch_files) > 1:
+                try:
+                    logger.info("[%s] Analyzing files %s...", category, ", ".join(batch_files))
+                    batch_reviews = ai.review_batch(
+                        category,
+                        [(name, file_data) for name, (_, file_data) in batch_files.items()]
+                    )
+
+                    for name, (file_path, _) in batch_files.items():
+                        results[file_path] = (file_path, batch_reviews.get(name), None)
+                    batch_files = {}
+                except batching.BatchParseError as e:
+                    logger.warning("[%s] Batch review is not recognized, reviewing files one by one (%s)", category, e)
+
+            # Reviewing the remaining files one by one
+            for file_path, file_data in batch_files.values():
+                try:
+                    results[file_path] = (file_path, review_file(category, file_path, file_data), None)
+                except Exception as e:
+                    results[file_path] = (file_path, None, e)
+
+            return [results[file_path] for file_path in file_paths]
 
-                    # Logging the start of the analysis for the current file
-                    logger.info(f"[{category}] Analyzing file '{file_path}'...")
+        def stream_file(task):
+            category, (file_path,) = task
 
-                    # Getting the review of the current file from the assistant
-                    file_review = ai.review(category, file_data)
+            return review_file(category, file_path)
+
+        # Reviews run concurrently, but the results arrive in the order of the tasks
+        review_pool = engine.ReviewPool(jobs, run_metrics)
+
+        # Counting files as they are done, for the progress line
+        total_files = sum(len(file_paths) for file_paths in files.values()) + len(duplicates)
+        logger.debug("Reviewing %s file(s) with %s job(s)", total_files, jobs)
+        done_files = 0
+
+        # Outcomes of the representatives of near-duplicate files
+        representatives = {original_path for original_path, _ in duplicates.values()}
+        reviewed_files = set()
+        skipped_files = set()
+
+        # Printed reviews are styled only in a terminal (see https://no-color.org)
+        color_output = sys.stdout.isatty() and not os.environ.get("NO_COLOR")
+
+        errors_counter = 0
+        skipped_counter = 0
+        if stream:
+            for (category, (file_path,)), review_chunks in review_pool.stream(stream_file, tasks):
+                try:
+                    terminal_renderer = None
 
-                    # Adding the review to the reports
-                    report_generator.add_report_entry(file_path, file_review)
+                    # Writing the review to the report while it is being generated
+                    for chunk in report_generator.stream_report_entry(file_path, review_chunks):
+                        # Printing the review to the terminal as it arrives, line by line
+                        # (the header waits for the first piece, so skipped and failed files print nothing)
+                        if print_reports:
+                            if terminal_renderer is None:
+                                print(f"\nFile: {file_path}")
+                                terminal_renderer = render.MarkdownRenderer(color_output)
+
+                            print(terminal_renderer.feed(chunk), end="", flush=True)
 
-                    # Printing the review to the terminal if the print flag is set
                     if print_reports:
-                        print(f"\nFile: {file_path}")
-                        print(f"{reports.ReportGenerator.markdown_to_text(file_review)}\n")
+                        # An empty review still gets its header, like its report entry
+                        if terminal_renderer is None:
+                            print(f"\nFile: {file_path}")
+                            terminal_renderer = render.MarkdownRenderer(color_output)
+
+                        print(terminal_renderer.close())
+
+                    progress_journal.record(file_name(file_path), "reviewed", report_generator.report_file_path)
+                    if file_path in representatives:
+                        reviewed_files.add(file_path)
+
+                except ingest.FileSkipped as e:
+                    skipped_counter += 1
+                    logger.info("Skipped file '%s': %s", file_path, e)
+                    progress_journal.record(file_name(file_path), "skipped", report_generator.report_file_path)
+                    if file_path in representatives:
+                        skipped_files.add(file_path)
 
                 except Exception as e:
                     errors_counter += 1
-                    logger.error(f"Error analyzing file '{file_path}': {e}")
+                    logger.error("Error analyzing file '%s': %s", file_path, e)
+
+                finally:
+                    done_files += 1
+                    run_metrics.progress(done_files, total_files)
+        else:
+            outcomes = review_pool.map(lambda indexed_task: review_files(indexed_task[1]), indexed_tasks)
+            for (position, (category, file_paths)), results, error in outcomes:
+                # A failed task fails all of its files
+                if error:
+                    results = [(file_path, None, error) for file_path in file_paths]
+
+                for file_path, file_review, error in results:
+                    done_files += 1
+                    run_metrics.progress(done_files, total_files)
+
+                    if isinstance(error, ingest.FileSkipped):
+                        skipped_counter += 1
+                        logger.info("Skipped file '%s': %s", file_path, error)
+                        progress_journal.record(file_name(file_path), "skipped", report_generator.report_file_path)
+                        if file_path in representatives:
+                            skipped_files.add(file_path)
+                        continue
+
+                    if error:
+                        errors_counter += 1
+                        logger.error("Error analyzing file '%s': %s", file_path, error)
+                        continue
+
+                    try:
+                        # Adding the review to the reports
+                        with run_metrics.timer("report"):
+                            report_generator.add_report_entry(file_path, file_review, position=position)
+                            progress_journal.record(file_name(file_path), "reviewed", report_generator.report_file_path)
+                        if file_path in representatives:
+                            reviewed_files.add(file_path)
+
+                        # Printing the review to the terminal if the print flag is set
+                        if print_reports:
+                            print(f"\nFile: {file_path}")
+                            print(f"{reports.ReportGenerator.markdown_to_text(file_review, color_output)}\n")
+
+                    except Exception as e:
+                        errors_counter += 1
+                        logger.error("Error analyzing file '%s': %s", file_path, e)
+
+        # Moving the entries of the reviews into the order of the tasks
+        with run_metrics.timer("report"):
+            report_generator.sort_entries()
+
+        # Reporting near-duplicate files with the outcome of their representative
+        duplicates_counter = 0
+        for file_path, (original_path, similarity) in duplicates.items():
+            done_files += 1
+            run_metrics.progress(done_files, total_files)
+
+            if original_path in skipped_files:
+                skipped_counter += 1
+                logger.info("Skipped file '%s': near-duplicate of the skipped file '%s'", file_path, original_path)
+                progress_journal.record(file_name(file_path), "skipped", report_generator.report_file_path)
+                continue
+
+            if original_path not in reviewed_files:
+                errors_counter += 1
+                logger.error("Error analyzing file '%s': near-duplicate of the failed file '%s'", file_path, original_path)
+                continue
+
+            try:
+                file_review = DUPLICATE_NOTE.format(path=file_name(original_path), similarity=similarity)
+                report_generator.add_report_entry(file_path, file_review)
+                progress_journal.record(file_name(file_path), "duplicate", report_generator.report_file_path)
+                duplicates_counter += 1
+
+                if print_reports:
+                    print(f"\nFile: {file_path}")
+                    print(f"{reports.ReportGenerator.markdown_to_text(file_review, color_output)}\n")
+
+            except Exception as e:
+                errors_counter += 1
+                logger.error("Error analyzing file '%s': %s", file_path, e)
 
         # Saving the final report file
         report_generator.save_report_file()
+        repo_tools.close()
+        ai.close()
+
+        # The journal is kept while there are files left to review with --resume
+        progress_journal.close(delete=not errors_counter)
+
+        # Counting the outcomes of the run
+        run_metrics.add("files_reviewed", done_files - skipped_counter - errors_counter - duplicates_counter)
+        run_metrics.add("files_deduplicated", duplicates_counter)
+        run_metrics.add("files_skipped", skipped_counter)
+        run_metrics.add("files_failed", errors_counter)
+        if review_cache:
+            run_metrics.add("cache_hits", review_cache.hits)
+            run_metrics.add("cache_misses", review_cache.misses)
+
+        # Calibrating the token estimates of later plans with the usage of this run
+        try:
+            token_estimator.update(run_metrics)
+        except Exception as e:
+            logger.warning("Token calibration is not saved (%s)", e)
+
+        # Saving the metrics next to the report
+        if save_metrics:
+            metrics_json_path = report_generator.report_file_path.with_suffix(".metrics.json")
+            metrics_prometheus_path = report_generator.report_file_path.with_suffix(".prom")
+            run_metrics.save(metrics_json_path, metrics_prometheus_path)
+            logger.info("Metrics files: %s, %s", metrics_json_path, metrics_prometheus_path)
+
+        # Summarizing skipped files and the use of the cache
+        summary = []
+        if skipped_counter:
+            summary.append(f"{skipped_counter} file(s) skipped")
+
+        if duplicates_counter:
+            summary.append(f"{duplicates_counter} near-duplicate file(s)")
+
+        if compact:
+            summary.append(f"compaction saved {run_metrics.counters.get('compaction_saved_tokens', 0)} estimated token(s)")
+
+        if review_cache:
+            summary.append(f"cache: {review_cache.hits} hit(s), {review_cache.misses} miss(es)")
+            review_cache.evict()
+            review_cache.close()
+
+        summary = f" ({'; '.join(summary)})" if summary else ""
 
         # Checking for errors in the analysis process
         if errors_counter:
-            logger.warning(f"Analysis is complete, but there were {errors_counter} error(s)")
+            logger.warning("Analysis is complete, but there were %s error(s)%s", errors_counter, summary)
         else:
             # Logging the successful completion of the analysis
-            logger.info("Analysis successfully completed!")
+            logger.info("Analysis successfully completed!%s", summary)
 
     except Exception as e:
-        logger.error(f"An error occurred: {e}")
+        logger.error("An error occurred: %s", e)
@@ -1,9 +1,5 @@
 
-from . import assistant
-from . import repository
-from . import reports
-from . import config
-from . import types
+import importlib
 
 
 __all__ = [
@@ -12,4 +8,28 @@ __all__ = [
     'reports',
     'config',
     'types',
+    'engine',
+    'cache',
+    'chunking',
+    'batching',
+    'ingest',
+    'balancer',
+    'journal',
+    'metrics',
+    'ratelimit',
+    'dedup',
+    'logs',
+    'render',
+    'planning',
+    'compaction',
+    'inventory',
 ]
+
+
+# Submodules are imported on first use, so that importing one of them
+# doesn't load the dependencies of all the others
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,15 +1,109 @@
 
+import json
+import time
+import asyncio
 import requests
+import threading
+import requests.adapters
 import urllib.parse
 import logging
 
-from .config import request_handler, response_handler
+from typing import TYPE_CHECKING, Iterator, List, Tuple, Union
+
+from .balancer import Endpoint, EndpointPool
+from .chunking import estimate_tokens
+from .metrics import RunMetrics
+from .ratelimit import RateLimiter
+from .config import request_handler, response_handler, stream_handler, usage_handler
 from .config import API as API_CONFIG
 
 
+# httpx is only imported when the asynchronous client is used
+if TYPE_CHECKING:
+    import httpx
+
 # Setting up the logger for this module
 logger = logging.getLogger(__name__)
 
+# Seconds between checks for a free endpoint in the asynchronous client
+ASYNC_ACQUIRE_INTERVAL = 0.05
+
+
+class LMAPIError(Exception):
+
+    """
+    Raised when the LM API does not return a usable response after all retries.
+    """
+
+
+def retry_delay(attempt: int, retry_after: Union[str, float] = None) -> float:
+    """
+    Calculates the delay before the next retry using exponential backoff.
+
+    Args:
+        attempt (int): The number of the failed attempt, starting from zero.
+        retry_after (str or float, optional): The value of the Retry-After header, in seconds.
+
+    Returns:
+        float: The number of seconds to wait.
+    """
+
+    # The server knows best when it will be ready again
+    if retry_after:
+        try:
+            return min(float(retry_after), API_CONFIG.get("backoff_max"))
+        except ValueError:
+            logger.debug("Ignoring non-numeric Retry-After header: '%s'", retry_after)
+
+    return min(API_CONFIG.get("backoff_factor") * (2 ** attempt), API_CONFIG.get("backoff_max"))
+
+
+def parse_retry_after(value: str) -> float:
+    """
+    Converts the value of the Retry-After header to seconds.
+
+    Args:
+        value (str): The value of the header, or None.
+
+    Returns:
+        float: The number of seconds, or None if the header is missing or not numeric.
+    """
+
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def estimate_request_tokens(data: dict) -> int:
+    """
+    Estimates the tokens a request uses at most, for the tokens-per-minute limit.
+
+    Args:
+        data (dict): The request body.
+
+    Returns:
+        int: The estimated prompt tokens plus the maximum number of completion tokens.
+    """
+
+    prompt = "".join(message.get("content", "") for message in data.get("messages", []))
+
+    return estimate_tokens(prompt) + (data.get("max_tokens") or 0)
+
+
+def count_prompt_characters(data: dict) -> int:
+    """
+    Counts the characters of the messages of a request, to calibrate the token estimates against the usage.
+
+    Args:
+        data (dict): The request body.
+
+    Returns:
+        int: The number of characters of all messages.
+    """
+
+    return sum(len(message.get("content", "")) for message in data.get("messages", []))
+
 
 class LMAPI:
 
@@ -17,51 +111,509 @@ class LMAPI:
     A class for interacting with the LM API.
 
     This class provides methods for sending requests to the LM API and receiving responses.
+    All requests go through one session, so connections to the server are kept alive and reused.
 
     """
 
-    def __init__(self, url: str = API_CONFIG.get("url")) -> None:
+    def __init__(
+            self,
+            url: Union[str, List[str]] = API_CONFIG.get("url"),
+            max_connections: int = API_CONFIG.get("max_connections"),
+            metrics: RunMetrics = None,
+            rate_limiter: RateLimiter = None
+        ) -> None:
         """
         Initialize the LMAPI with the base URL of the API.
 
         Args:
-            url (str, optional): The base URL of the API.
+            url (str or List[str], optional): The base URL of the API, or several URLs to balance the requests
+                between, each optionally followed by options (e.g. "http://host:1234,weight=2,concurrency=4").
+            max_connections (int, optional): The maximum number of pooled keep-alive connections per server.
+            metrics (RunMetrics, optional): Records the timing and the token usage of the requests.
+            rate_limiter (RateLimiter, optional): Limits the rate of requests and tokens, by default as configured in API.
         """
 
-        # Construct the full URL
-        self.url = urllib.parse.urljoin(url, API_CONFIG.get("endpoint"))
-        logger.debug(f"Initialized LMAPI with URL: {self.url}")
+        # Construct the full URLs
+        self.endpoints = EndpointPool([url] if isinstance(url, str) else list(url))
+        self.url = ", ".join(endpoint.url for endpoint in self.endpoints.endpoints)
+        self.metrics = metrics
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.timeout = (API_CONFIG.get("connect_timeout"), API_CONFIG.get("read_timeout"))
 
-    def get_response(self, prompt: list) -> str:
+        # Create a session with a pool of keep-alive connections, failed requests
+        # are retried by _send, which also adapts the load to the feedback of the servers
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=len(self.endpoints.endpoints),
+            pool_maxsize=max_connections,
+            max_retries=0
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        logger.debug("Initialized LMAPI with URL: %s", self.url)
+
+        # The model is asked from the servers when it is needed for the first time
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    def get_model(self) -> str:
+        """
+        Returns the identity of the model answering the requests, e.g. for the cache key of reviews.
+
+        The model configured in API is used if it is set, otherwise the servers are asked once for the models
+        they serve. If no server answers, the model is identified by the servers themselves.
+
+        Returns:
+            str: The model, or the sorted models or base URLs of the servers separated by commas.
+        """
+
+        if API_CONFIG.get("model"):
+            return API_CONFIG.get("model")
+
+        with self._model_lock:
+            if self._model is None:
+                models = self.endpoints.models() or sorted(endpoint.base_url for endpoint in self.endpoints.endpoints)
+                self._model = ",".join(models)
+                logger.debug("Identified the model as: %s", self._model)
+
+        return self._model
+
+    def get_response(self, prompt: list, max_tokens: int = None) -> str:
         """
         Send a request to the API with the given prompt and return the response text.
 
         Args:
             prompt (list): A list of messages representing the conversation history.
+            max_tokens (int, optional): The maximum number of tokens of the response. Defaults to the configured one.
 
         Returns:
             str: The content of the first choice's message from the API response.
+
+        Raises:
+            LMAPIError: If the server could not be reached or did not respond successfully.
         """
 
         # Constructs the query in json format
-        data = request_handler(prompt)
-        logger.debug(f"Sending request with data: {data}")
+        data = request_handler(prompt, max_tokens)
+        logger.debug("Sending request with data: %s", data)
+
+        # Send a POST request to the least loaded endpoint
+        start = time.perf_counter()
+        endpoint, response, reserved_tokens = self._send(data, self.timeout)
 
-        # Send a POST request to the API endpoint with the specified headers and data
-        response = requests.post(self.url, headers=API_CONFIG.get("headers"), json=data)
-        logger.debug(f"Received response with status code: {response.status_code}")
-        logger.debug(f"Response text: '{response.text}'")
+        # The elapsed time of a response ends when its headers are received
+        latency = response.elapsed.total_seconds()
+        try:
+            # Decoding the body again is only worth it when it is logged
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Response text: '%s'", response.text)
+
+            if response.status_code != 200:
+                latency = None
+                raise LMAPIError(f"Request failed with status code: {response.status_code}")
 
-        if response.status_code == 200:
             # Parse the JSON response
             response_text = response_handler(response)
-            logger.debug(f"Extracted response text: '{response_text}'")
+            logger.debug("Extracted response text: '%s'", response_text)
+        finally:
+            self.endpoints.release(endpoint, success=True, latency=latency)
+
+        # Return the unused part of the reserved tokens to the rate limiter
+        usage = usage_handler(response.json())
+        if usage["prompt_tokens"] or usage["completion_tokens"]:
+            self.rate_limiter.refund(reserved_tokens - usage["prompt_tokens"] - usage["completion_tokens"])
+
+        if self.metrics is not None:
+            self.metrics.observe("ttfb", latency)
+            self.metrics.observe("request", time.perf_counter() - start)
+            self.metrics.add("requests")
+            self.metrics.add_usage(usage)
+
+            # The prompt is counted only when its tokens are, so that their ratio stays comparable
+            if usage["prompt_tokens"]:
+                self.metrics.add("prompt_characters", count_prompt_characters(data))
+
+        # Return the extracted content as a string
+        return response_text
+
+    def stream_response(self, prompt: list) -> Iterator[str]:
+        """
+        Send a streaming request to the API and yield the response text as it is generated.
+
+        The server sends the completion as server-sent events. If no data arrives for
+        longer than the stream timeout, the stream is considered dead and aborted.
+
+        Args:
+            prompt (list): A list of messages representing the conversation history.
+
+        Yields:
+            str: The next piece of the content of the first choice's message.
+
+        Raises:
+            LMAPIError: If the server could not be reached, did not respond successfully or the stream was aborted.
+        """
+
+        # Constructs the query in json format and asks the server to stream it
+        data = request_handler(prompt)
+        data["stream"] = True
+        logger.debug("Sending streaming request with data: %s", data)
+
+        start = time.perf_counter()
+        latency = None
+        endpoint, response, _ = self._send(
+            data,
+            (API_CONFIG.get("connect_timeout"), API_CONFIG.get("stream_timeout")),
+            stream=True
+        )
+
+        success = True
+        try:
+            with response:
+                if response.status_code != 200:
+                    raise LMAPIError(f"Request failed with status code: {response.status_code}")
+
+                # Event streams are UTF-8 encoded by definition
+                response.encoding = "utf-8"
+
+                for line in response.iter_lines(decode_unicode=True):
+                    # Skip keep-alive comments, empty separators and other fields
+                    if not line or not line.startswith("data:"):
+                        continue
+
+                    payload = line[5:].strip()
+                    if payload == "[DONE]":
+                        logger.debug("Stream finished")
+                        break
+
+                    chunk = json.loads(payload)
+
+                    # The last chunk may report the token usage of the request
+                    if self.metrics is not None:
+                        usage = usage_handler(chunk)
+                        self.metrics.add_usage(usage)
+                        if usage["prompt_tokens"]:
+                            self.metrics.add("prompt_characters", count_prompt_characters(data))
+
+                    chunk_text = stream_handler(chunk)
+                    if chunk_text:
+                        # The time to the first piece is the latency of a streamed response
+                        if latency is None:
+                            latency = time.perf_counter() - start
+                            if self.metrics is not None:
+                                self.metrics.observe("ttfb", latency)
+
+                        yield chunk_text
+
+            if self.metrics is not None:
+                self.metrics.observe("request", time.perf_counter() - start)
+                self.metrics.add("requests")
+        except requests.RequestException as e:
+            success = False
+            raise LMAPIError(f"Stream aborted: {e}") from e
+        finally:
+            self.endpoints.release(endpoint, success=success, latency=latency if success else None)
+
+    def _send(self, data: dict, timeout: tuple, stream: bool = False) -> Tuple[Endpoint, requests.Response, int]:
+        """
+        Sends a request to the least loaded endpoint, failing over to other endpoints
+        if the server can't be reached or is overloaded.
+
+        Once every endpoint has failed, the request is retried after a delay with exponential
+        backoff, or as long as a server asked to wait with the Retry-After header.
+
+        Args:
+            data (dict): The request body.
+            timeout (tuple): The connect and read timeouts.
+            stream (bool, optional): Whether to stream the response body.
+
+        Returns:
+            Tuple[Endpoint, requests.Response, int]: The endpoint, which the caller must release,
+            its response and the number of tokens reserved with the rate limiter.
+
+        Raises:
+            LMAPIError: If no endpoint handled the request.
+        """
+
+        # Wait for the budget of the rate limits
+        reserved_tokens = estimate_request_tokens(data)
+        self.rate_limiter.acquire(reserved_tokens)
+
+        error = LMAPIError("No endpoint is available")
+        retry_after = None
+        failed = []
+        attempt = 0
+        while True:
+            endpoint = self.endpoints.acquire(exclude=failed)
+
+            # Every endpoint has failed, wait before the next round
+            if endpoint is None:
+                if attempt >= API_CONFIG.get("retries") or not self.endpoints.endpoints:
+                    raise error
+
+                delay = retry_delay(attempt, retry_after)
+                logger.warning("%s, retrying in %.1fs", error, delay)
+                time.sleep(delay)
+
+                attempt += 1
+                retry_after = None
+                failed = []
+                continue
+
+            try:
+                response = self.session.post(
+                    endpoint.url,
+                    headers=API_CONFIG.get("headers"),
+                    json=data,
+                    timeout=timeout,
+                    stream=stream
+                )
+                logger.debug("Received response from %s with status code: %s", endpoint.url, response.status_code)
+            except requests.RequestException as e:
+                error = LMAPIError(f"Request failed: {e}")
+                self.endpoints.release(endpoint, success=False)
+            else:
+                if response.status_code not in API_CONFIG.get("retry_statuses"):
+                    return endpoint, response, reserved_tokens
+
+                response.close()
+                error = LMAPIError(f"Request failed with status code: {response.status_code}")
+
+                # Rate limiting (429) is feedback from a working server, not a failure
+                endpoint_retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if endpoint_retry_after is not None:
+                    endpoint_retry_after = min(endpoint_retry_after, API_CONFIG.get("backoff_max"))
+                self.endpoints.release(
+                    endpoint,
+                    success=response.status_code == 429,
+                    overloaded=response.status_code in (429, 503),
+                    retry_after=endpoint_retry_after
+                )
+                retry_after = max(filter(None, [retry_after, endpoint_retry_after]), default=None)
+
+            # Try the next endpoint
+            failed.append(endpoint)
+            logger.debug("Endpoint %s failed: %s", endpoint.base_url, error)
+
+    def close(self) -> None:
+        """
+        Closes all pooled connections and stops the health checks of the servers.
+        """
+
+        self.session.close()
+        self.endpoints.close()
+        logger.debug("Closed HTTP session")
+
+
+class AsyncLMAPI:
+
+    """
+    An asynchronous client for the LM API.
+
+    All requests share one pool of keep-alive connections, so thousands of prompts
+    can be in flight at the same time without a thread per request. Requests beyond
+    the pool limit wait for a free connection instead of opening new ones.
+
+    """
+
+    def __init__(
+            self,
+            url: Union[str, List[str]] = API_CONFIG.get("url"),
+            max_connections: int = API_CONFIG.get("max_connections"),
+            metrics: RunMetrics = None,
+            rate_limiter: RateLimiter = None
+        ) -> None:
+        """
+        Initialize the AsyncLMAPI with the base URL of the API.
+
+        Args:
+            url (str or List[str], optional): The base URL of the API, or several URLs to balance the requests
+                between (see LMAPI).
+            max_connections (int, optional): The maximum number of simultaneously open connections.
+            metrics (RunMetrics, optional): Records the timing and the token usage of the requests.
+            rate_limiter (RateLimiter, optional): Limits the rate of requests and tokens, by default as configured in API.
+        """
+
+        # Construct the full URLs
+        self.endpoints = EndpointPool([url] if isinstance(url, str) else list(url))
+        self.url = ", ".join(endpoint.url for endpoint in self.endpoints.endpoints)
+        self.max_connections = max_connections
+        self.metrics = metrics
+        self.rate_limiter = rate_limiter or RateLimiter()
+
+        # The client is created on first use, inside the running event loop
+        self.client = None
+        logger.debug("Initialized AsyncLMAPI with URL: %s", self.url)
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        """
+        Returns the shared HTTP client, creating it if necessary.
+
+        Returns:
+            httpx.AsyncClient: The client holding the connection pool.
+        """
+
+        if self.client is None:
+            import httpx
+
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections
+            )
+
+            # Requests queued behind the pool limit must not time out while waiting
+            timeout = httpx.Timeout(
+                connect=API_CONFIG.get("connect_timeout"),
+                read=API_CONFIG.get("read_timeout"),
+                write=API_CONFIG.get("read_timeout"),
+                pool=None
+            )
+
+            self.client = httpx.AsyncClient(limits=limits, timeout=timeout)
+            logger.debug("Created HTTP client with connection limit: %s", self.max_connections)
+
+        return self.client
+
+    async def _acquire(self, exclude: List[Endpoint] = ()) -> Endpoint:
+        """
+        Chooses an endpoint like EndpointPool.acquire, but waits for the concurrency
+        limits and the pauses of the servers without blocking the event loop.
+
+        Args:
+            exclude (List[Endpoint], optional): Endpoints that already failed for this request.
+
+        Returns:
+            Endpoint: The chosen endpoint, or None if all endpoints are excluded.
+        """
+
+        while True:
+            endpoint, wait = self.endpoints.try_acquire(exclude)
+            if endpoint is not None or wait is None:
+                return endpoint
+
+            # Finished requests don't wake the event loop, so the endpoints are checked again shortly
+            await asyncio.sleep(min(wait, ASYNC_ACQUIRE_INTERVAL))
+
+    async def get_response(self, prompt: list) -> str:
+        """
+        Send a request to the API with the given prompt and return the response text.
+
+        Args:
+            prompt (list): A list of messages representing the conversation history.
+
+        Returns:
+            str: The content of the first choice's message from the API response.
+
+        Raises:
+            LMAPIError: If the server could not be reached or did not respond successfully.
+        """
+
+        import httpx
+
+        # Constructs the query in json format
+        data = request_handler(prompt)
+        logger.debug("Sending request with data: %s", data)
+
+        # Wait for the budget of the rate limits without blocking the event loop
+        reserved_tokens = estimate_request_tokens(data)
+        delay = self.rate_limiter.reserve(reserved_tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        start = time.perf_counter()
+        failed = []
+        retries = API_CONFIG.get("retries")
+        for attempt in range(retries + 1):
+            # Choose the least loaded endpoint that hasn't failed yet (if there is one)
+            endpoint = await self._acquire(failed) or await self._acquire()
+            if endpoint is None:
+                raise LMAPIError("No endpoint is available")
+
+            # Send a POST request through the shared connection pool
+            try:
+                response = await self._get_client().post(endpoint.url, headers=API_CONFIG.get("headers"), json=data)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                self.endpoints.release(endpoint, success=False)
+                failed.append(endpoint)
+
+                if attempt == retries:
+                    raise LMAPIError(f"Request failed: {e}") from e
+
+                delay = retry_delay(attempt)
+                logger.warning("Connection error (%s), retrying in %.1fs", e, delay)
+                await asyncio.sleep(delay)
+                continue
+            except httpx.HTTPError as e:
+                self.endpoints.release(endpoint, success=False)
+                raise LMAPIError(f"Request failed: {e}") from e
+
+            logger.debug("Received response from %s with status code: %s", endpoint.url, response.status_code)
+
+            # Wait and try again if the server is overloaded or temporarily unavailable
+            if response.status_code in API_CONFIG.get("retry_statuses"):
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if retry_after is not None:
+                    retry_after = min(retry_after, API_CONFIG.get("backoff_max"))
+
+                # Rate limiting (429) is feedback from a working server, not a failure
+                self.endpoints.release(
+                    endpoint,
+                    success=response.status_code == 429,
+                    overloaded=response.status_code in (429, 503),
+                    retry_after=retry_after
+                )
+                failed.append(endpoint)
+
+                if attempt < retries:
+                    delay = retry_delay(attempt, retry_after)
+                    logger.warning("Server responded with status code %s, retrying in %.1fs", response.status_code, delay)
+                    await asyncio.sleep(delay)
+                    continue
+            else:
+                latency = response.elapsed.total_seconds() if response.status_code == 200 else None
+                self.endpoints.release(endpoint, success=True, latency=latency)
+
+            break
+
+        # Decoding the body again is only worth it when it is logged
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Response text: '%s'", response.text)
+
+        if response.status_code != 200:
+            raise LMAPIError(f"Request failed with status code: {response.status_code}")
+
+        # Parse the JSON response
+        response_text = response_handler(response)
+        logger.debug("Extracted response text: '%s'", response_text)
+
+        # Return the unused part of the reserved tokens to the rate limiter
+        usage = usage_handler(response.json())
+        if usage["prompt_tokens"] or usage["completion_tokens"]:
+            self.rate_limiter.refund(reserved_tokens - usage["prompt_tokens"] - usage["completion_tokens"])
+
+        if self.metrics is not None:
+            self.metrics.observe("request", time.perf_counter() - start)
+            self.metrics.add("requests")
+            self.metrics.add_usage(usage)
+
+            # The prompt is counted only when its tokens are, so that their ratio stays comparable
+            if usage["prompt_tokens"]:
+                self.metrics.add("prompt_characters", count_prompt_characters(data))
+
+        # Return the extracted content as a string
+        return response_text
+
+    async def aclose(self) -> None:
+        """
+        Closes all pooled connections.
+        """
+
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+            logger.debug("Closed HTTP client")
 
-            # Return the extracted content as a string
-            return response_text
-        else:
-            # Error logging
-            logger.error(f"Request failed with status code: {response.status_code}")
+    async def __aenter__(self) -> "AsyncLMAPI":
+        return self
 
-            # Return empty string
-            return ""
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
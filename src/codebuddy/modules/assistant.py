@@ -1,8 +1,19 @@
 
+import time
+import asyncio
 import logging
+import concurrent.futures
 
-from .api import LMAPI
-from .config import prompt_handler
+from typing import Dict, Iterator, List, Tuple, Union
+
+from .api import LMAPI, AsyncLMAPI
+from .batching import BatchParseError, batch_max_tokens, format_batch, split_batch_review
+from .cache import ReviewCache
+from .chunking import Chunk
+from .config import prompt_handler, request_handler, CHUNK_HEADER
+from .config import CHUNKING as CHUNKING_CONFIG
+from .metrics import RunMetrics
+from .ratelimit import RateLimiter
 
 
 # Setting up the logger for this module
@@ -15,37 +26,66 @@ class Assistant:
     An AI assistant that interacts with a LM API to provide various types of reviews and responses.
     """
 
-    def __init__(self, api_url: str = None) -> None:
+    def __init__(
+            self,
+            api_url: Union[str, List[str]] = None,
+            cache: ReviewCache = None,
+            metrics: RunMetrics = None,
+            part_jobs: int = CHUNKING_CONFIG.get("jobs")
+        ) -> None:
         """
         Initializes the Assistant with an optional API URL.
 
         Args:
-            api_url (str, optional): The URL of the LM API. If not provided, a default URL is used.
+            api_url (str or List[str], optional): The URL of the LM API, or several URLs to balance the requests between.
+                If not provided, a default URL is used.
+            cache (ReviewCache, optional): The cache of reviews. If not provided, every review is requested from the API.
+            metrics (RunMetrics, optional): Records the timing of the prompts and the requests.
+            part_jobs (int, optional): The maximum number of parts of large files reviewed at the same time,
+                shared by all files under review.
         """
 
+        self.metrics = metrics
+
+        # The synchronous and the asynchronous client share the rate limits
+        self.rate_limiter = RateLimiter()
+
         # Initialize the LMAPI instance with the provided URL or use the default URL
         if api_url:
-            self.lm_api = LMAPI(api_url)
-            logging.debug(f"Initialized LMAPI with URL: {api_url}")
+            self.lm_api = LMAPI(api_url, metrics=metrics, rate_limiter=self.rate_limiter)
+            logger.debug("Initialized LMAPI with URL: %s", api_url)
         else:
-            self.lm_api = LMAPI()
-            logging.debug("Initialized LMAPI with default URL")
+            self.lm_api = LMAPI(metrics=metrics, rate_limiter=self.rate_limiter)
+            logger.debug("Initialized LMAPI with default URL")
+
+        # The asynchronous client is only created when an async method is used
+        self.api_url = api_url
+        self.async_lm_api = None
+
+        self.cache = cache
 
-    def get_response(self, prompt: list) -> str:
+        # The parts of all large files share one pool, so concurrent files don't multiply the requests in flight
+        self._part_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, part_jobs),
+            thread_name_prefix="codebuddy-part"
+        )
+
+    def get_response(self, prompt: list, max_tokens: int = None) -> str:
         """
         Sends a prompt to the API client and returns the response.
 
         Args:
             prompt (list): A list of dictionaries representing the conversation prompt.
+            max_tokens (int, optional): The maximum number of tokens of the response. Defaults to the configured one.
 
         Returns:
             str: The response received from the API.
         """
 
         # Get the response from the LM API
-        logging.debug(f"Sending prompt to API: {prompt}")
-        response = self.lm_api.get_response(prompt)
-        logging.debug(f"Received response from API: '{response}'")
+        logger.debug("Sending prompt to API: %s", prompt)
+        response = self.lm_api.get_response(prompt, max_tokens)
+        logger.debug("Received response from API: '%s'", response)
 
         return response
 
@@ -62,11 +102,281 @@ class Assistant:
         """
 
         # Construct the prompt
-        prompt = prompt_handler(category, data)
-        logging.debug(f"Constructed prompt for category '{category}': {prompt}")
+        prompt = self._build_prompt(category, data)
+
+        # Return the cached review if the same prompt has already been answered
+        cache_key = self._get_cache_key(category, prompt)
+        if cache_key:
+            file_review = self.cache.get(cache_key)
+            if file_review is not None:
+                return file_review
 
         # Generate the review by sending the prompt to the LM API
         file_review = self.get_response(prompt=prompt)
-        logging.debug(f"Generated review for category '{category}': '{file_review}'")
+        logger.debug("Generated review for category '%s': '%s'", category, file_review)
+
+        # An empty completion is a transient failure, it isn't replayed from the cache
+        if cache_key and file_review.strip():
+            self.cache.put(cache_key, file_review)
 
         return file_review
+
+    def review_stream(self, category: str, data: str) -> Iterator[str]:
+        """
+        Generates a review like review does, but yields the text while the LM API generates it.
+
+        Args:
+            category (str): The type of review to generate.
+            data (str): The input data or content that needs to be reviewed.
+
+        Yields:
+            str: The next piece of the review.
+        """
+
+        # Construct the prompt
+        prompt = self._build_prompt(category, data)
+
+        # A cached review is returned at once
+        cache_key = self._get_cache_key(category, prompt)
+        if cache_key:
+            file_review = self.cache.get(cache_key)
+            if file_review is not None:
+                yield file_review
+                return
+
+        # Stream the review from the LM API, collecting it for the cache
+        chunks = []
+        for chunk in self.lm_api.stream_response(prompt):
+            chunks.append(chunk)
+            yield chunk
+
+        file_review = "".join(chunks)
+        logger.debug("Generated review for category '%s': '%s'", category, file_review)
+
+        if cache_key and file_review.strip():
+            self.cache.put(cache_key, file_review)
+
+    def review_batch(self, category: str, files: List[Tuple[str, str]]) -> Dict[str, str]:
+        """
+        Reviews several small files of the same category in one request.
+
+        Args:
+            category (str): The type of review to generate.
+            files (List[Tuple[str, str]]): The names and contents of the files.
+
+        Returns:
+            Dict[str, str]: The review of every file, keyed by its name.
+
+        Raises:
+            BatchParseError: If the response can't be split into the reviews of the files.
+        """
+
+        names = [name for name, _ in files]
+
+        # The response covers every file, so its budget grows with the batch
+        prompt = self._build_prompt(category, format_batch(files))
+        max_tokens = batch_max_tokens(len(files))
+
+        # A cached response is only used if it can still be split (e.g. after the section format changed)
+        cache_key = self._get_cache_key(category, prompt, max_tokens)
+        if cache_key:
+            batch_review = self.cache.get(cache_key)
+            if batch_review is not None:
+                try:
+                    return split_batch_review(batch_review, names)
+                except BatchParseError as e:
+                    logger.debug("Cached batch review is not recognized: %s", e)
+
+        batch_review = self.get_response(prompt=prompt, max_tokens=max_tokens)
+        logger.debug("Generated batch review for category '%s': '%s'", category, batch_review)
+
+        # A response that can't be split (e.g. cut off by the token limit) is not cached
+        batch_reviews = split_batch_review(batch_review, names)
+        if cache_key:
+            self.cache.put(cache_key, batch_review)
+
+        return batch_reviews
+
+    def review_chunks(self, category: str, chunks: List[Chunk]) -> str:
+        """
+        Reviews the parts of a large file in parallel and combines the partial reviews into one.
+
+        Args:
+            category (str): The type of review to generate.
+            chunks (List[Chunk]): The parts of the file.
+
+        Returns:
+            str: The combined review of the file.
+        """
+
+        return self.review("reduce", self._review_parts(category, chunks))
+
+    def review_chunks_stream(self, category: str, chunks: List[Chunk]) -> Iterator[str]:
+        """
+        Like review_chunks, but yields the combined review while the LM API generates it.
+
+        Args:
+            category (str): The type of review to generate.
+            chunks (List[Chunk]): The parts of the file.
+
+        Yields:
+            str: The next piece of the combined review.
+        """
+
+        yield from self.review_stream("reduce", self._review_parts(category, chunks))
+
+    def _review_parts(self, category: str, chunks: List[Chunk]) -> str:
+        """
+        Reviews every part of a file in the shared pool and joins the partial reviews for the reduce step.
+
+        Args:
+            category (str): The type of review to generate.
+            chunks (List[Chunk]): The parts of the file.
+
+        Returns:
+            str: The partial reviews, each with a header naming its part.
+
+        Raises:
+            Exception: The first error that occurred while reviewing a part.
+        """
+
+        def with_header(index: int, chunk: Chunk, data: str) -> str:
+            return CHUNK_HEADER.format(
+                index=index + 1,
+                count=len(chunks),
+                start=chunk.start_line,
+                end=chunk.end_line,
+                data=data
+            )
+
+        logger.debug("Reviewing %s part(s)", len(chunks))
+
+        futures = [
+            self._part_executor.submit(self.review, category, with_header(index, chunk, chunk.text))
+            for index, chunk in enumerate(chunks)
+        ]
+
+        partial_reviews = []
+        try:
+            for index, (chunk, future) in enumerate(zip(chunks, futures)):
+                partial_reviews.append(with_header(index, chunk, future.result()))
+        finally:
+            # The remaining parts of a failed file are not sent
+            for future in futures:
+                future.cancel()
+
+        return "\n\n".join(partial_reviews)
+
+    def _build_prompt(self, category: str, data: str) -> list:
+        """
+        Constructs the prompt for a review and records how long it took.
+
+        Args:
+            category (str): The type of review to generate.
+            data (str): The input data or content that needs to be reviewed.
+
+        Returns:
+            list: The constructed prompt.
+        """
+
+        start = time.perf_counter()
+        prompt = prompt_handler(category, data)
+
+        if self.metrics is not None:
+            self.metrics.observe("prompt", time.perf_counter() - start)
+
+        logger.debug("Constructed prompt for category '%s': %s", category, prompt)
+
+        return prompt
+
+    def _get_cache_key(self, category: str, prompt: list, max_tokens: int = None) -> str:
+        """
+        Builds the cache key of a review from the prompt and the model parameters.
+
+        Args:
+            category (str): The type of review to generate.
+            prompt (list): The constructed prompt.
+            max_tokens (int, optional): The maximum number of tokens of the response, if it isn't the configured one.
+
+        Returns:
+            str: The cache key, or None if caching is disabled.
+        """
+
+        if self.cache is None:
+            return None
+
+        return ReviewCache.make_key(category, request_handler(prompt, max_tokens), self.lm_api.get_model())
+
+    async def aget_response(self, prompt: list) -> str:
+        """
+        Asynchronous counterpart of get_response.
+
+        Args:
+            prompt (list): A list of dictionaries representing the conversation prompt.
+
+        Returns:
+            str: The response received from the API.
+        """
+
+        # Create the asynchronous client on first use
+        if self.async_lm_api is None:
+            if self.api_url:
+                self.async_lm_api = AsyncLMAPI(self.api_url, metrics=self.metrics, rate_limiter=self.rate_limiter)
+            else:
+                self.async_lm_api = AsyncLMAPI(metrics=self.metrics, rate_limiter=self.rate_limiter)
+
+        # Get the response from the LM API
+        logger.debug("Sending prompt to API: %s", prompt)
+        response = await self.async_lm_api.get_response(prompt)
+        logger.debug("Received response from API: '%s'", response)
+
+        return response
+
+    async def areview(self, category: str, data: str) -> str:
+        """
+        Asynchronous counterpart of review, for embedding the assistant into asyncio services.
+
+        Args:
+            category (str): The type of review to generate.
+            data (str): The input data or content that needs to be reviewed.
+
+        Returns:
+            str: The review generated by the LM API based on the provided category and data.
+        """
+
+        # Construct the prompt
+        prompt = self._build_prompt(category, data)
+
+        # Return the cached review if the same prompt has already been answered
+        # (the key and the cache are built, read and written in a thread, so asking the servers
+        # for their model and SQLite don't block the event loop)
+        cache_key = await asyncio.to_thread(self._get_cache_key, category, prompt)
+        if cache_key:
+            file_review = await asyncio.to_thread(self.cache.get, cache_key)
+            if file_review is not None:
+                return file_review
+
+        # Generate the review by sending the prompt to the LM API
+        file_review = await self.aget_response(prompt=prompt)
+        logger.debug("Generated review for category '%s': '%s'", category, file_review)
+
+        if cache_key and file_review.strip():
+            await asyncio.to_thread(self.cache.put, cache_key, file_review)
+
+        return file_review
+
+    def close(self) -> None:
+        """
+        Stops the workers reviewing the parts of large files and closes the connections of the client.
+        """
+
+        self._part_executor.shutdown(wait=False, cancel_futures=True)
+        self.lm_api.close()
+
+    async def aclose(self) -> None:
+        """
+        Closes the connections of the asynchronous client.
+        """
+
+        if self.async_lm_api is not None:
+            await self.async_lm_api.aclose()
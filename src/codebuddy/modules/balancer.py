@@ -0,0 +1,360 @@
+
+import time
+import threading
+import urllib.parse
+import logging
+
+from typing import List, Optional, Tuple
+
+from .config import API as API_CONFIG
+
+
+# Setting up the logger for this module
+logger = logging.getLogger(__name__)
+
+# Options that can follow the URL of an endpoint, e.g. "http://host:1234,weight=2,concurrency=4"
+ENDPOINT_OPTIONS = {
+    "weight": float,        # Share of the requests relative to other endpoints
+    "concurrency": int,     # Maximum number of requests in flight
+}
+
+
+def parse_endpoint(spec: str) -> Tuple[str, dict]:
+    """
+    Splits an endpoint specification into the base URL and its options.
+
+    Args:
+        spec (str): The base URL of the API, optionally followed by comma-separated options.
+
+    Returns:
+        Tuple[str, dict]: The base URL and the options converted to their types.
+
+    Raises:
+        ValueError: If an option is unknown or its value is invalid.
+    """
+
+    url, *options = spec.split(",")
+
+    result = {}
+    for option in options:
+        name, _, value = option.partition("=")
+        name = name.strip()
+
+        if name not in ENDPOINT_OPTIONS:
+            raise ValueError(f"unknown endpoint option '{name}'")
+
+        result[name] = ENDPOINT_OPTIONS[name](value)
+        if result[name] <= 0:
+            raise ValueError(f"endpoint option '{name}' must be positive")
+
+    return url.strip(), result
+
+
+class Endpoint:
+
+    """
+    A single LM server with its load and health state.
+    """
+
+    def __init__(self, base_url: str, weight: float = 1.0, concurrency: int = None) -> None:
+        """
+        Initializes the Endpoint.
+
+        Args:
+            base_url (str): The base URL of the API.
+            weight (float, optional): Share of the requests relative to other endpoints.
+            concurrency (int, optional): Maximum number of requests in flight, unlimited if not provided.
+        """
+
+        self.base_url = base_url
+        self.url = urllib.parse.urljoin(base_url, API_CONFIG.get("endpoint"))
+        self.weight = weight
+        self.concurrency = concurrency
+
+        self.outstanding = 0            # Number of requests in flight
+        self.failures = 0               # Number of consecutive failed requests
+        self.healthy = True             # Ejected endpoints get requests only as a last resort
+        self.next_check = 0.0           # Time of the next health check of an ejected endpoint
+        self.checking = False           # Whether a health check is running
+
+        # Adaptive limit of requests in flight, adjusted by the feedback of the server
+        self.max_limit = concurrency or API_CONFIG.get("max_concurrency")
+        self.limit = float(API_CONFIG.get("initial_concurrency"))
+        if self.max_limit:
+            self.limit = min(self.limit, self.max_limit)
+
+        self.min_latency = None         # Latency of the server when it is not loaded
+        self.last_decrease = 0.0        # Time the limit was last decreased
+        self.paused_until = 0.0         # Time until which the server asked not to send requests (Retry-After)
+
+    def capacity(self) -> int:
+        """
+        Returns the number of requests the endpoint may have in flight, None for no limit.
+        """
+
+        if API_CONFIG.get("adaptive_concurrency"):
+            return max(1, int(self.limit))
+
+        return self.concurrency
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.url!r}, outstanding={self.outstanding}, healthy={self.healthy})"
+
+
+class EndpointPool:
+
+    """
+    Distributes requests over several LM servers.
+
+    Every request goes to the healthy endpoint with the fewest requests in flight relative
+    to its weight. Endpoints failing several times in a row are ejected and health-checked
+    in the background until they respond again.
+
+    The number of requests in flight to an endpoint follows additive increase, multiplicative
+    decrease (AIMD): it grows by one per round trip while responses are fast, and shrinks when
+    responses slow down or the server reports that it is overloaded (429 or 503).
+    """
+
+    def __init__(self, specs: List[str]) -> None:
+        """
+        Initializes the EndpointPool.
+
+        Args:
+            specs (List[str]): The endpoint specifications, see parse_endpoint.
+        """
+
+        self.endpoints = []
+        for spec in specs:
+            url, options = parse_endpoint(spec)
+            self.endpoints.append(Endpoint(url, **options))
+
+        self._condition = threading.Condition()
+        self._closed = False
+        logger.debug("Initialized EndpointPool with endpoints: %s", self.endpoints)
+
+    def acquire(self, exclude: List[Endpoint] = ()) -> Endpoint:
+        """
+        Chooses the endpoint for the next request and counts the request as in flight,
+        waiting while all endpoints are at their concurrency limit or paused.
+
+        Args:
+            exclude (List[Endpoint], optional): Endpoints that already failed for this request.
+
+        Returns:
+            Endpoint: The chosen endpoint, or None if all endpoints are excluded.
+        """
+
+        with self._condition:
+            while True:
+                endpoint, wait = self._try_acquire(exclude)
+                if endpoint is not None or wait is None:
+                    return endpoint
+
+                # Wait until a request finishes, a pause ends or an endpoint recovers
+                self._condition.wait(timeout=wait)
+
+    def try_acquire(self, exclude: List[Endpoint] = ()) -> Tuple[Optional[Endpoint], Optional[float]]:
+        """
+        Like acquire, but returns at once, for callers that must not block (e.g. an event loop).
+
+        Args:
+            exclude (List[Endpoint], optional): Endpoints that already failed for this request.
+
+        Returns:
+            Tuple[Optional[Endpoint], Optional[float]]: The chosen endpoint, or None and the longest time
+            in seconds worth waiting before trying again (None if all endpoints are excluded).
+        """
+
+        with self._condition:
+            return self._try_acquire(exclude)
+
+    def _try_acquire(self, exclude: List[Endpoint]) -> Tuple[Optional[Endpoint], Optional[float]]:
+        """
+        Chooses an endpoint that is not paused and below its concurrency limit. Must be called with the lock held.
+        """
+
+        self._schedule_health_checks()
+
+        candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude]
+        if not candidates:
+            return None, None
+
+        # Ejected endpoints are used only if there is nothing else left
+        healthy = [endpoint for endpoint in candidates if endpoint.healthy]
+        candidates = healthy or candidates
+
+        now = time.monotonic()
+        available = [
+            endpoint for endpoint in candidates
+            if endpoint.paused_until <= now
+            and (not endpoint.capacity() or endpoint.outstanding < endpoint.capacity())
+        ]
+
+        if available:
+            endpoint = min(available, key=lambda endpoint: (endpoint.outstanding + 1) / endpoint.weight)
+            endpoint.outstanding += 1
+            return endpoint, None
+
+        # A finished request may free an endpoint earlier, pauses end by themselves
+        pauses = [endpoint.paused_until - now for endpoint in candidates if endpoint.paused_until > now]
+
+        return None, min([1.0] + pauses)
+
+    def release(
+            self,
+            endpoint: Endpoint,
+            success: bool,
+            latency: float = None,
+            overloaded: bool = False,
+            retry_after: float = None
+        ) -> None:
+        """
+        Counts a request as finished and updates the health and the concurrency limit of the endpoint.
+
+        Args:
+            endpoint (Endpoint): The endpoint the request was sent to.
+            success (bool): Whether the endpoint handled the request (client errors count as handled).
+            latency (float, optional): Seconds until the response arrived, if it was successful.
+            overloaded (bool, optional): Whether the server reported that it is overloaded (429 or 503).
+            retry_after (float, optional): Seconds the server asked to wait before the next request.
+        """
+
+        with self._condition:
+            self._adjust_limit(endpoint, latency, overloaded)
+
+            if retry_after:
+                endpoint.paused_until = max(endpoint.paused_until, time.monotonic() + retry_after)
+                logger.info("Endpoint %s asked to pause for %.1fs", endpoint.base_url, retry_after)
+
+            endpoint.outstanding -= 1
+
+            if success:
+                endpoint.failures = 0
+                if not endpoint.healthy:
+                    endpoint.healthy = True
+                    logger.info("Endpoint %s is available again", endpoint.base_url)
+            else:
+                endpoint.failures += 1
+                if endpoint.healthy and endpoint.failures >= API_CONFIG.get("eject_failures"):
+                    endpoint.healthy = False
+                    endpoint.next_check = time.monotonic() + API_CONFIG.get("eject_time")
+                    logger.warning("Endpoint %s is ejected after %s failure(s)", endpoint.base_url, endpoint.failures)
+
+            self._condition.notify_all()
+
+    def _adjust_limit(self, endpoint: Endpoint, latency: float, overloaded: bool) -> None:
+        """
+        Applies AIMD to the concurrency limit of an endpoint. Must be called with the lock held.
+
+        Args:
+            endpoint (Endpoint): The endpoint the request was sent to.
+            latency (float): Seconds until the response arrived, or None.
+            overloaded (bool): Whether the server reported that it is overloaded.
+        """
+
+        now = time.monotonic()
+
+        if latency is not None:
+            # The unloaded latency follows the fastest responses, and slowly forgets them
+            # since the size of the reviewed files changes over time
+            if endpoint.min_latency is None or latency < endpoint.min_latency:
+                endpoint.min_latency = latency
+            else:
+                endpoint.min_latency += (latency - endpoint.min_latency) * 0.01
+
+        slow = latency is not None and latency > endpoint.min_latency * API_CONFIG.get("latency_tolerance")
+
+        if overloaded or slow:
+            # Decrease at most once per round trip, the responses to the requests
+            # sent before the decrease still reflect the old limit
+            if now - endpoint.last_decrease >= (endpoint.min_latency or 0.0):
+                endpoint.limit = max(1.0, endpoint.limit * (0.5 if overloaded else 0.9))
+                endpoint.last_decrease = now
+                logger.debug("Concurrency limit of %s decreased to %.1f", endpoint.base_url, endpoint.limit)
+
+        elif latency is not None and endpoint.outstanding * 2 >= int(endpoint.limit):
+            # Increase by one per round trip, but only while at least half of the limit
+            # is used, otherwise a limit that is never reached would grow without bound
+            endpoint.limit += 1.0 / endpoint.limit
+            if endpoint.max_limit:
+                endpoint.limit = min(endpoint.limit, float(endpoint.max_limit))
+
+    def _schedule_health_checks(self) -> None:
+        """
+        Starts health checks of ejected endpoints whose waiting time has expired.
+        Must be called with the lock held.
+        """
+
+        if self._closed:
+            return
+
+        now = time.monotonic()
+        for endpoint in self.endpoints:
+            if not endpoint.healthy and not endpoint.checking and endpoint.next_check <= now:
+                endpoint.checking = True
+                threading.Thread(
+                    target=self._check_health,
+                    args=(endpoint,),
+                    name="codebuddy-health-check",
+                    daemon=True
+                ).start()
+
+    def close(self) -> None:
+        """
+        Stops starting health checks, the running ones end with their request.
+        """
+
+        with self._condition:
+            self._closed = True
+
+    def models(self) -> List[str]:
+        """
+        Asks the endpoints for the models they serve.
+
+        Returns:
+            List[str]: The sorted ids of the models of all endpoints that answered, empty if none did.
+        """
+
+        import requests
+
+        models = set()
+        for endpoint in self.endpoints:
+            url = urllib.parse.urljoin(endpoint.base_url, API_CONFIG.get("models_endpoint"))
+            try:
+                response = requests.get(url, headers=API_CONFIG.get("headers"), timeout=API_CONFIG.get("connect_timeout"))
+                response.raise_for_status()
+                models.update(model["id"] for model in response.json().get("data", []))
+            except (requests.RequestException, ValueError, KeyError, TypeError, AttributeError) as e:
+                logger.debug("Models of %s are unknown: %s", endpoint.base_url, e)
+
+        return sorted(models)
+
+    def _check_health(self, endpoint: Endpoint) -> None:
+        """
+        Checks whether an ejected endpoint responds again and re-admits it if so.
+
+        Args:
+            endpoint (Endpoint): The endpoint to check.
+        """
+
+        import requests
+
+        url = urllib.parse.urljoin(endpoint.base_url, API_CONFIG.get("health_endpoint"))
+        try:
+            response = requests.get(url, headers=API_CONFIG.get("headers"), timeout=API_CONFIG.get("connect_timeout"))
+            recovered = response.status_code == 200
+        except requests.RequestException as e:
+            logger.debug("Health check of %s failed: %s", endpoint.base_url, e)
+            recovered = False
+
+        with self._condition:
+            endpoint.checking = False
+
+            if recovered:
+                endpoint.healthy = True
+                endpoint.failures = 0
+                logger.info("Endpoint %s passed the health check", endpoint.base_url)
+            else:
+                endpoint.next_check = time.monotonic() + API_CONFIG.get("eject_time")
+
+            self._condition.notify_all()
@@ -0,0 +1,147 @@
+
+import re
+import math
+import pathlib
+import logging
+
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from .config import BATCH_HEADER, BATCH_FILE_HEADER
+from .config import API as API_CONFIG
+from .config import BATCHING as BATCHING_CONFIG
+from .config import CHUNKING as CHUNKING_CONFIG
+
+
+# Setting up the logger for this module
+logger = logging.getLogger(__name__)
+
+# Matches the header that starts the section of a file in a batch review
+SECTION_HEADER = re.compile(r"^\s*#{1,6}\s*File:\s*`?(?P<path>.+?)`?\s*$", re.MULTILINE)
+
+
+class BatchParseError(ValueError):
+
+    """
+    Raised when a batch review can't be split into the reviews of its files.
+    """
+
+
+def plan_batches(
+        files: Dict[str, Sequence[pathlib.Path]],
+        small_file_tokens: int = BATCHING_CONFIG.get("small_file_tokens"),
+        max_tokens: int = BATCHING_CONFIG.get("max_tokens"),
+        max_files: int = BATCHING_CONFIG.get("max_files"),
+        get_size: Callable[[pathlib.Path], int] = None
+    ) -> List[Tuple[str, List[pathlib.Path]]]:
+    """
+    Groups consecutive small files of the same category into batches.
+
+    Large files get a task of their own, so the order of the files is preserved.
+    The size of a file is estimated from its size on disk, without reading it.
+
+    Args:
+        files (Dict[str, Sequence[Path]]): Dictionary with file paths sorted by category.
+        small_file_tokens (int, optional): Files with up to this many estimated tokens are batched.
+        max_tokens (int, optional): Maximum estimated number of tokens in one batch.
+        max_files (int, optional): Maximum number of files in one batch.
+        get_size (Callable[[Path], int], optional): Returns the size of a file in bytes. Defaults to its size on disk.
+
+    Returns:
+        List[Tuple[str, List[Path]]]: Review tasks, each with a category and one or more files.
+    """
+
+    tasks = []
+
+    for category in files.keys():
+        batch = []
+        batch_tokens = 0
+
+        for file_path in files.get(category):
+            size = get_size(file_path) if get_size else file_path.stat().st_size
+            tokens = math.ceil(size / CHUNKING_CONFIG.get("chars_per_token"))
+
+            # Start a new batch if the file doesn't fit into the current one
+            if batch and (tokens > small_file_tokens or len(batch) >= max_files or batch_tokens + tokens > max_tokens):
+                tasks.append((category, batch))
+                batch = []
+                batch_tokens = 0
+
+            if tokens > small_file_tokens:
+                tasks.append((category, [file_path]))
+            else:
+                batch.append(file_path)
+                batch_tokens += tokens
+
+        if batch:
+            tasks.append((category, batch))
+
+    logger.debug("Planned %s review task(s)", len(tasks))
+
+    return tasks
+
+
+def format_batch(files: List[Tuple[str, str]]) -> str:
+    """
+    Joins several files into the data of one prompt.
+
+    Args:
+        files (List[Tuple[str, str]]): The names and contents of the files.
+
+    Returns:
+        str: The data for the review prompt.
+    """
+
+    data = "\n\n".join(BATCH_FILE_HEADER.format(path=name, data=content) for name, content in files)
+
+    return BATCH_HEADER.format(count=len(files), data=data)
+
+
+def batch_max_tokens(count: int) -> int:
+    """
+    Returns the response budget of a batch, which grows with its number of files.
+
+    Args:
+        count (int): The number of files in the batch.
+
+    Returns:
+        int: The maximum number of tokens of the response, never less than that of a single review.
+    """
+
+    return max(API_CONFIG.get("max_tokens"), count * BATCHING_CONFIG.get("completion_tokens_per_file"))
+
+
+def split_batch_review(review: str, names: List[str]) -> Dict[str, str]:
+    """
+    Splits the review of a batch into the reviews of its files.
+
+    Args:
+        review (str): The review of the whole batch.
+        names (List[str]): The names of the files in the batch.
+
+    Returns:
+        Dict[str, str]: The review of every file, keyed by its name.
+
+    Raises:
+        BatchParseError: If the review of any file is missing or can't be attributed.
+    """
+
+    sections = {}
+    headers = list(SECTION_HEADER.finditer(review))
+
+    for index, header in enumerate(headers):
+        # The section lasts until the next header
+        end = headers[index + 1].start() if index + 1 < len(headers) else len(review)
+
+        # Models sometimes shorten or extend paths, so match by the end of the name
+        path = header.group("path")
+        matches = [name for name in names if name == path or name.endswith("/" + path) or path.endswith("/" + name)]
+        if len(matches) != 1 or matches[0] in sections:
+            raise BatchParseError(f"Unexpected file section in batch review: '{path}'")
+
+        sections[matches[0]] = review[header.end():end].strip()
+
+    missing = [name for name in names if name not in sections]
+    if missing:
+        raise BatchParseError(f"Batch review has no section for: {', '.join(missing)}")
+
+    return sections
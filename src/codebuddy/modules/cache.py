@@ -0,0 +1,197 @@
+
+import json
+import time
+import pathlib
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from typing import Optional
+
+from .config import CACHE as CACHE_CONFIG
+
+
+# Setting up the logger for this module
+logger = logging.getLogger(__name__)
+
+
+class ReviewCache:
+
+    """
+    A persistent, content-addressed cache of reviews stored in SQLite.
+
+    Reviews are keyed by a hash of everything that affects the answer of the model,
+    so an unchanged file is never sent to the LM API twice. The least recently used
+    reviews are evicted when the cache grows too large or too old.
+    """
+
+    def __init__(
+            self,
+            path: str = CACHE_CONFIG.get("path"),
+            max_size: int = CACHE_CONFIG.get("max_size"),
+            max_age: float = CACHE_CONFIG.get("max_age")
+        ) -> None:
+        """
+        Opens (and creates if necessary) the cache database.
+
+        Args:
+            path (str, optional): Path to the SQLite database file.
+            max_size (int, optional): Maximum total size of cached reviews in bytes.
+            max_age (float, optional): Maximum time in seconds since a review was last used.
+        """
+
+        self.path = pathlib.Path(path).expanduser().resolve()
+        self.max_size = max_size
+        self.max_age = max_age
+
+        # Counters of cache lookups for the current run
+        self.hits = 0
+        self.misses = 0
+
+        # Create the directory of the database if it doesn't exist
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # The connection is shared between review workers and guarded by a lock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS reviews ("
+            "key TEXT PRIMARY KEY, "
+            "review TEXT NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS reviews_accessed_at ON reviews (accessed_at)"
+        )
+        self._connection.commit()
+        logger.debug("Opened review cache: %s", self.path)
+
+    @staticmethod
+    def make_key(category: str, request: dict, model: str) -> str:
+        """
+        Builds the cache key of a review.
+
+        The key depends on the model rather than on the servers, so adding, removing or reordering
+        servers of the same model keeps the cached reviews, while a server of another model doesn't get them.
+
+        Args:
+            category (str): The category of the reviewed file.
+            request (dict): The request body, containing the rendered prompt and the model parameters.
+            model (str): The identity of the model answering the requests (see LMAPI.get_model).
+
+        Returns:
+            str: The hexadecimal SHA-256 digest identifying the review.
+        """
+
+        payload = json.dumps(
+            {"category": category, "request": request, "model": model},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached review for the key and marks it as recently used.
+
+        Args:
+            key (str): The cache key of the review.
+
+        Returns:
+            Optional[str]: The cached review, or None if there is none.
+        """
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT review FROM reviews WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                logger.debug("Cache miss: %s", key)
+                return None
+
+            self._connection.execute(
+                "UPDATE reviews SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._connection.commit()
+
+            self.hits += 1
+            logger.debug("Cache hit: %s", key)
+
+            return row[0]
+
+    def put(self, key: str, review: str) -> None:
+        """
+        Stores a review in the cache.
+
+        Args:
+            key (str): The cache key of the review.
+            review (str): The review to store.
+        """
+
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO reviews (key, review, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, review, len(key) + len(review.encode("utf-8")), now, now)
+            )
+            self._connection.commit()
+            logger.debug("Cached review: %s", key)
+
+    def evict(self) -> int:
+        """
+        Removes reviews that were not used for too long, then the least recently used
+        reviews until the cache fits into the size limit.
+
+        Returns:
+            int: The number of removed reviews.
+        """
+
+        with self._lock:
+            # Remove expired reviews
+            removed = self._connection.execute(
+                "DELETE FROM reviews WHERE accessed_at < ?", (time.time() - self.max_age,)
+            ).rowcount
+
+            # Remove the least recently used reviews that exceed the size limit
+            total_size = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM reviews"
+            ).fetchone()[0]
+
+            if total_size > self.max_size:
+                rows = self._connection.execute(
+                    "SELECT key, size FROM reviews ORDER BY accessed_at"
+                ).fetchall()
+
+                stale_keys = []
+                for key, size in rows:
+                    if total_size <= self.max_size:
+                        break
+                    stale_keys.append((key,))
+                    total_size -= size
+
+                self._connection.executemany("DELETE FROM reviews WHERE key = ?", stale_keys)
+                removed += len(stale_keys)
+
+            self._connection.commit()
+
+        logger.debug("Evicted %s review(s) from cache", removed)
+
+        return removed
+
+    def close(self) -> None:
+        """
+        Closes the cache database.
+        """
+
+        with self._lock:
+            self._connection.close()
+
+        logger.debug("Closed review cache: %s", self.path)
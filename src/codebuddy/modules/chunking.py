@@ -0,0 +1,228 @@
+
+import ast
+import math
+import logging
+
+from typing import List, NamedTuple, Tuple
+
+from .config import CHUNKING as CHUNKING_CONFIG
+
+
+# Setting up the logger for this module
+logger = logging.getLogger(__name__)
+
+
+class Chunk(NamedTuple):
+
+    """
+    A part of a file, covering a range of its lines.
+    """
+
+    start_line: int     # Number of the first line, starting from 1
+    end_line: int       # Number of the last line (inclusive)
+    text: str           # Content of the lines
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens in a text without a tokenizer.
+
+    Args:
+        text (str): The text to estimate.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+
+    return math.ceil(len(text) / CHUNKING_CONFIG.get("chars_per_token"))
+
+
+def split_source(data: str, suffix: str, max_tokens: int = CHUNKING_CONFIG.get("max_tokens")) -> List[Chunk]:
+    """
+    Splits the content of a file into parts that fit into the token budget.
+
+    Python sources are split at the boundaries of top-level statements, descending into
+    classes and functions that are too large. Other files are split at blank lines.
+    Blocks that still don't fit are split by lines. Joining the texts of the parts
+    gives back the original content.
+
+    Args:
+        data (str): The content of the file.
+        suffix (str): The extension of the file (e.g. ".py"), used to choose the splitting method.
+        max_tokens (int, optional): The maximum estimated number of tokens in one part.
+
+    Returns:
+        List[Chunk]: The parts of the file, a single part if the whole file fits.
+    """
+
+    lines = data.splitlines(keepends=True)
+
+    # Small files are reviewed as a whole
+    if len(lines) <= 1 or estimate_tokens(data) <= max_tokens:
+        return [Chunk(1, max(len(lines), 1), data)]
+
+    units = None
+    if suffix.lower() == ".py":
+        units = _python_units(data, lines, max_tokens)
+
+    # Line-based fallback for other languages and unparsable sources
+    if units is None:
+        units = _block_units(lines)
+
+    chunks = _pack(units, lines, max_tokens)
+    logger.debug("Split %s line(s) into %s part(s)", len(lines), len(chunks))
+
+    return chunks
+
+
+def _line_range_text(lines: List[str], start: int, end: int) -> str:
+    """
+    Returns the text of the lines from start to end (1-based, inclusive).
+    """
+
+    return "".join(lines[start - 1:end])
+
+
+def _python_units(data: str, lines: List[str], max_tokens: int) -> List[Tuple[int, int]]:
+    """
+    Splits Python source into contiguous line ranges at statement boundaries.
+
+    Returns:
+        List[Tuple[int, int]]: The line ranges, or None if the source can't be parsed.
+    """
+
+    try:
+        tree = ast.parse(data)
+    except (SyntaxError, ValueError) as e:
+        logger.debug("Falling back to line-based splitting: %s", e)
+        return None
+
+    units = _node_units(tree.body, 1, len(lines), lines, max_tokens)
+
+    return units or None
+
+
+def _node_units(nodes: list, first_line: int, last_line: int, lines: List[str], max_tokens: int) -> List[Tuple[int, int]]:
+    """
+    Turns a list of statements into contiguous line ranges covering first_line to last_line.
+
+    Comments and blank lines before a statement belong to it, so that nothing is lost.
+    Classes and functions that don't fit into the budget are split by their own bodies.
+    """
+
+    units = []
+    start = first_line
+
+    for index, node in enumerate(nodes):
+        # The range of the statement ends where the next statement (with its decorators) begins
+        if index + 1 < len(nodes):
+            end = _node_start(nodes[index + 1]) - 1
+        else:
+            end = last_line
+
+        if end < start:
+            continue
+
+        body = getattr(node, "body", None)
+        too_large = estimate_tokens(_line_range_text(lines, start, end)) > max_tokens
+
+        if too_large and isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)) and body:
+            # The header of the definition goes together with its first statement
+            units.extend(_node_units(body, start, end, lines, max_tokens))
+        else:
+            units.append((start, end))
+
+        start = end + 1
+
+    return units
+
+
+def _node_start(node: ast.AST) -> int:
+    """
+    Returns the first line of a statement, including its decorators.
+    """
+
+    decorators = getattr(node, "decorator_list", None) or []
+
+    return min([node.lineno] + [decorator.lineno for decorator in decorators])
+
+
+def _block_units(lines: List[str]) -> List[Tuple[int, int]]:
+    """
+    Splits lines into contiguous ranges that end with a blank line.
+    """
+
+    units = []
+    start = 1
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip() and number >= start:
+            units.append((start, number))
+            start = number + 1
+
+    if start <= len(lines):
+        units.append((start, len(lines)))
+
+    return units
+
+
+def _pack(units: List[Tuple[int, int]], lines: List[str], max_tokens: int) -> List[Chunk]:
+    """
+    Groups consecutive line ranges into parts that fit into the token budget.
+    """
+
+    chunks = []
+    start = None
+    end = None
+
+    def flush():
+        if start is not None:
+            chunks.append(Chunk(start, end, _line_range_text(lines, start, end)))
+
+    for unit_start, unit_end in units:
+        unit_text = _line_range_text(lines, unit_start, unit_end)
+
+        # A single range that doesn't fit is split by lines
+        if estimate_tokens(unit_text) > max_tokens:
+            flush()
+            start = None
+            chunks.extend(_split_lines(lines, unit_start, unit_end, max_tokens))
+            continue
+
+        # Start a new part if the range doesn't fit into the current one
+        if start is not None and estimate_tokens(_line_range_text(lines, start, unit_end)) > max_tokens:
+            flush()
+            start = None
+
+        if start is None:
+            start = unit_start
+        end = unit_end
+
+    flush()
+
+    return chunks
+
+
+def _split_lines(lines: List[str], first_line: int, last_line: int, max_tokens: int) -> List[Chunk]:
+    """
+    Splits a range of lines into parts that fit into the token budget, line by line.
+    A single line longer than the budget forms its own part.
+    """
+
+    chunks = []
+    start = first_line
+    size = 0
+
+    for number in range(first_line, last_line + 1):
+        line_tokens = estimate_tokens(lines[number - 1])
+
+        if number > start and size + line_tokens > max_tokens:
+            chunks.append(Chunk(start, number - 1, _line_range_text(lines, start, number - 1)))
+            start = number
+            size = 0
+
+        size += line_tokens
+
+    chunks.append(Chunk(start, last_line, _line_range_text(lines, start, last_line)))
+
+    return chunks
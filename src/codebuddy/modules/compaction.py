@@ -0,0 +1,326 @@
+
+import io
+import re
+import ast
+import logging
+import tokenize
+
+from typing import List, NamedTuple, Optional, Set
+
+from .chunking import estimate_tokens
+from .config import COMPACTION as COMPACTION_CONFIG
+
+
+# Setting up the logger for this module
+logger = logging.getLogger(__name__)
+
+# A literal value: a number, a quoted string or a keyword constant
+LITERAL = (
+    r"""(?:-?(?:0[xX][0-9a-fA-F_]+|\d[\d_]*(?:\.\d*)?(?:[eE][-+]?\d+)?)[lLuUfF]*"""
+    r"""|"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'"""
+    r"""|true|false|null|nil|None|True|False)"""
+)
+
+# A line holding only literals separated by commas and brackets, e.g. a row of a table
+DATA_LINE = re.compile(rf"^[\s\[\]{{}}(),;:]*{LITERAL}(?:[\s\[\]{{}}(),;:]+{LITERAL})*[\s\[\]{{}}(),;:]*$")
+
+# A line of a base64 blob, possibly quoted or concatenated (with digits and letters of both cases)
+BASE64_LINE = re.compile(r"^(?=.*\d)(?=.*[a-z])(?=.*[A-Z])[\s\"'`(+]*[A-Za-z0-9+/]{40,}={0,2}[\s\"'`)+,;\\]*$")
+
+# A string literal in code, the quotes are matched one after another so a line is scanned once
+STRING = re.compile(r"""(["'`])((?:(?!\1)[^\\]|\\.)*)\1""")
+
+
+class Compaction(NamedTuple):
+
+    """
+    A file prepared for a prompt, with the estimated tokens it saves.
+    """
+
+    text: str               # The compacted content, with the same lines as the file
+    original_tokens: int    # Estimated tokens of the file
+    tokens: int             # Estimated tokens of the compacted content
+
+
+def compact(
+        data: str,
+        suffix: str,
+        drop_docstrings: bool = COMPACTION_CONFIG.get("drop_docstrings"),
+        max_string_length: int = COMPACTION_CONFIG.get("max_string_length"),
+        min_data_lines: int = COMPACTION_CONFIG.get("min_data_lines")
+    ) -> Compaction:
+    """
+    Removes the parts of a file that cost prompt tokens without helping the review.
+
+    License headers, comment banners, docstrings (optionally), long string literals,
+    base64 blobs and tables of literals are removed or replaced by a short note,
+    trailing whitespace is stripped, and indentation is shortened. Lines are only
+    emptied, never removed, so the line numbers in reviews are those of the file.
+
+    Args:
+        data (str): The content of the file.
+        suffix (str): The extension of the file (e.g. ".py"), used to choose the rules of the language.
+        drop_docstrings (bool, optional): If True, docstrings are removed from Python code.
+        max_string_length (int, optional): Longer string literals and base64 runs are elided.
+        min_data_lines (int, optional): Runs of at least this many lines of literals are elided.
+
+    Returns:
+        Compaction: The compacted content and its estimated tokens before and after.
+    """
+
+    rules = COMPACTION_CONFIG.get("languages").get(suffix.lower())
+    lines = data.splitlines()
+
+    # Docstrings are found in the unchanged source
+    if rules and rules.get("docstrings") and drop_docstrings:
+        _drop_docstrings(data, lines)
+
+    if rules:
+        _strip_license_header(lines, rules)
+
+    _elide_runs(lines, rules, BASE64_LINE, 3, 0, "base64 data")
+    if rules:
+        _elide_runs(lines, rules, DATA_LINE, min_data_lines, COMPACTION_CONFIG.get("data_sample_lines"), "data")
+
+    # Inline data: long base64 runs anywhere, long string literals in code
+    base64_run = re.compile(rf"[A-Za-z0-9+/]{{{max_string_length},}}={{0,2}}")
+
+    def elide_base64(match: re.Match) -> str:
+        if not BASE64_LINE.match(match.group()):
+            return match.group()
+
+        return f"[{len(match.group())} characters of base64 elided]"
+
+    def elide_string(match: re.Match) -> str:
+        quote, content = match.groups()
+        if len(content) < max_string_length:
+            return match.group()
+
+        return f"{quote}{content[:16]}…[{len(content) - 16} characters elided]{quote}"
+
+    # The indentation of lines inside multi-line strings is part of the string, so indentation is only
+    # shortened in Python code, where the tokenizer finds these lines (other languages keep theirs)
+    string_lines = _string_lines(data) if rules and rules.get("docstrings") else None
+
+    indent_unit = None
+    if string_lines is not None:
+        indent_unit = _indent_unit([line for index, line in enumerate(lines) if index not in string_lines])
+
+    for index, line in enumerate(lines):
+        line = line.rstrip()
+        line = base64_run.sub(elide_base64, line)
+
+        if rules:
+            if _is_banner(line, rules):
+                line = ""
+
+            if len(line) > max_string_length:
+                line = STRING.sub(elide_string, line)
+
+            if indent_unit and index not in string_lines:
+                line = _reindent(line, indent_unit, COMPACTION_CONFIG.get("indent"))
+
+        lines[index] = line
+
+    text = "\n".join(lines)
+    if data.endswith(("\n", "\r")):
+        text += "\n"
+
+    compaction = Compaction(text, estimate_tokens(data), estimate_tokens(text))
+    logger.debug("Compacted %s estimated token(s) to %s", compaction.original_tokens, compaction.tokens)
+
+    return compaction
+
+
+def _marker(note: str, rules: Optional[dict]) -> str:
+    """
+    Returns a note about removed content, as a comment of the language if it has comments.
+    """
+
+    if rules and rules.get("line_comment"):
+        return f"{rules['line_comment']} [{note}]"
+
+    if rules and rules.get("block_comment"):
+        return f"{rules['block_comment'][0]} [{note}] {rules['block_comment'][1]}"
+
+    return f"[{note}]"
+
+
+def _replace_lines(lines: List[str], start: int, end: int, note: str, rules: Optional[dict]) -> None:
+    """
+    Replaces the lines from start to end (0-based, exclusive) by a note followed by empty lines.
+    """
+
+    indentation = lines[start][:len(lines[start]) - len(lines[start].lstrip())]
+    lines[start] = indentation + _marker(note, rules)
+
+    for index in range(start + 1, end):
+        lines[index] = ""
+
+
+def _strip_license_header(lines: List[str], rules: dict) -> None:
+    """
+    Removes the first comment of a file if it is a license header.
+    """
+
+    line_comment = rules.get("line_comment")
+    block_comment = rules.get("block_comment")
+
+    # The header follows the shebang, the encoding declaration and blank lines
+    start = 0
+    while start < len(lines) and (not lines[start].strip() or lines[start].startswith("#!") or "-*- coding" in lines[start]):
+        start += 1
+
+    if start == len(lines):
+        return
+
+    first = lines[start].lstrip()
+    end = start
+    if line_comment and first.startswith(line_comment):
+        while end < len(lines) and lines[end].lstrip().startswith(line_comment):
+            end += 1
+    elif block_comment and first.startswith(block_comment[0]):
+        while end < len(lines) and block_comment[1] not in lines[end][len(block_comment[0]) if end == start else 0:]:
+            end += 1
+
+        # A comment that is never closed is not a header
+        if end == len(lines):
+            return
+        end += 1
+
+        # Code after the end of the comment is kept
+        if lines[end - 1].split(block_comment[1], 1)[1].strip():
+            return
+    else:
+        return
+
+    header = "\n".join(lines[start:end]).lower()
+    if any(keyword in header for keyword in COMPACTION_CONFIG.get("license_keywords")):
+        _replace_lines(lines, start, end, "license header removed", rules)
+
+
+def _drop_docstrings(data: str, lines: List[str]) -> None:
+    """
+    Replaces the docstrings of a Python module, its classes and functions by a short placeholder.
+    """
+
+    try:
+        tree = ast.parse(data)
+    except (SyntaxError, ValueError) as e:
+        logger.debug("Docstrings are kept: %s", e)
+        return
+
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)) or not node.body:
+            continue
+
+        docstring = node.body[0]
+        if not (isinstance(docstring, ast.Expr) and isinstance(docstring.value, ast.Constant) and isinstance(docstring.value.value, str)):
+            continue
+
+        # Docstrings sharing a line with other code are kept (the offsets count UTF-8 bytes)
+        before = lines[docstring.lineno - 1].encode()[:docstring.col_offset].decode(errors="ignore")
+        after = lines[docstring.end_lineno - 1].encode()[docstring.end_col_offset:].decode(errors="ignore")
+        if before.strip() or after.strip():
+            continue
+
+        start = docstring.lineno - 1
+        lines[start] = before + '"""..."""'
+        for index in range(start + 1, docstring.end_lineno):
+            lines[index] = ""
+
+
+def _string_lines(data: str) -> Optional[Set[int]]:
+    """
+    Returns the (0-based) indices of the lines that continue a multi-line string of Python code,
+    None if the code can't be tokenized.
+    """
+
+    # The rows of the tokens must be those of str.splitlines
+    source = "\n".join(data.splitlines())
+
+    lines = set()
+    fstring_starts = []
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(source).readline):
+            if token.type == tokenize.STRING:
+                lines.update(range(token.start[0], token.end[0]))
+
+            # Since Python 3.12, f-strings are split into several tokens
+            elif token.type == getattr(tokenize, "FSTRING_START", None):
+                fstring_starts.append(token.start[0])
+            elif token.type == getattr(tokenize, "FSTRING_END", None):
+                lines.update(range(fstring_starts.pop(), token.end[0]))
+    except (tokenize.TokenError, SyntaxError) as e:
+        logger.debug("Indentation is kept: %s", e)
+        return None
+
+    return lines
+
+
+def _elide_runs(
+        lines: List[str],
+        rules: Optional[dict],
+        pattern: re.Pattern,
+        min_lines: int,
+        sample_lines: int,
+        note: str
+    ) -> None:
+    """
+    Replaces runs of at least min_lines lines matching the pattern, keeping the first sample_lines.
+    """
+
+    start = 0
+    while start < len(lines):
+        if not pattern.match(lines[start]):
+            start += 1
+            continue
+
+        end = start
+        while end < len(lines) and pattern.match(lines[end]):
+            end += 1
+
+        if end - start >= min_lines:
+            _replace_lines(lines, start + sample_lines, end, f"{end - start - sample_lines} lines of {note} elided", rules)
+
+        start = end
+
+
+def _is_banner(line: str, rules: dict) -> bool:
+    """
+    Checks whether a line is a comment drawn with repeated symbols, e.g. "# ==========".
+    """
+
+    symbols = line.replace(" ", "").replace("\t", "")
+    if len(symbols) < 10 or re.search(r"\w", symbols) or len(set(symbols)) > 3:
+        return False
+
+    delimiters = [rules.get("line_comment")] + (rules.get("block_comment") or [])[:1]
+
+    return any(delimiter and symbols.startswith(delimiter) for delimiter in delimiters)
+
+
+def _indent_unit(lines: List[str]) -> Optional[int]:
+    """
+    Returns the number of spaces of one level of indentation, None if the file isn't indented with spaces.
+    """
+
+    indents = [len(line) - len(line.lstrip(" ")) for line in lines if line.startswith(" ") and line.strip()]
+    unit = min(indents, default=0)
+
+    return unit if unit > 1 else None
+
+
+def _reindent(line: str, unit: int, indent: str) -> str:
+    """
+    Replaces the leading spaces of a line by levels of the shorter indentation, keeping spaces that are left over.
+    """
+
+    spaces = len(line) - len(line.lstrip(" "))
+    if not spaces:
+        return line
+
+    levels, rest = divmod(spaces, unit)
+
+    return indent * levels + " " * rest + line[spaces:]
+
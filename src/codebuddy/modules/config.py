@@ -1,17 +1,40 @@
 
-import requests
 import logging
 
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import requests
+
 
 # Define API configuration for interacting with the AI service
 API = {
     "url": "http://localhost:1234",         # Base URL of the AI service
     "endpoint": "v1/chat/completions",      # Specific endpoint for generating completions
+    "model": None,                          # Model to request, None to use the model the server has loaded
+    "models_endpoint": "v1/models",         # Endpoint listing the models of a server, identifies them if "model" is None
     "headers": {
         "Content-Type": "application/json", # Specifies that the request body format is JSON
     },
     "max_tokens": 500,                      # Maximum number of tokens to generate in the response
     "temperature": 0.5,                     # Creativity level of the generated text
+    "max_connections": 100,                 # Maximum number of pooled keep-alive connections
+    "connect_timeout": 10,                  # Seconds to wait for a connection to the server
+    "read_timeout": 300,                    # Seconds to wait for the server to send data
+    "retries": 3,                           # Number of retries for failed requests
+    "backoff_factor": 1.0,                  # Base delay in seconds, doubled after every retry
+    "backoff_max": 30,                      # Upper limit of the delay between retries
+    "retry_statuses": [429, 500, 502, 503, 504],    # Response codes that are worth retrying
+    "stream_timeout": 60,                   # Seconds of silence after which a stream is aborted
+    "eject_failures": 3,                    # Consecutive failures after which a server stops getting requests
+    "eject_time": 30,                       # Seconds between health checks of an ejected server
+    "health_endpoint": "v1/models",         # Endpoint used to check whether a server is available
+    "adaptive_concurrency": True,           # Adjust the requests in flight to the latency and overload responses of a server
+    "initial_concurrency": 4,               # Requests in flight per server before any feedback is received
+    "max_concurrency": None,                # Upper limit of requests in flight per server (None for no limit)
+    "latency_tolerance": 2.0,               # Responses slower than this multiple of the fastest ones reduce the concurrency
+    "requests_per_second": None,            # Rate limit of requests across all servers (None for no limit)
+    "tokens_per_minute": None,              # Rate limit of prompt and completion tokens across all servers (None for no limit)
 }
 
 # System prompt to set the context for the AI
@@ -38,11 +61,37 @@ Do not write examples, try to fit within 400 tokens.
 {data}
 """
 
+# Prompt template for combining the reviews of the parts of a large file
+REDUCE_PROMPT = """
+Combine the partial reports below, made for consecutive parts of one file, into a single report.
+Remove duplicates and keep the 10 most important problems with their line numbers, try to fit into 400 tokens.
+
+{data}
+"""
+
+# Header placed before each part of a large file and before its review when the reviews are combined
+CHUNK_HEADER = "Part {index} of {count}, lines {start}-{end}:\n\n{data}"
+
+# Header placed before several small files reviewed in one request
+BATCH_HEADER = """
+The following {count} files are reviewed together.
+Write a separate short report for each file and start it with a line "### File: <path>".
+
+{data}
+"""
+
+# Header placed before each file of a batch, the same header is expected in the response
+BATCH_FILE_HEADER = "### File: {path}\n{data}"
+
+# Report entry of a near-duplicate file, which refers to the review of its representative
+DUPLICATE_NOTE = "Near-duplicate of `{path}` ({similarity:.0%} similar), see the review of that file."
+
 # Dictionary of prompts used for different types of reviews
 PROMPTS = {
     "sys": SYSTEM_PROMPT,       # System prompt
     "code": CODE_REVIEW_PROMPT, # Code review prompt
-    "docs": DOCS_REVIEW_PROMPT  # Documentation review prompt
+    "docs": DOCS_REVIEW_PROMPT, # Documentation review prompt
+    "reduce": REDUCE_PROMPT     # Prompt for combining partial reviews
 }
 
 # Construct the prompt using system and user roles, incorporating the specified category and data
@@ -54,18 +103,22 @@ def prompt_handler(category: str, data: str) -> list:
 
     return prompt
 
-# Constructs the query in json format
-def request_handler(prompt: list) -> dict:
+# Constructs the query in json format, a batch of files asks for a larger response
+def request_handler(prompt: list, max_tokens: int = None) -> dict:
     data = {
         "messages": prompt,
-        "max_tokens": API.get("max_tokens"),
+        "max_tokens": max_tokens or API.get("max_tokens"),
         "temperature": API.get("temperature")
     }
 
+    if API.get("model"):
+        data["model"] = API.get("model")
+
     return data
 
 # Processes the response from the API and extracts the textual content of the message
-def response_handler(response: requests.Response) -> str:
+# Note: the asynchronous client passes an httpx.Response, which has the same json() method
+def response_handler(response: "requests.Response") -> str:
     response_text = response.json().get(
         "choices", [{}]
     )[0].get(
@@ -76,11 +129,121 @@ def response_handler(response: requests.Response) -> str:
 
     return response_text
 
+# Extracts the text from a chunk of a streamed response (a parsed server-sent event)
+def stream_handler(chunk: dict) -> str:
+    chunk_text = chunk.get(
+        "choices", [{}]
+    )[0].get(
+        "delta", {}
+    ).get(
+        "content", ""
+    )
+
+    return chunk_text or ""
+
+# Extracts the token counts from a parsed response (or from the last chunk of a streamed one)
+def usage_handler(data: dict) -> dict:
+    usage = data.get("usage") or {}
+
+    return {
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0)
+    }
+
 # Define logger configuration
 LOGGER = {
     "level": logging.INFO,              # Set the logging level to DEBUG
     "log_file": None,                   # File where logs will be written
-    "format": '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    "format": '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    "max_message_size": 2000,           # Longer messages (e.g. prompts in debug records) are truncated
+    "structured": False,                # Write the records as JSON lines instead of the format
+}
+
+# Define configuration for reading files
+INGEST = {
+    "sniff_size": 8192,                     # Bytes at the start of a file checked for binary content
+    "max_size": 1024 * 1024,                # Larger files are sampled (head and tail) instead of read entirely
+    "sample_size": 64 * 1024,               # Bytes taken from the head and from the tail of a large file
+    "skip_size": None,                      # Larger files are skipped entirely (None for no limit)
+}
+
+# Define configuration for splitting large files into parts reviewed separately
+CHUNKING = {
+    "max_tokens": 3000,                     # Maximum estimated number of tokens in one part
+    "chars_per_token": 4,                   # Average number of characters per token
+    "jobs": 4,                              # Parts of large files reviewed at the same time, across all files
+}
+
+# Define configuration for reviewing several small files in one request
+BATCHING = {
+    "small_file_tokens": 300,               # Files with up to this many estimated tokens are batched
+    "max_tokens": 2000,                     # Maximum estimated number of tokens in one batch
+    "max_files": 8,                         # Maximum number of files in one batch
+    "completion_tokens_per_file": 250,      # Response tokens requested for every file of a batch
+}
+
+# Define configuration for detecting near-duplicate files (--dedup)
+DEDUP = {
+    "threshold": 0.9,                       # Estimated similarity from which a file is a near-duplicate of another
+    "shingle_size": 5,                      # Number of consecutive tokens compared as one unit
+    "num_perm": 64,                         # Number of hash values in the fingerprint of a file
+    "bands": 16,                            # Fingerprints sharing one of this many parts are compared
+    "min_tokens": 50,                       # Smaller files are always reviewed
+}
+
+# Define review cache configuration
+CACHE = {
+    "path": "~/.cache/codebuddy/reviews.sqlite3",   # SQLite database with cached reviews
+    "max_size": 256 * 1024 * 1024,                  # Maximum size of cached reviews in bytes
+    "max_age": 30 * 24 * 60 * 60,                   # Reviews unused for longer (in seconds) are evicted
+}
+
+# Define configuration of run metrics
+METRICS = {
+    # Upper bounds of the histogram buckets in seconds
+    "buckets": [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300],
+    "progress_interval": 10,                # Seconds between progress lines in the log
+}
+
+# Define configuration for estimating the cost of a run (--plan)
+PLANNING = {
+    "path": "~/.cache/codebuddy/calibration.json",  # Token usage of past runs, used to calibrate the estimates
+    "min_requests": 10,                     # Requests needed before the past usage replaces the defaults
+    "seconds_per_request": 30,              # Assumed duration of a request before any is measured
+}
+
+# Define configuration for compacting files before they are put into prompts (--compact)
+COMPACTION = {
+    "indent": "\t",                         # One level of indentation of Python code, replaces runs of spaces
+    "max_string_length": 200,               # Longer string literals and base64 runs are elided
+    "min_data_lines": 16,                   # Runs of at least this many lines of literals (tables, arrays) are elided
+    "data_sample_lines": 3,                 # Lines at the start of an elided run that are kept as an example
+    "drop_docstrings": False,               # Remove docstrings from Python code as well
+    # Comments at the start of a file containing one of these words are license headers
+    "license_keywords": [
+        "copyright", "license", "licence", "spdx-license-identifier",
+        "all rights reserved", "permission is hereby granted"
+    ],
+    # Comment syntax of the languages, files of other types only lose trailing whitespace and base64 runs
+    "languages": {
+        ".py": {"line_comment": "#", "docstrings": True},
+        ".rb": {"line_comment": "#"},
+        ".js": {"line_comment": "//", "block_comment": ["/*", "*/"]},
+        ".ts": {"line_comment": "//", "block_comment": ["/*", "*/"]},
+        ".java": {"line_comment": "//", "block_comment": ["/*", "*/"]},
+        ".c": {"line_comment": "//", "block_comment": ["/*", "*/"]},
+        ".cpp": {"line_comment": "//", "block_comment": ["/*", "*/"]},
+        ".h": {"line_comment": "//", "block_comment": ["/*", "*/"]},
+        ".hpp": {"line_comment": "//", "block_comment": ["/*", "*/"]},
+        ".cs": {"line_comment": "//", "block_comment": ["/*", "*/"]},
+        ".go": {"line_comment": "//", "block_comment": ["/*", "*/"]},
+        ".php": {"line_comment": "//", "block_comment": ["/*", "*/"]},
+        ".swift": {"line_comment": "//", "block_comment": ["/*", "*/"]},
+        ".kt": {"line_comment": "//", "block_comment": ["/*", "*/"]},
+        ".rs": {"line_comment": "//", "block_comment": ["/*", "*/"]},
+        ".m": {"line_comment": "//", "block_comment": ["/*", "*/"]},
+        ".mm": {"line_comment": "//", "block_comment": ["/*", "*/"]},
+    },
 }
 
 # Name of the directory for storing generated reports
@@ -0,0 +1,149 @@
+
+import re
+import random
+import functools
+import hashlib
+import pathlib
+import logging
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .config import DEDUP as DEDUP_CONFIG
+
+
+# Setting up the logger for this module
+logger = logging.getLogger(__name__)
+
+# Splits a text into words and single punctuation characters, ignoring whitespace
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Fixed seed, so that the signatures are the same in every run
+SEED = 0x5EED
+
+
+def minhash_signature(
+        text: str,
+        num_perm: int = DEDUP_CONFIG.get("num_perm"),
+        shingle_size: int = DEDUP_CONFIG.get("shingle_size"),
+        min_tokens: int = DEDUP_CONFIG.get("min_tokens")
+    ) -> Optional[Tuple[int, ...]]:
+    """
+    Computes the MinHash signature of a text over its shingles (runs of consecutive tokens).
+
+    The share of equal values in the signatures of two texts estimates the Jaccard similarity
+    of their sets of shingles. The hash functions are derived from one hash of every shingle
+    by XOR with random masks, which is much faster than hashing every shingle again.
+
+    Args:
+        text (str): The text to fingerprint.
+        num_perm (int, optional): The number of hash functions, i.e. the length of the signature.
+        shingle_size (int, optional): The number of tokens in a shingle.
+        min_tokens (int, optional): Texts with fewer tokens get no signature.
+
+    Returns:
+        Tuple[int, ...]: The signature, or None if the text is too short to be compared reliably.
+    """
+
+    tokens = TOKEN_PATTERN.findall(text)
+    if len(tokens) < max(min_tokens, shingle_size):
+        return None
+
+    # Hash every distinct shingle once
+    hashes = {
+        int.from_bytes(hashlib.blake2b(" ".join(tokens[i:i + shingle_size]).encode(), digest_size=8).digest(), "little")
+        for i in range(len(tokens) - shingle_size + 1)
+    }
+
+    return tuple(min(map(mask.__xor__, hashes)) for mask in _masks(num_perm))
+
+
+def similarity(signature_a: Tuple[int, ...], signature_b: Tuple[int, ...]) -> float:
+    """
+    Estimates the Jaccard similarity of two texts from their MinHash signatures.
+
+    Args:
+        signature_a (Tuple[int, ...]): The signature of the first text.
+        signature_b (Tuple[int, ...]): The signature of the second text.
+
+    Returns:
+        float: The estimated similarity, between 0 and 1.
+    """
+
+    return sum(a == b for a, b in zip(signature_a, signature_b)) / len(signature_a)
+
+
+def find_duplicates(
+        files: Dict[str, Sequence[pathlib.Path]],
+        read: Callable[[pathlib.Path], str],
+        threshold: float = DEDUP_CONFIG.get("threshold"),
+        num_perm: int = DEDUP_CONFIG.get("num_perm"),
+        bands: int = DEDUP_CONFIG.get("bands")
+    ) -> Dict[pathlib.Path, Tuple[pathlib.Path, float]]:
+    """
+    Clusters near-duplicate files of the same category.
+
+    The first file of every cluster (in the order of the files) is its representative.
+    Candidates are found with locality-sensitive hashing: the signatures are cut into bands,
+    and only files sharing a whole band with a representative are compared with it.
+
+    Args:
+        files (Dict[str, Sequence[Path]]): Dictionary with file paths sorted by category.
+        read (Callable[[Path], str]): Returns the content of a file. Files that can't be read are left out.
+        threshold (float, optional): Estimated similarity from which a file is a near-duplicate.
+        num_perm (int, optional): The length of the signatures.
+        bands (int, optional): The number of bands the signatures are cut into (must divide num_perm).
+
+    Returns:
+        Dict[Path, Tuple[Path, float]]: The representative of every near-duplicate file and their similarity.
+    """
+
+    rows = num_perm // bands
+    duplicates = {}
+
+    for category in files.keys():
+        # Signatures of the representatives and the representatives found by every band
+        signatures = {}
+        buckets = {}
+
+        for file_path in files.get(category):
+            try:
+                signature = minhash_signature(read(file_path), num_perm)
+            except Exception as e:
+                logger.debug("File '%s' is not checked for duplicates: %s", file_path, e)
+                continue
+
+            if signature is None:
+                continue
+
+            band_keys = [(band, signature[band * rows:(band + 1) * rows]) for band in range(bands)]
+
+            # Compare the file with the representatives sharing a band, the most similar one wins
+            best_path, best_similarity = None, threshold
+            candidates = dict.fromkeys(candidate for key in band_keys for candidate in buckets.get(key, ()))
+            for candidate in candidates:
+                candidate_similarity = similarity(signature, signatures[candidate])
+                if candidate_similarity >= best_similarity and (best_path is None or candidate_similarity > best_similarity):
+                    best_path, best_similarity = candidate, candidate_similarity
+
+            if best_path is not None:
+                duplicates[file_path] = (best_path, best_similarity)
+                logger.debug("File '%s' is a near-duplicate of '%s' (%.0f%%)", file_path, best_path, best_similarity * 100)
+                continue
+
+            # The file becomes the representative of a new cluster
+            signatures[file_path] = signature
+            for key in band_keys:
+                buckets.setdefault(key, []).append(file_path)
+
+    return duplicates
+
+
+@functools.lru_cache()
+def _masks(num_perm: int) -> Tuple[int, ...]:
+    """
+    Returns the random 64-bit masks deriving the hash functions of the signatures.
+    """
+
+    generator = random.Random(SEED)
+
+    return tuple(generator.getrandbits(64) for _ in range(num_perm))
@@ -0,0 +1,248 @@
+
+import time
+import queue
+import collections
+import concurrent.futures
+import logging
+
+from typing import Any, Callable, Iterable, Iterator, Tuple
+
+from .metrics import RunMetrics
+
+
+# Setting up the logger for this module
+logger = logging.getLogger(__name__)
+
+# Marks the end of a streamed result
+_END = object()
+
+
+class _Failure:
+
+    """
+    Wraps an exception raised while a result was being streamed.
+    """
+
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+
+
+class _LazyIterable:
+
+    """
+    Defers a call until its result is iterated, so errors surface where the pieces are consumed.
+    """
+
+    def __init__(self, func: Callable[[Any], Iterable[Any]], item: Any) -> None:
+        self.func = func
+        self.item = item
+
+    def __iter__(self) -> Iterator[Any]:
+        # A generator, so the function is called by the first next() instead of by iter()
+        yield from self.func(self.item)
+
+
+class ReviewPool:
+
+    """
+    A bounded worker pool for running file reviews concurrently.
+
+    Tasks are dispatched to a fixed number of worker threads, while results are
+    yielded strictly in submission order, so reports stay deterministic no matter
+    which request completes first.
+    """
+
+    def __init__(self, jobs: int = 1, metrics: RunMetrics = None) -> None:
+        """
+        Initializes the ReviewPool with the given level of parallelism.
+
+        Args:
+            jobs (int, optional): The maximum number of tasks running at the same time.
+            metrics (RunMetrics, optional): Records how long tasks wait for a free worker.
+        """
+
+        self.jobs = max(1, jobs)
+        self.metrics = metrics
+
+        # Limit how far dispatching may run ahead of the oldest unfinished task,
+        # so a slow file does not cause the whole backlog to pile up in memory
+        self.window = self.jobs * 2
+        logger.debug("Initialized ReviewPool with %s job(s), window: %s", self.jobs, self.window)
+
+    def map(self, func: Callable[[Any], Any], items: Iterable[Any]) -> Iterator[Tuple[Any, Any, Exception]]:
+        """
+        Applies a function to every item and yields the outcomes in the order of the items.
+
+        Args:
+            func (Callable): The function to call for each item.
+            items (Iterable): The items to process.
+
+        Yields:
+            Tuple[Any, Any, Exception]: The item, the result of the call (or None)
+            and the exception raised by the call (or None).
+        """
+
+        # Sequential mode, no threads are needed
+        if self.jobs == 1:
+            for item in items:
+                try:
+                    yield item, func(item), None
+                except Exception as e:
+                    yield item, None, e
+            return
+
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.jobs,
+            thread_name_prefix="codebuddy-review"
+        )
+
+        # Queue of submitted tasks in submission order
+        pending = collections.deque()
+
+        try:
+            for item in items:
+                pending.append((item, executor.submit(self._timed(func), item)))
+                logger.debug("Submitted task for item: %s", item)
+
+                # Wait for the oldest task once the window is full
+                if len(pending) >= self.window:
+                    yield self._collect(*pending.popleft())
+
+            # Drain the remaining tasks
+            while pending:
+                yield self._collect(*pending.popleft())
+        finally:
+            # Drop queued tasks if the consumer stopped early (e.g. on Ctrl-C)
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stream(self, func: Callable[[Any], Iterable[Any]], items: Iterable[Any]) -> Iterator[Tuple[Any, Iterator[Any]]]:
+        """
+        Like map, but for functions producing their results piece by piece.
+
+        Every item is yielded together with an iterator over the pieces of its result.
+        The iterator of the oldest task is live, while the following tasks keep running
+        in the background and their pieces are buffered until they are consumed.
+        Errors are raised by the iterator of the failed item.
+
+        Args:
+            func (Callable): The function returning an iterable of pieces for each item.
+            items (Iterable): The items to process.
+
+        Yields:
+            Tuple[Any, Iterator[Any]]: The item and the iterator over the pieces of its result.
+        """
+
+        # Sequential mode, the pieces are produced while the consumer reads them
+        if self.jobs == 1:
+            for item in items:
+                yield item, iter(_LazyIterable(func, item))
+            return
+
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.jobs,
+            thread_name_prefix="codebuddy-review"
+        )
+
+        # Queue of submitted tasks in submission order
+        pending = collections.deque()
+
+        try:
+            for item in items:
+                buffer = queue.Queue()
+                executor.submit(self._drain, self._timed(func), item, buffer)
+                pending.append((item, buffer))
+                logger.debug("Submitted streaming task for item: %s", item)
+
+                # Hand over the oldest task once the window is full
+                if len(pending) >= self.window:
+                    item, buffer = pending.popleft()
+                    yield item, self._read(buffer)
+
+            # Hand over the remaining tasks
+            while pending:
+                item, buffer = pending.popleft()
+                yield item, self._read(buffer)
+        finally:
+            # Drop queued tasks if the consumer stopped early (e.g. on Ctrl-C)
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _timed(self, func: Callable[[Any], Any]) -> Callable[[Any], Any]:
+        """
+        Wraps a function submitted to the workers, to record how long its call waits for a free worker.
+
+        Args:
+            func (Callable): The function to call for an item.
+
+        Returns:
+            Callable: The wrapped function.
+        """
+
+        if self.metrics is None:
+            return func
+
+        submitted = time.perf_counter()
+
+        def run(item: Any) -> Any:
+            self.metrics.observe("queue_wait", time.perf_counter() - submitted)
+            return func(item)
+
+        return run
+
+    @staticmethod
+    def _drain(func: Callable[[Any], Iterable[Any]], item: Any, buffer: queue.Queue) -> None:
+        """
+        Runs a task in a worker thread and puts the pieces of its result into a buffer.
+
+        Args:
+            func (Callable): The function returning an iterable of pieces.
+            item (Any): The item to process.
+            buffer (Queue): The buffer for the pieces, terminated by _END or an exception.
+        """
+
+        try:
+            for piece in func(item):
+                buffer.put(piece)
+        except Exception as e:
+            buffer.put(_Failure(e))
+        else:
+            buffer.put(_END)
+
+    @staticmethod
+    def _read(buffer: queue.Queue) -> Iterator[Any]:
+        """
+        Reads the pieces of a task result from its buffer.
+
+        Args:
+            buffer (Queue): The buffer filled by _drain.
+
+        Yields:
+            Any: The next piece of the result.
+        """
+
+        while True:
+            piece = buffer.get()
+
+            if piece is _END:
+                return
+            if isinstance(piece, _Failure):
+                raise piece.error
+
+            yield piece
+
+    @staticmethod
+    def _collect(item: Any, future: concurrent.futures.Future) -> Tuple[Any, Any, Exception]:
+        """
+        Waits for a submitted task and returns its outcome.
+
+        Args:
+            item (Any): The item the task was submitted for.
+            future (Future): The future of the submitted task.
+
+        Returns:
+            Tuple[Any, Any, Exception]: The item, the result and the exception of the task.
+        """
+
+        try:
+            return item, future.result(), None
+        except Exception as e:
+            return item, None, e
@@ -0,0 +1,325 @@
+
+import io
+import re
+import mmap
+import codecs
+import collections
+import pathlib
+import logging
+import zipfile
+import xml.etree.ElementTree
+
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Union
+
+from .config import INGEST as INGEST_CONFIG
+
+
+# Setting up the logger for this module
+logger = logging.getLogger(__name__)
+
+# Byte order marks and the encodings they identify (longest first)
+BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
+
+# Control characters that don't occur in text files
+BINARY_BYTES = bytes(set(range(32)) - {7, 8, 9, 10, 12, 13, 27})
+
+# Local names of XML elements holding a paragraph of text in office documents
+PARAGRAPH_TAGS = {"p", "h", "si"}
+
+
+class FileSkipped(Exception):
+
+    """
+    Raised when a file can't or shouldn't be reviewed (e.g. binary content).
+    """
+
+
+def read_text(file_path: pathlib.Path) -> str:
+    """
+    Reads the text of a file for a review.
+
+    Binary files are detected from a small prefix and skipped. The encoding is detected,
+    and large files are sampled from their head and tail without loading them into memory.
+    Office documents and PDF files are converted to plain text.
+
+    Args:
+        file_path (Path): The path to the file.
+
+    Returns:
+        str: The text of the file, with universal newlines.
+
+    Raises:
+        FileSkipped: If the file must not be sent to the LM API.
+    """
+
+    size = file_path.stat().st_size
+    check_size(size)
+
+    # Documents with a dedicated extractor
+    extractor = EXTRACTORS.get(file_path.suffix.lower())
+    if extractor:
+        logger.debug("Extracting text from document: %s", file_path)
+        return _sample_paragraphs(extractor(file_path))
+
+    if size == 0:
+        return ""
+
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return _decode(data, size, file_path)
+
+
+def decode_text(data: bytes, name: str) -> str:
+    """
+    Decodes the content of a file that is already in memory (e.g. a git blob) like read_text does.
+
+    Args:
+        data (bytes): The content of the file.
+        name (str): The name of the file, its extension selects the document extractor.
+
+    Returns:
+        str: The text of the file, with universal newlines.
+
+    Raises:
+        FileSkipped: If the file must not be sent to the LM API.
+    """
+
+    check_size(len(data))
+
+    # Documents with a dedicated extractor, which read the content like a file
+    extractor = EXTRACTORS.get(pathlib.PurePosixPath(name).suffix.lower())
+    if extractor:
+        logger.debug("Extracting text from document: %s", name)
+        return _sample_paragraphs(extractor(io.BytesIO(data)))
+
+    if not data:
+        return ""
+
+    return _decode(data, len(data), name)
+
+
+def check_size(size: int) -> None:
+    """
+    Checks that a file is not too large to be reviewed at all.
+
+    Args:
+        size (int): The size of the file in bytes.
+
+    Raises:
+        FileSkipped: If the file is larger than the configured skip size.
+    """
+
+    skip_size = INGEST_CONFIG.get("skip_size")
+    if skip_size is not None and size > skip_size:
+        raise FileSkipped(f"file is larger than {skip_size} bytes")
+
+
+def _decode(data: Union[bytes, mmap.mmap], size: int, name: Union[str, pathlib.Path]) -> str:
+    """
+    Detects the encoding of a content and decodes it, sampling the head and the tail of a large one.
+    """
+
+    prefix = data[:INGEST_CONFIG.get("sniff_size")]
+
+    encoding = detect_encoding(prefix)
+    if encoding is None:
+        raise FileSkipped("binary content")
+
+    logger.debug("Reading file '%s' with encoding: %s", name, encoding)
+
+    max_size = INGEST_CONFIG.get("max_size")
+    if size <= max_size:
+        text = data[:].decode(encoding, errors="replace")
+    else:
+        # Only the head and the tail of a large file are read
+        sample_size = INGEST_CONFIG.get("sample_size")
+        head = data[:sample_size].decode(encoding, errors="replace")
+        tail = data[size - sample_size:].decode(encoding, errors="replace")
+        text = _join_sample(head, tail, f"{size - 2 * sample_size} bytes")
+        logger.debug("Sampled %s of %s bytes from file: %s", 2 * sample_size, size, name)
+
+    # Byte order marks are kept by the codecs of a specific byte order
+    return _normalize_newlines(text.removeprefix("\ufeff"))
+
+
+def detect_encoding(prefix: bytes) -> str:
+    """
+    Detects the encoding of a file from the first bytes of its content.
+
+    Args:
+        prefix (bytes): The first bytes of the file.
+
+    Returns:
+        str: The name of the encoding, or None if the content is binary.
+    """
+
+    for bom, encoding in BOMS:
+        if prefix.startswith(bom):
+            return encoding
+
+    # Text files don't contain NUL and rarely contain other control characters
+    if b"\0" in prefix or len(prefix.translate(None, BINARY_BYTES)) < len(prefix) * 0.9:
+        return None
+
+    # The prefix may end in the middle of a character, so decode it incrementally
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(prefix, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+
+    # charset_normalizer is installed together with requests
+    try:
+        import charset_normalizer
+    except ImportError:
+        return "latin-1"
+
+    match = charset_normalizer.from_bytes(prefix).best()
+
+    return match.encoding if match else "latin-1"
+
+
+def _normalize_newlines(text: str) -> str:
+    """
+    Converts Windows and old Mac line endings to "\\n", like reading in text mode does.
+    """
+
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _join_sample(head: str, tail: str, omitted: str) -> str:
+    """
+    Joins the head and the tail of a large text, cutting them at line boundaries.
+    """
+
+    head = head[:head.rfind("\n") + 1] or head
+    tail = tail[tail.find("\n") + 1:] or tail
+
+    return f"{head}\n[... {omitted} omitted ...]\n\n{tail}"
+
+
+def _sample_paragraphs(paragraphs: Iterable[str]) -> str:
+    """
+    Joins the paragraphs extracted from a document, sampling the head and the tail of a large one.
+
+    The paragraphs are read one by one: once the text exceeds the maximum size, its head
+    is kept and only the paragraphs that make up the tail are held from then on.
+    """
+
+    max_size = INGEST_CONFIG.get("max_size")
+    sample_size = INGEST_CONFIG.get("sample_size")
+
+    pieces = []
+    head = None
+    tail = collections.deque()
+    tail_length = 0
+    length = 0
+
+    for index, paragraph in enumerate(paragraphs):
+        paragraph = _normalize_newlines(paragraph if index == 0 else "\n" + paragraph)
+        length += len(paragraph)
+
+        if head is None:
+            pieces.append(paragraph)
+            if length <= max_size:
+                continue
+
+            # The text is too large, its head is kept and the rest is read for the tail only
+            text = "".join(pieces)
+            head = text[:sample_size]
+            paragraph = text[-sample_size:]
+            pieces = None
+
+        tail.append(paragraph)
+        tail_length += len(paragraph)
+
+        # Drop the paragraphs that are no longer needed for the tail
+        while tail_length - len(tail[0]) >= sample_size:
+            tail_length -= len(tail.popleft())
+
+    if head is None:
+        return "".join(pieces)
+
+    return _join_sample(head, "".join(tail)[-sample_size:], f"{length - 2 * sample_size} characters")
+
+
+def _iter_xml_paragraphs(archive: zipfile.ZipFile, member: str) -> Iterator[str]:
+    """
+    Streams the paragraphs of text from an XML document inside an archive.
+    """
+
+    with archive.open(member) as f:
+        for _, element in xml.etree.ElementTree.iterparse(f):
+            if element.tag.rpartition("}")[2] in PARAGRAPH_TAGS:
+                yield "".join(element.itertext())
+
+                # Free the memory of processed elements
+                element.clear()
+
+
+def _zip_extractor(members: Callable[[List[str]], List[str]]) -> Callable[[Union[pathlib.Path, BinaryIO]], Iterator[str]]:
+    """
+    Creates an extractor for zipped XML documents (Office Open XML and OpenDocument).
+
+    Args:
+        members (Callable): Selects the XML documents holding the text from the names of the archive members.
+
+    Returns:
+        Callable: The extractor, yielding the paragraphs of the document.
+    """
+
+    def extract(file_path: Union[pathlib.Path, BinaryIO]) -> Iterator[str]:
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                for member in members(archive.namelist()):
+                    yield from _iter_xml_paragraphs(archive, member)
+        except (zipfile.BadZipFile, KeyError, xml.etree.ElementTree.ParseError) as e:
+            raise FileSkipped(f"unreadable document ({e})") from e
+
+    return extract
+
+
+def _numbered(pattern: str) -> Callable[[List[str]], List[str]]:
+    """
+    Selects the archive members matching a pattern with a number, in numeric order.
+    """
+
+    regex = re.compile(pattern)
+
+    def select(names: List[str]) -> List[str]:
+        matches = [(int(match.group(1)), name) for name in names if (match := regex.fullmatch(name))]
+        return [name for _, name in sorted(matches)]
+
+    return select
+
+
+def _extract_pdf(file_path: Union[pathlib.Path, BinaryIO]) -> Iterator[str]:
+    """
+    Extracts the text of a PDF file page by page, if pypdf is installed.
+    """
+
+    try:
+        import pypdf
+    except ImportError:
+        raise FileSkipped("install pypdf to review PDF files")
+
+    try:
+        for page in pypdf.PdfReader(file_path).pages:
+            yield page.extract_text() or ""
+    except pypdf.errors.PdfReadError as e:
+        raise FileSkipped(f"unreadable document ({e})") from e
+
+
+# Dictionary mapping document extensions to their text extractors (reading a path or a binary stream)
+EXTRACTORS: Dict[str, Callable[[Union[pathlib.Path, BinaryIO]], Iterator[str]]] = {
+    ".docx": _zip_extractor(lambda names: ["word/document.xml"]),
+    ".pptx": _zip_extractor(_numbered(r"ppt/slides/slide(\d+)\.xml")),
+    ".xlsx": _zip_extractor(lambda names: [name for name in names if name == "xl/sharedStrings.xml"]),
+    ".odt": _zip_extractor(lambda names: ["content.xml"]),
+    ".pdf": _extract_pdf,
+}
@@ -0,0 +1,284 @@
+
+import math
+import bisect
+import pathlib
+import logging
+import collections.abc
+
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .config import ALL_CATEGORIES
+
+
+# Setting up the logger for this module
+logger = logging.getLogger(__name__)
+
+
+class FileInventory:
+
+    """
+    A compact list of the files of a repository, for repositories with millions of files.
+
+    Instead of a Path object per file, the directories are stored once and the names
+    of the files are packed into one buffer, with their directory, category, size and
+    modification time in parallel arrays. Paths are created only when a file is accessed.
+    """
+
+    def __init__(self, root: pathlib.Path, categories: Iterable[str] = ALL_CATEGORIES) -> None:
+        """
+        Initializes an empty FileInventory.
+
+        Args:
+            root (Path): The absolute path of the directory the names of the files are relative to.
+            categories (Iterable[str], optional): The categories of the files.
+        """
+
+        self.root = root
+        self.categories = list(categories)
+
+        # Every directory is stored once, as a prefix of the names ("" or "src/module/") and as a path
+        self._dirs: List[str] = []
+        self._dir_paths: List[pathlib.Path] = []
+        self._dir_ids: Dict[str, int] = {}
+
+        # Parallel arrays with an item per file
+        self._file_dirs = array("I")        # Index of the directory
+        self._names = bytearray()           # Names of the files without their directory, one after another (UTF-8)
+        self._name_ends = array("Q")        # End of the name in the buffer, it starts where the previous one ends
+        self._file_categories = array("B")  # Index of the category
+        self._sizes = array("q")            # Size in bytes, -1 until it is known
+        self._mtimes = array("d")           # Modification time, NaN until it is known
+
+        # Object ids of the files of a git revision, as bytes of a fixed width
+        self._object_ids = bytearray()
+        self._object_id_size = None
+
+        # Indices of the files of every category, in the order they were added
+        self._members = {category: array("I") for category in self.categories}
+
+        # Indices of the files sorted by their names, built for the first lookup
+        self._order = None
+
+    def add(self, name: str, category: str, size: int = -1, object_id: str = None) -> int:
+        """
+        Adds a file to the inventory.
+
+        Args:
+            name (str): The path of the file relative to the root, with "/" as the separator.
+            category (str): The category of the file.
+            size (int, optional): The size of the file in bytes, if it is already known.
+            object_id (str, optional): The hexadecimal git object id, for the files of a revision.
+
+        Returns:
+            int: The index of the file.
+        """
+
+        directory, _, file_name = name.rpartition("/")
+        directory = f"{directory}/" if directory else ""
+
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_ids[directory] = len(self._dirs)
+            self._dirs.append(directory)
+            self._dir_paths.append(self.root / directory)
+
+        index = len(self._file_dirs)
+        self._file_dirs.append(dir_id)
+        self._names += file_name.encode("utf-8", "surrogateescape")
+        self._name_ends.append(len(self._names))
+        self._file_categories.append(self.categories.index(category))
+        self._sizes.append(size)
+        self._mtimes.append(math.nan)
+
+        if object_id is not None:
+            object_id = bytes.fromhex(object_id)
+            if self._object_id_size is None:
+                self._object_id_size = len(object_id)
+            elif len(object_id) != self._object_id_size:
+                raise ValueError(f"Object id of '{name}' has {len(object_id)} bytes instead of {self._object_id_size}")
+
+            self._object_ids += object_id
+
+        self._members[category].append(index)
+        self._order = None
+
+        return index
+
+    def __len__(self) -> int:
+        return len(self._file_dirs)
+
+    def name(self, index: int) -> str:
+        """
+        Returns the path of a file relative to the root, with "/" as the separator.
+        """
+
+        return self._dirs[self._file_dirs[index]] + self._file_name(index)
+
+    def path(self, index: int) -> pathlib.Path:
+        """
+        Returns the absolute path of a file.
+        """
+
+        # Joining a name to the path of its directory is faster than parsing the whole path
+        return self._dir_paths[self._file_dirs[index]] / self._file_name(index)
+
+    def index(self, path: pathlib.Path) -> int:
+        """
+        Finds a file by its absolute path.
+
+        Args:
+            path (Path): The absolute path of the file.
+
+        Returns:
+            int: The index of the file.
+
+        Raises:
+            KeyError: If the file is not in the inventory.
+        """
+
+        try:
+            name = path.relative_to(self.root).as_posix()
+        except ValueError:
+            raise KeyError(path) from None
+
+        if self._order is None:
+            self._order = array("I", sorted(range(len(self)), key=self.name))
+
+        position = bisect.bisect_left(self._order, name, key=self.name)
+        if position == len(self._order) or self.name(self._order[position]) != name:
+            raise KeyError(path)
+
+        return self._order[position]
+
+    def category(self, index: int) -> str:
+        """
+        Returns the category of a file.
+        """
+
+        return self.categories[self._file_categories[index]]
+
+    def size(self, index: int) -> int:
+        """
+        Returns the size of a file in bytes, reading it from the file system the first time.
+        """
+
+        if self._sizes[index] < 0:
+            self._stat(index)
+
+        return self._sizes[index]
+
+    def mtime(self, index: int) -> Optional[float]:
+        """
+        Returns the modification time of a file, None for the files of a git revision.
+        """
+
+        if math.isnan(self._mtimes[index]) and self._object_id_size is None:
+            self._stat(index)
+
+        mtime = self._mtimes[index]
+
+        return None if math.isnan(mtime) else mtime
+
+    def object_id(self, index: int) -> Optional[str]:
+        """
+        Returns the hexadecimal git object id of a file of a revision, None for other files.
+        """
+
+        if self._object_id_size is None:
+            return None
+
+        start = index * self._object_id_size
+
+        return self._object_ids[start:start + self._object_id_size].hex()
+
+    def files(self, category: str) -> "FileListView":
+        """
+        Returns the files of a category as a read-only list of paths.
+        """
+
+        return FileListView(self, self._members[category])
+
+    def as_dict(self) -> Dict[str, "FileListView"]:
+        """
+        Returns the files of every category, like a dictionary of lists of paths.
+        """
+
+        return {category: self.files(category) for category in self.categories}
+
+    def _file_name(self, index: int) -> str:
+        """
+        Returns the name of a file without its directory.
+        """
+
+        start = self._name_ends[index - 1] if index else 0
+
+        return self._names[start:self._name_ends[index]].decode("utf-8", "surrogateescape")
+
+    def _stat(self, index: int) -> None:
+        """
+        Reads the size and the modification time of a file from the file system.
+        """
+
+        stat = self.path(index).stat()
+        self._sizes[index] = stat.st_size
+        self._mtimes[index] = stat.st_mtime
+
+
+class FileListView(collections.abc.Sequence):
+
+    """
+    A read-only list of the paths of files of a FileInventory, the paths are created when they are accessed.
+    """
+
+    __slots__ = ("_inventory", "_indices")
+
+    def __init__(self, inventory: FileInventory, indices: array) -> None:
+        """
+        Initializes the FileListView.
+
+        Args:
+            inventory (FileInventory): The inventory the files belong to.
+            indices (array): The indices of the files in the inventory.
+        """
+
+        self._inventory = inventory
+        self._indices = indices
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._inventory.path(index) for index in self._indices[item]]
+
+        return self._inventory.path(self._indices[item])
+
+    def __iter__(self) -> Iterator[pathlib.Path]:
+        for index in self._indices:
+            yield self._inventory.path(index)
+
+    def size(self, position: int) -> int:
+        """
+        Returns the size in bytes of the file at a position of the list, without creating its path.
+        """
+
+        return self._inventory.size(self._indices[position])
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, tuple, FileListView)):
+            return list(self) == list(other)
+
+        return NotImplemented
+
+    # Views change when files are added, so they can't be hashed
+    __hash__ = None
+
+    def __add__(self, other) -> list:
+        return list(self) + list(other)
+
+    def __radd__(self, other) -> list:
+        return list(other) + list(self)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
@@ -0,0 +1,138 @@
+
+import os
+import json
+import pathlib
+import logging
+
+from typing import Dict
+
+
+# Setting up the logger for this module
+logger = logging.getLogger(__name__)
+
+
+class ProgressJournal:
+
+    """
+    A write-ahead journal of the files whose reviews are completely written to a report.
+
+    Every record is flushed to disk before the next file is reported, together with
+    the size of the report at that moment. When an interrupted run is resumed, the
+    report is cut back to the last recorded size, so that a partially written entry
+    doesn't appear twice, and the recorded files are not reviewed again.
+    """
+
+    def __init__(self, path: pathlib.Path, read_only: bool = False) -> None:
+        """
+        Opens (and creates if necessary) the journal, loading the records of a previous run.
+
+        Args:
+            path (Path): Path to the journal file.
+            read_only (bool, optional): If True, only the records of a previous run are loaded
+                and the journal is neither created nor changed.
+        """
+
+        self.path = path
+
+        # Status of every recorded file, keyed by its path relative to the repository
+        self.files: Dict[str, str] = {}
+
+        # Size of the report after the last recorded entry
+        self.report_size = 0
+
+        if self.path.exists():
+            self._load(read_only)
+
+        self._file = None if read_only else open(self.path, "a")
+        logger.debug("Opened progress journal with %s record(s): %s", len(self.files), self.path)
+
+    def _load(self, read_only: bool = False) -> None:
+        """
+        Reads the records of a previous run, removing a record cut short by a crash (unless read_only).
+        """
+
+        valid_size = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                # A record without the line break was cut short as well
+                if not line.endswith(b"\n"):
+                    break
+
+                try:
+                    record = json.loads(line)
+                    self.files[record["file"]] = record["status"]
+                    self.report_size = record["report_size"]
+                except (ValueError, KeyError, TypeError):
+                    break
+
+                valid_size += len(line)
+
+        # New records must not be appended to a damaged one
+        if valid_size < self.path.stat().st_size and not read_only:
+            logger.warning("Removing a damaged record from the progress journal: %s", self.path)
+            os.truncate(self.path, valid_size)
+
+    def is_done(self, file_name: str) -> bool:
+        """
+        Checks whether a file was already reported.
+
+        Args:
+            file_name (str): The path of the file relative to the repository.
+
+        Returns:
+            bool: True if the file is in the journal, otherwise False.
+        """
+
+        return file_name in self.files
+
+    def record(self, file_name: str, status: str, report_file_path: pathlib.Path) -> None:
+        """
+        Records a reported file and waits until the record is on disk.
+
+        Args:
+            file_name (str): The path of the file relative to the repository.
+            status (str): The outcome for the file: "reviewed", "skipped" or "duplicate" (a near-duplicate
+                referring to the review of another file).
+            report_file_path (Path): The report the review of the file was written to.
+        """
+
+        # The entry must reach the disk before the record that refers to it
+        if report_file_path.exists():
+            with open(report_file_path, "ab") as report_file:
+                os.fsync(report_file.fileno())
+                self.report_size = report_file.tell()
+
+        self.files[file_name] = status
+        self._file.write(json.dumps({"file": file_name, "status": status, "report_size": self.report_size}) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def restore_report(self, report_file_path: pathlib.Path) -> None:
+        """
+        Cuts the report back to the end of the last recorded entry.
+
+        Args:
+            report_file_path (Path): The report of the interrupted run.
+        """
+
+        if report_file_path.exists() and report_file_path.stat().st_size > self.report_size:
+            logger.info("Removing unfinished entries from the end of the report: %s", report_file_path)
+            os.truncate(report_file_path, self.report_size)
+
+    def close(self, delete: bool = False) -> None:
+        """
+        Closes the journal.
+
+        Args:
+            delete (bool, optional): Whether to delete the journal, once there is nothing left to resume.
+        """
+
+        # A read-only journal is left as it is
+        if self._file is None:
+            return
+
+        self._file.close()
+
+        if delete:
+            self.path.unlink(missing_ok=True)
+            logger.debug("Deleted progress journal: %s", self.path)
@@ -0,0 +1,128 @@
+
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+
+from typing import List
+
+from .config import LOGGER as LOGGER_CONFIG
+
+
+# Attributes of every log record, the other attributes are passed with "extra"
+RECORD_ATTRIBUTES = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+
+class TruncatingFormatter(logging.Formatter):
+
+    """
+    Formats log records like logging.Formatter, but cuts messages longer than a limit,
+    so that a debug record with a whole prompt or review doesn't flood the log.
+    """
+
+    def __init__(self, fmt: str = None, max_size: int = LOGGER_CONFIG.get("max_message_size")) -> None:
+        """
+        Initializes the TruncatingFormatter.
+
+        Args:
+            fmt (str, optional): The format of the records, as for logging.Formatter.
+            max_size (int, optional): The maximum number of characters of a message, None for no limit.
+        """
+
+        super().__init__(fmt)
+        self.max_size = max_size
+
+    def format(self, record: logging.LogRecord) -> str:
+        # The message is built here, in the thread of the listener, not where the record was logged
+        message = record.getMessage()
+        if self.max_size is not None and len(message) > self.max_size:
+            message = f"{message[:self.max_size]}... [{len(message) - self.max_size} characters truncated]"
+
+        # The original record may be formatted by other handlers too
+        record = logging.makeLogRecord({**record.__dict__, "msg": message, "args": None})
+
+        return super().format(record)
+
+
+class JSONFormatter(TruncatingFormatter):
+
+    """
+    Formats log records as JSON objects, one per line, for log collectors.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": super().format(logging.makeLogRecord({**record.__dict__, "exc_info": None, "exc_text": None})),
+        }
+
+        # Fields passed with "extra" are kept as separate keys
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+
+    """
+    Puts log records into a queue without formatting them.
+
+    The standard QueueHandler formats every record before queueing it, so that it can be
+    sent to another process. The listener runs in the same process, so the formatting
+    is left to its thread, and logging costs the calling thread only an enqueue.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(
+        level: int = LOGGER_CONFIG.get("level"),
+        log_file: str = LOGGER_CONFIG.get("log_file"),
+        structured: bool = LOGGER_CONFIG.get("structured")
+    ) -> logging.handlers.QueueListener:
+    """
+    Configures the root logger to write the records from a background thread.
+
+    Args:
+        level (int, optional): The logging level.
+        log_file (str, optional): A file the log is written to in addition to the terminal.
+        structured (bool, optional): If True, the records are written as JSON lines.
+
+    Returns:
+        QueueListener: The listener writing the records, it is stopped (and the queue flushed) at exit.
+    """
+
+    if structured:
+        formatter = JSONFormatter()
+    else:
+        formatter = TruncatingFormatter(LOGGER_CONFIG.get("format"))
+
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # Records are passed to the handlers by the listener thread
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    queue_handler.listener = listener
+
+    logging.basicConfig(level=level, handlers=[queue_handler])
+
+    listener.start()
+    atexit.register(listener.stop)
+
+    return listener
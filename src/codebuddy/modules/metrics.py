@@ -0,0 +1,293 @@
+
+import json
+import time
+import bisect
+import pathlib
+import logging
+import threading
+import contextlib
+
+from typing import Dict, Iterator, List
+
+from .config import METRICS as METRICS_CONFIG
+
+
+# Setting up the logger for this module
+logger = logging.getLogger(__name__)
+
+# Descriptions of the stages of the review pipeline
+STAGES = {
+    "discovery": "Listing and categorizing the files of the repository",
+    "dedup": "Finding near-duplicate files",
+    "read": "Reading a file",
+    "compact": "Compacting a file for its prompt",
+    "prompt": "Building a prompt",
+    "queue_wait": "Waiting for a free worker",
+    "ttfb": "Time to the first byte of a response",
+    "request": "Request to the LM API, including retries",
+    "report": "Writing a report entry",
+}
+
+
+class Histogram:
+
+    """
+    A histogram of durations with fixed buckets, using constant memory however many values are observed.
+    """
+
+    def __init__(self, buckets: List[float]) -> None:
+        """
+        Initializes an empty Histogram.
+
+        Args:
+            buckets (List[float]): The sorted upper bounds of the buckets, the last bucket has no bound.
+        """
+
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float) -> None:
+        """
+        Adds a value to the histogram.
+        """
+
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile by linear interpolation within its bucket.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            float: The estimated value, or None if the histogram is empty.
+        """
+
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+
+                # Values never fall outside of the observed range
+                lower = max(lower, self.min)
+                upper = min(upper, self.max)
+
+                return lower + (upper - lower) * (rank - cumulative) / count
+
+            cumulative += count
+
+        return self.max
+
+    def to_dict(self) -> dict:
+        """
+        Summarizes the histogram for the JSON export.
+        """
+
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {str(bound): count for bound, count in zip(self.buckets + ["+Inf"], self.counts)},
+        }
+
+
+class RunMetrics:
+
+    """
+    Collects the timing of the pipeline stages and the counters of a run.
+
+    All methods are thread-safe, so the metrics can be shared by the review workers.
+    """
+
+    def __init__(self, buckets: List[float] = METRICS_CONFIG.get("buckets")) -> None:
+        """
+        Initializes empty RunMetrics.
+
+        Args:
+            buckets (List[float], optional): The upper bounds of the histogram buckets in seconds.
+        """
+
+        self.buckets = sorted(buckets)
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, float] = {}
+
+        self.started_at = time.monotonic()
+        self._last_progress = self.started_at
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """
+        Records the duration of a stage.
+
+        Args:
+            stage (str): The name of the stage (see STAGES).
+            seconds (float): The duration in seconds.
+        """
+
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+
+            histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """
+        Records the duration of the enclosed block as a stage, even if it raises.
+
+        Args:
+            stage (str): The name of the stage (see STAGES).
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def add(self, counter: str, value: float = 1) -> None:
+        """
+        Increases a counter.
+
+        Args:
+            counter (str): The name of the counter (e.g. "prompt_tokens").
+            value (float, optional): The amount to add.
+        """
+
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def add_usage(self, usage: dict) -> None:
+        """
+        Counts the tokens reported by the LM API for a request.
+
+        Args:
+            usage (dict): The token counts, as returned by usage_handler.
+        """
+
+        for counter, value in usage.items():
+            if value:
+                self.add(counter, value)
+
+    def progress(self, done: int, total: int) -> None:
+        """
+        Logs the progress of the run with its throughput and the estimated time left,
+        at most once per progress interval.
+
+        Args:
+            done (int): The number of processed files.
+            total (int): The total number of files.
+        """
+
+        now = time.monotonic()
+        if now - self._last_progress < METRICS_CONFIG.get("progress_interval"):
+            return
+
+        self._last_progress = now
+        elapsed = now - self.started_at
+        rate = done / elapsed if elapsed else 0.0
+
+        eta = format_duration((total - done) / rate) if rate else "unknown"
+        percent = done / total * 100 if total else 100.0
+
+        logger.info("Progress: %s/%s file(s) (%.1f%%), %.2f file(s)/s, ETA %s", done, total, percent, rate, eta)
+
+    def to_dict(self) -> dict:
+        """
+        Returns all metrics for the JSON export.
+        """
+
+        with self._lock:
+            return {
+                "wall_seconds": time.monotonic() - self.started_at,
+                "counters": dict(self.counters),
+                "stages": {stage: histogram.to_dict() for stage, histogram in self.histograms.items()},
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+
+        lines = [
+            "# HELP codebuddy_stage_seconds Time spent in a stage of the review pipeline.",
+            "# TYPE codebuddy_stage_seconds histogram",
+        ]
+
+        with self._lock:
+            for stage, histogram in self.histograms.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f'codebuddy_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+
+                lines.append(f'codebuddy_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'codebuddy_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+            for counter, value in self.counters.items():
+                lines.append(f"# TYPE codebuddy_{counter}_total counter")
+                lines.append(f"codebuddy_{counter}_total {value}")
+
+            lines.append("# TYPE codebuddy_wall_seconds gauge")
+            lines.append(f"codebuddy_wall_seconds {time.monotonic() - self.started_at}")
+
+        return "\n".join(lines) + "\n"
+
+    def save(self, json_path: pathlib.Path, prometheus_path: pathlib.Path) -> None:
+        """
+        Writes the metrics to a JSON file and a Prometheus text-format file.
+
+        Args:
+            json_path (Path): The path of the JSON file.
+            prometheus_path (Path): The path of the Prometheus file.
+        """
+
+        with open(json_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+        with open(prometheus_path, "w") as f:
+            f.write(self.to_prometheus())
+
+        logger.debug("Saved metrics to %s and %s", json_path, prometheus_path)
+
+
+def format_duration(seconds: float) -> str:
+    """
+    Formats a duration for the terminal.
+
+    Args:
+        seconds (float): The duration in seconds, fractions of a second are dropped.
+
+    Returns:
+        str: The duration as e.g. "1h 02m 05s", "2m 05s" or "5s".
+    """
+
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    if hours:
+        return f"{hours}h {minutes:02d}m {seconds:02d}s"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+
+    return f"{seconds}s"
@@ -0,0 +1,389 @@
+
+import json
+import math
+import bisect
+import pathlib
+import logging
+import itertools
+import collections.abc
+
+from array import array
+from typing import Callable, Dict, Iterator, List, NamedTuple, Sequence, Tuple
+
+from .batching import batch_max_tokens, format_batch
+from .chunking import split_source
+from .config import CHUNK_HEADER, prompt_handler
+from .config import API as API_CONFIG
+from .config import CHUNKING as CHUNKING_CONFIG
+from .config import PLANNING as PLANNING_CONFIG
+from .inventory import FileListView
+from .metrics import RunMetrics, format_duration
+
+
+# Setting up the logger for this module
+logger = logging.getLogger(__name__)
+
+# Totals of past runs stored in the calibration file
+CALIBRATION_KEYS = ("prompt_characters", "prompt_tokens", "completion_tokens", "requests", "request_seconds")
+
+
+class TaskEstimate(NamedTuple):
+
+    """
+    The estimated cost of a review task.
+    """
+
+    prompt_tokens: int      # Tokens of all prompts sent for the task
+    completion_tokens: int  # Tokens of all responses
+    requests: int           # Number of requests to the LM API
+    rounds: int             # Number of requests that have to wait for each other
+
+
+class TokenEstimator:
+
+    """
+    Estimates the tokens and requests of reviews without a tokenizer.
+
+    The number of characters per token is calibrated against the token usage the
+    LM API reported in past runs, which are accumulated in a small JSON file.
+    Until enough requests have been seen, the defaults of the configuration are used.
+    """
+
+    def __init__(
+            self,
+            path: str = None,
+            min_requests: int = PLANNING_CONFIG.get("min_requests")
+        ) -> None:
+        """
+        Initializes the TokenEstimator, loading the calibration of past runs.
+
+        Args:
+            path (str, optional): Path to the calibration file. Defaults to the path in the configuration.
+            min_requests (int, optional): Requests needed before the past usage replaces the defaults.
+        """
+
+        self.path = pathlib.Path(path or PLANNING_CONFIG.get("path")).expanduser().resolve()
+        self.min_requests = min_requests
+
+        self.totals = dict.fromkeys(CALIBRATION_KEYS, 0)
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+
+            for key in CALIBRATION_KEYS:
+                self.totals[key] = stored.get(key) or 0
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning("Token calibration is ignored (%s)", e)
+
+    @property
+    def calibrated(self) -> bool:
+        """
+        True if enough past requests reported their token usage.
+        """
+
+        return self.totals["requests"] >= self.min_requests and self.totals["prompt_tokens"] > 0
+
+    @property
+    def chars_per_token(self) -> float:
+        """
+        The average number of characters per prompt token.
+        """
+
+        if self.calibrated and self.totals["prompt_characters"]:
+            return self.totals["prompt_characters"] / self.totals["prompt_tokens"]
+
+        return CHUNKING_CONFIG.get("chars_per_token")
+
+    @property
+    def completion_tokens(self) -> float:
+        """
+        The average number of tokens of a response, the configured maximum until calibrated.
+        """
+
+        if self.calibrated and self.totals["completion_tokens"]:
+            return self.totals["completion_tokens"] / self.totals["requests"]
+
+        return API_CONFIG.get("max_tokens")
+
+    @property
+    def seconds_per_request(self) -> float:
+        """
+        The average duration of a request, including its retries.
+        """
+
+        if self.totals["requests"] >= self.min_requests and self.totals["request_seconds"]:
+            return self.totals["request_seconds"] / self.totals["requests"]
+
+        return PLANNING_CONFIG.get("seconds_per_request")
+
+    def estimate_tokens(self, characters: int) -> int:
+        """
+        Estimates the number of tokens of a text from its length.
+
+        Args:
+            characters (int): The number of characters (or bytes) of the text.
+
+        Returns:
+            int: The estimated number of tokens.
+        """
+
+        return math.ceil(characters / self.chars_per_token)
+
+    def estimate_prompt(self, category: str, data: str) -> int:
+        """
+        Estimates the tokens of the prompt of a review, including the instructions.
+
+        Args:
+            category (str): The type of review.
+            data (str): The reviewed content.
+
+        Returns:
+            int: The estimated number of prompt tokens.
+        """
+
+        characters = sum(len(message["content"]) for message in prompt_handler(category, data))
+
+        return self.estimate_tokens(characters)
+
+    def estimate_review(self, category: str, data: str, suffix: str) -> TaskEstimate:
+        """
+        Estimates the cost of reviewing one file, which is split into parts if it is large.
+
+        Args:
+            category (str): The type of review.
+            data (str): The content of the file.
+            suffix (str): The extension of the file, used to split it like the review does.
+
+        Returns:
+            TaskEstimate: The estimated cost of the review.
+        """
+
+        completion_tokens = math.ceil(self.completion_tokens)
+
+        chunks = split_source(data, suffix)
+        if len(chunks) == 1:
+            return TaskEstimate(self.estimate_prompt(category, data), completion_tokens, 1, 1)
+
+        # Every part is reviewed, then the partial reviews are combined in one more request
+        prompt_tokens = 0
+        headers = 0
+        for index, chunk in enumerate(chunks):
+            header = CHUNK_HEADER.format(
+                index=index + 1,
+                count=len(chunks),
+                start=chunk.start_line,
+                end=chunk.end_line,
+                data=""
+            )
+            prompt_tokens += self.estimate_prompt(category, header + chunk.text)
+            headers += len(header)
+
+        prompt_tokens += self.estimate_prompt("reduce", "") + self.estimate_tokens(headers) + completion_tokens * len(chunks)
+
+        return TaskEstimate(prompt_tokens, completion_tokens * (len(chunks) + 1), len(chunks) + 1, 2)
+
+    def estimate_batch(self, category: str, files: List[Tuple[str, str]]) -> TaskEstimate:
+        """
+        Estimates the cost of reviewing several small files in one request.
+
+        Args:
+            category (str): The type of review.
+            files (List[Tuple[str, str]]): The names and contents of the files.
+
+        Returns:
+            TaskEstimate: The estimated cost of the review.
+        """
+
+        # The response of a batch is allowed to grow with its files, like a single review is to its budget
+        completion_tokens = self.completion_tokens * batch_max_tokens(len(files)) / API_CONFIG.get("max_tokens")
+
+        return TaskEstimate(
+            self.estimate_prompt(category, format_batch(files)),
+            math.ceil(completion_tokens),
+            1,
+            1
+        )
+
+    def update(self, run_metrics: RunMetrics) -> None:
+        """
+        Adds the token usage and request durations of a run to the calibration file.
+
+        Args:
+            run_metrics (RunMetrics): The metrics of the finished run.
+        """
+
+        run = run_metrics.to_dict()
+        counters = run["counters"]
+        if not counters.get("requests"):
+            return
+
+        self.totals["requests"] += counters["requests"]
+        self.totals["request_seconds"] += run["stages"].get("request", {}).get("sum", 0)
+
+        # Servers that don't report their usage don't calibrate the tokens
+        if counters.get("prompt_tokens"):
+            self.totals["prompt_characters"] += counters.get("prompt_characters", 0)
+            self.totals["prompt_tokens"] += counters["prompt_tokens"]
+            self.totals["completion_tokens"] += counters.get("completion_tokens", 0)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path.with_suffix(".tmp")
+        with open(temporary_path, "w") as f:
+            json.dump(self.totals, f, indent=2)
+
+        # The file is replaced at once, so a crash never leaves half of it
+        temporary_path.replace(self.path)
+        logger.debug("Updated token calibration: %s", self.totals)
+
+
+class FileTasks(collections.abc.Sequence):
+
+    """
+    The single-file review tasks of categorized files, in the order of the files.
+
+    Tasks are created when they are accessed, so the paths of all files are never held in memory.
+    """
+
+    def __init__(self, files: Dict[str, Sequence[pathlib.Path]]) -> None:
+        """
+        Initializes the FileTasks.
+
+        Args:
+            files (Dict[str, Sequence[Path]]): Dictionary with file paths sorted by category.
+        """
+
+        self.files = files
+        self._categories = [category for category in files.keys() if len(files.get(category))]
+
+        # Index of the task after the last file of every category
+        self._ends = array("Q", itertools.accumulate(len(files.get(category)) for category in self._categories))
+
+    def __len__(self) -> int:
+        return self._ends[-1] if self._ends else 0
+
+    def __getitem__(self, index: int) -> Tuple[str, List[pathlib.Path]]:
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+
+        position = bisect.bisect_right(self._ends, index)
+        category = self._categories[position]
+        start = self._ends[position - 1] if position else 0
+
+        return category, [self.files.get(category)[index - start]]
+
+    def __iter__(self) -> Iterator[Tuple[str, List[pathlib.Path]]]:
+        for category in self._categories:
+            for file_path in self.files.get(category):
+                yield category, [file_path]
+
+    def sizes(self, get_size: Callable[[pathlib.Path], int]) -> Iterator[int]:
+        """
+        Yields the size of the file of every task, from the inventory if the files are a view of it.
+
+        Args:
+            get_size (Callable[[Path], int]): Returns the size of a file in bytes, for other lists of files.
+
+        Yields:
+            int: The size of the file in bytes, 0 if it can't be read.
+        """
+
+        for category in self._categories:
+            file_paths = self.files.get(category)
+
+            # The sizes in the inventory are read without creating the paths
+            if isinstance(file_paths, FileListView):
+                items, get_item_size = range(len(file_paths)), file_paths.size
+            else:
+                items, get_item_size = file_paths, get_size
+
+            for item in items:
+                yield _size_or_zero(get_item_size, item)
+
+
+def order_largest_first(
+        tasks: Sequence[Tuple[str, List[pathlib.Path]]],
+        get_size: Callable[[pathlib.Path], int]
+    ) -> Iterator[Tuple[int, Tuple[str, List[pathlib.Path]]]]:
+    """
+    Orders review tasks by their estimated size, largest first, so that the longest reviews
+    don't start at the end of a concurrent run and leave the other workers idle.
+
+    Only the sizes of the tasks are sorted, every task is taken from the sequence when it is yielded.
+
+    Args:
+        tasks (Sequence[Tuple[str, List[Path]]]): Review tasks, each with a category and one or more files.
+        get_size (Callable[[Path], int]): Returns the size of a file in bytes.
+
+    Yields:
+        Tuple[int, Tuple[str, List[Path]]]: The tasks, largest first (the order of equal tasks is kept),
+        each with its position in the sequence.
+    """
+
+    if isinstance(tasks, FileTasks):
+        sizes = array("q", tasks.sizes(get_size))
+    else:
+        sizes = array("q", (
+            sum(_size_or_zero(get_size, file_path) for file_path in file_paths)
+            for _, file_paths in tasks
+        ))
+
+    order = array("I", sorted(range(len(sizes)), key=sizes.__getitem__, reverse=True))
+    logger.debug("Ordered %s review task(s) by size", len(order))
+
+    for index in order:
+        yield index, tasks[index]
+
+
+def _size_or_zero(get_size: Callable, item) -> int:
+    """
+    Returns the size of a file, 0 if it can't be read.
+    """
+
+    try:
+        return get_size(item)
+    except OSError:
+        # Files that can't be read fail quickly wherever they are
+        return 0
+
+
+def summarize_plan(estimates: List[TaskEstimate], jobs: int, estimator: TokenEstimator) -> str:
+    """
+    Summarizes the estimated cost of a run for the terminal.
+
+    The wall time assumes the requests keep the workers busy: the total time of the
+    requests is divided between the jobs, but no run is shorter than its longest task.
+
+    Args:
+        estimates (List[TaskEstimate]): The estimated cost of every review task.
+        jobs (int): The number of concurrent reviews.
+        estimator (TokenEstimator): The estimator that made the estimates.
+
+    Returns:
+        str: The summary, several lines without a trailing newline.
+    """
+
+    prompt_tokens = sum(estimate.prompt_tokens for estimate in estimates)
+    completion_tokens = sum(estimate.completion_tokens for estimate in estimates)
+    requests = sum(estimate.requests for estimate in estimates)
+    longest = max((estimate.rounds for estimate in estimates), default=0)
+
+    seconds_per_request = estimator.seconds_per_request
+    wall_seconds = max(requests * seconds_per_request / jobs, longest * seconds_per_request)
+
+    if estimator.calibrated:
+        calibration = f"calibrated on {estimator.totals['requests']} past request(s)"
+    else:
+        calibration = "not calibrated yet"
+
+    lines = [
+        f"Plan: {len(estimates)} review task(s) with {jobs} job(s), {calibration}",
+        f"  Requests:          {requests}",
+        f"  Prompt tokens:     {prompt_tokens} ({estimator.chars_per_token:.2f} characters per token)",
+        f"  Completion tokens: {completion_tokens} ({estimator.completion_tokens:.0f} per request)",
+        f"  Total tokens:      {prompt_tokens + completion_tokens}",
+        f"  Projected time:    {format_duration(wall_seconds)} ({seconds_per_request:.1f}s per request)",
+    ]
+
+    return "\n".join(lines)
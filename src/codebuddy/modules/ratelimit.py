@@ -0,0 +1,111 @@
+
+import time
+import logging
+import threading
+
+from .config import API as API_CONFIG
+
+
+# Setting up the logger for this module
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+
+    """
+    Limits the rate of requests and tokens sent to the LM API, e.g. for a shared gateway.
+
+    Requests are spaced evenly to stay under the request rate. Tokens are taken from
+    a bucket holding one minute worth of tokens, which refills continuously. A request
+    may take more tokens than are left, then the next requests wait until the debt is repaid.
+    """
+
+    def __init__(
+            self,
+            requests_per_second: float = API_CONFIG.get("requests_per_second"),
+            tokens_per_minute: float = API_CONFIG.get("tokens_per_minute")
+        ) -> None:
+        """
+        Initializes the RateLimiter.
+
+        Args:
+            requests_per_second (float, optional): The maximum rate of requests, None for no limit.
+            tokens_per_minute (float, optional): The maximum rate of prompt and completion tokens, None for no limit.
+        """
+
+        self.requests_per_second = requests_per_second
+        self.tokens_per_minute = tokens_per_minute
+
+        self._next_request = time.monotonic()
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        Reserves the budget of a request without waiting.
+
+        Args:
+            tokens (int, optional): The number of tokens the request is expected to use.
+
+        Returns:
+            float: The number of seconds to wait before sending the request.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            delay = 0.0
+
+            if self.requests_per_second:
+                start = max(now, self._next_request)
+                self._next_request = start + 1.0 / self.requests_per_second
+                delay = start - now
+
+            if self.tokens_per_minute:
+                self._refill(now)
+                self._tokens -= tokens
+
+                # Wait until the bucket is refilled to zero
+                if self._tokens < 0:
+                    delay = max(delay, -self._tokens * 60.0 / self.tokens_per_minute)
+
+            return delay
+
+    def acquire(self, tokens: int = 0) -> None:
+        """
+        Waits until a request may be sent, reserving its budget.
+
+        Args:
+            tokens (int, optional): The number of tokens the request is expected to use.
+        """
+
+        delay = self.reserve(tokens)
+        if delay > 0:
+            logger.debug("Rate limit reached, waiting %.2fs", delay)
+            time.sleep(delay)
+
+    def refund(self, tokens: int) -> None:
+        """
+        Corrects the reserved tokens once the real usage of a request is known.
+
+        Args:
+            tokens (int): The number of reserved but unused tokens (negative if more were used).
+        """
+
+        if not self.tokens_per_minute:
+            return
+
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(float(self.tokens_per_minute), self._tokens + tokens)
+
+    def _refill(self, now: float) -> None:
+        """
+        Adds the tokens accumulated since the last update. Must be called with the lock held.
+        """
+
+        self._tokens = min(
+            float(self.tokens_per_minute),
+            self._tokens + (now - self._updated) * self.tokens_per_minute / 60.0
+        )
+        self._updated = now
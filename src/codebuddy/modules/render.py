@@ -0,0 +1,222 @@
+
+import re
+import logging
+
+from typing import List, Optional
+
+
+# Setting up the logger for this module
+logger = logging.getLogger(__name__)
+
+# ANSI escape sequences of the terminal styles
+STYLES = {
+    "bold": "\033[1m",
+    "dim": "\033[2m",
+    "italic": "\033[3m",
+    "code": "\033[36m",
+    "reset": "\033[0m",
+}
+
+# Block elements, matched against one line
+FENCE = re.compile(r"^\s*(`{3,}|~{3,})")
+HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)(?:\s+#+)?\s*$")
+RULE = re.compile(r"^\s{0,3}([-*_])(?:\s*\1){2,}\s*$")
+QUOTE = re.compile(r"^\s{0,3}>\s?(.*)$")
+BULLET = re.compile(r"^(\s*)[-*+]\s+(.*)$")
+NUMBERED = re.compile(r"^(\s*)(\d{1,9}[.)])\s+(.*)$")
+
+# Inline elements, code spans come first so that their content is left as it is
+INLINE = re.compile(
+    r"(?P<ticks>`+)(?P<code>.+?)(?P=ticks)"
+    r"|\*\*(?P<bold>.+?)\*\*"
+    r"|__(?P<bold2>.+?)__"
+    r"|(?<![\w*])\*(?!\s)(?P<italic>.+?)(?<!\s)\*"
+    r"|(?<!\w)_(?!\s)(?P<italic2>.+?)(?<!\s)_(?!\w)"
+    r"|!?\[(?P<label>[^\]]*)\]\((?P<url>[^)\s]*)[^)]*\)"
+)
+
+# Width of horizontal rules
+RULE_WIDTH = 40
+
+
+class MarkdownRenderer:
+
+    """
+    Renders Markdown for the terminal in a single pass, while the text is still arriving.
+
+    Complete lines are rendered as soon as they are fed, the last incomplete line waits
+    for the next piece. Headings, lists, quotes and code blocks stay readable without
+    the Markdown markup, and are styled with ANSI escape sequences if colors are enabled.
+    """
+
+    def __init__(self, color: bool = False) -> None:
+        """
+        Initializes the MarkdownRenderer.
+
+        Args:
+            color (bool, optional): If True, the text is styled with ANSI escape sequences.
+        """
+
+        self.color = color
+
+        # The incomplete last line and the marker of the open code block
+        self._buffer = ""
+        self._fence = None
+
+    def feed(self, chunk: str) -> str:
+        """
+        Adds a piece of Markdown and renders the lines it completes.
+
+        Args:
+            chunk (str): The next piece of the text.
+
+        Returns:
+            str: The rendered lines, each ending with a newline (may be empty).
+        """
+
+        self._buffer += chunk
+        if "\n" not in chunk:
+            return ""
+
+        lines = self._buffer.split("\n")
+        self._buffer = lines.pop()
+
+        return "".join(self._render_lines(lines))
+
+    def close(self) -> str:
+        """
+        Renders the rest of the text and resets the renderer.
+
+        Returns:
+            str: The rendered last line, ending with a newline (empty if there is none).
+        """
+
+        lines = [self._buffer] if self._buffer else []
+        self._buffer = ""
+
+        rendered = "".join(self._render_lines(lines))
+        self._fence = None
+
+        return rendered
+
+    def _render_lines(self, lines: List[str]) -> List[str]:
+        """
+        Renders complete lines, leaving out the lines that only hold markup.
+        """
+
+        rendered = []
+        for line in lines:
+            line = self._render_line(line.rstrip("\r"))
+            if line is not None:
+                rendered.append(line + "\n")
+
+        return rendered
+
+    def _render_line(self, line: str) -> Optional[str]:
+        """
+        Renders one line of Markdown.
+
+        Args:
+            line (str): The line without its newline.
+
+        Returns:
+            str: The rendered line (possibly several lines), or None if nothing is shown.
+        """
+
+        # Code blocks are shown verbatim and indented, without the fences
+        fence = FENCE.match(line)
+        if self._fence:
+            if fence and fence.group(1).startswith(self._fence):
+                self._fence = None
+                return None
+
+            return "    " + self._style(line, "dim")
+
+        if fence:
+            self._fence = fence.group(1)
+            return None
+
+        heading = HEADING.match(line)
+        if heading:
+            text = self._render_inline(heading.group(2))
+            level = len(heading.group(1))
+
+            # Without colors, the top-level headings are underlined
+            if not self.color and level <= 2:
+                return f"{text}\n{('=' if level == 1 else '-') * len(text)}"
+
+            return self._style(text, "bold")
+
+        if RULE.match(line):
+            return self._style("─" * RULE_WIDTH, "dim")
+
+        quote = QUOTE.match(line)
+        if quote:
+            return self._style("│ ", "dim") + (self._render_line(quote.group(1)) or "")
+
+        bullet = BULLET.match(line)
+        if bullet:
+            return f"{bullet.group(1)}• {self._render_inline(bullet.group(2))}"
+
+        numbered = NUMBERED.match(line)
+        if numbered:
+            return f"{numbered.group(1)}{numbered.group(2)} {self._render_inline(numbered.group(3))}"
+
+        return self._render_inline(line)
+
+    def _render_inline(self, text: str) -> str:
+        """
+        Replaces the inline markup (emphasis, code spans and links) of a text.
+        """
+
+        def replace(match: re.Match) -> str:
+            if match.group("code") is not None:
+                return self._style(match.group("code").strip(), "code")
+
+            bold = match.group("bold") or match.group("bold2")
+            if bold is not None:
+                return self._style(self._render_inline(bold), "bold")
+
+            italic = match.group("italic") or match.group("italic2")
+            if italic is not None:
+                return self._style(self._render_inline(italic), "italic")
+
+            # Links keep their address, unless it is the same as the label
+            label = self._render_inline(match.group("label"))
+            url = match.group("url")
+            if not url or url == match.group("label"):
+                return label
+
+            return f"{label} ({url})" if label else url
+
+        return INLINE.sub(replace, text)
+
+    def _style(self, text: str, style: str) -> str:
+        """
+        Wraps a text in an ANSI style if colors are enabled.
+        """
+
+        if not self.color or not text:
+            return text
+
+        # Styles nested inside the text end with a reset, after which this style is restored
+        text = text.replace(STYLES["reset"], STYLES["reset"] + STYLES[style])
+
+        return f"{STYLES[style]}{text}{STYLES['reset']}"
+
+
+def render_markdown(markdown_string: str, color: bool = False) -> str:
+    """
+    Renders a whole Markdown text for the terminal.
+
+    Args:
+        markdown_string (str): The Markdown text.
+        color (bool, optional): If True, the text is styled with ANSI escape sequences.
+
+    Returns:
+        str: The rendered text, without a trailing newline.
+    """
+
+    renderer = MarkdownRenderer(color)
+
+    return (renderer.feed(markdown_string) + renderer.close()).rstrip("\n")
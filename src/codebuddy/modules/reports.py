@@ -1,17 +1,36 @@
 
-import bs4
-import markdown
+import os
+import re
+import shutil
 import pathlib
 import datetime
 import logging
 
+from array import array
+from typing import BinaryIO, Iterable, Iterator
+
 from .config import REPORT_DIR_NAME
+from .render import render_markdown
 
 
 # Setting up the logger for this module
 logger = logging.getLogger(__name__)
 
 
+def _copy_bytes(source: BinaryIO, target: BinaryIO, size: int, block_size: int = 1 << 20) -> None:
+    """
+    Copies the given number of bytes from the current position of a file to another file, block by block.
+    """
+
+    while size > 0:
+        block = source.read(min(size, block_size))
+        if not block:
+            break
+
+        target.write(block)
+        size -= len(block)
+
+
 class ReportGenerator:
 
     """
@@ -21,13 +40,24 @@ class ReportGenerator:
     allowing you to add records to a report and save it with a time stamped name.
     """
 
-    def __init__(self, repository_dir: pathlib.Path, reports_dir: pathlib.Path = None) -> None:
+    def __init__(
+            self,
+            repository_dir: pathlib.Path,
+            reports_dir: pathlib.Path = None,
+            resume: bool = False,
+            revision: str = None,
+            create_dir: bool = True
+        ) -> None:
         """
         Initializes the ReportGenerator for storing reports.
 
         Args:
             repository_dir (Path): Repository directory path, is used to determine where reports are stored or to name files.
             reports_dir (Path, optional): Report directory path, used for storing reports.
+            resume (bool, optional): If True, the latest report with a progress journal is reopened instead of creating a new one.
+            revision (str, optional): The reviewed git revision, is added to the name of the report
+                so that the reports of several revisions don't mix.
+            create_dir (bool, optional): If False, a missing reports directory is not created (e.g. for a plan).
         """
 
         if reports_dir:
@@ -38,9 +68,9 @@ class ReportGenerator:
 
         # Check if the reports directory exists, and create it if it doesn't
         if self.reports_dir.exists():
-            logger.debug(f"Reports directory '{self.reports_dir}' already exists.")
-        else:
-            logger.debug(f"Reports directory '{self.reports_dir}' does not exist. Creating it.")
+            logger.debug("Reports directory '%s' already exists.", self.reports_dir)
+        elif create_dir:
+            logger.debug("Reports directory '%s' does not exist. Creating it.", self.reports_dir)
             self.reports_dir.mkdir(parents=True, exist_ok=True)
 
         # Get the current date and time
@@ -54,14 +84,42 @@ class ReportGenerator:
         else:
             report_file_name_prefix = ""
 
+        # The reports of several revisions of a repository are told apart by their names
+        if revision:
+            report_file_name_prefix += re.sub(r"[^\w.-]+", "-", revision) + "_"
+
         self.report_file_path = self.reports_dir / f"{report_file_name_prefix}{formatted_datetime}.md"
-        logger.debug(f"Report file path set to: {self.report_file_path}")
+
+        # Reopen the report of an interrupted run, its journal lists the reported files
+        if resume and self.reports_dir.exists():
+            journal_pattern = re.compile(re.escape(report_file_name_prefix) + r"\d{4}-\d{2}-\d{2}_\d{2}:\d{2}:\d{2}\.journal")
+            journals = sorted(path for path in self.reports_dir.iterdir() if journal_pattern.fullmatch(path.name))
+
+            if journals:
+                self.report_file_path = journals[-1].with_suffix(".md")
+                logger.debug("Resuming report: %s", self.report_file_path)
+
+        # The progress journal is stored next to the report
+        self.journal_file_path = self.report_file_path.with_suffix(".journal")
+        logger.debug("Report file path set to: %s", self.report_file_path)
 
         # Initialize an empty list to store report entries
         self.report_data = []
         logger.debug("Report data initialized as an empty list.")
 
-    def add_report_entry(self, file_path: pathlib.Path, report_entry_data: str, auto_save: bool = True) -> bool:
+        # Entries written out of order: their positions and where they end in the file,
+        # each starts where the previous one ends (the first at _entries_start)
+        self._entry_positions = array("q")
+        self._entry_ends = array("q")
+        self._entries_start = None
+
+    def add_report_entry(
+            self,
+            file_path: pathlib.Path,
+            report_entry_data: str,
+            auto_save: bool = True,
+            position: int = None
+        ) -> bool:
         """
         Adds an entry to the report data.
         
@@ -69,26 +127,139 @@ class ReportGenerator:
             file_path (Path): The path of the file being reported on.
             report_entry_data (str): The data to include in the report entry.
             auto_save (bool, optional): If True, the method will immediately save the entry to a file.
+            position (int, optional): The position of the entry, if entries are added out of order.
+                The entry is saved at once and moved to its position by sort_entries.
 
         Returns:
             bool: Always returns True after adding the report entry.
         """
 
+        # Entries with a position are saved one by one, so that their place in the file is known
+        if position is not None:
+            self.save_report_file()
+            if self._entries_start is None:
+                self._entries_start = self._file_size()
+
         # Create a formatted report entry string with a header
         # for the file path and the report entry data
         report_entry = f"\n## File: {file_path.as_posix()}\n{report_entry_data}\n"
-        logger.debug(f"Adding report entry: {report_entry}")
+        logger.debug("Adding report entry: %s", report_entry)
 
         # Append the report entry to the list of report data
         self.report_data.append(report_entry)
-        logger.debug(f"Report entry added. Total entries: {len(self.report_data)}")
+        logger.debug("Report entry added. Total entries: %s", len(self.report_data))
 
-        if auto_save:
+        if auto_save or position is not None:
             logger.debug("Auto-save enabled. Saving report file.")
             self.save_report_file()
 
+        if position is not None:
+            self._entry_positions.append(position)
+            self._entry_ends.append(self._file_size())
+
+        return True
+
+    def sort_entries(self) -> bool:
+        """
+        Moves the entries added with a position into the order of their positions.
+
+        The entries are written one after another, so the size of the report doesn't change,
+        and the report is replaced at once, so a crash never leaves half of it.
+
+        Returns:
+            bool: True if entries were moved, otherwise False.
+        """
+
+        positions, ends, entries_start = self._entry_positions, self._entry_ends, self._entries_start
+
+        # Later entries are appended after the sorted ones
+        self._entry_positions = array("q")
+        self._entry_ends = array("q")
+        self._entries_start = None
+
+        # Entries of equal positions (e.g. the files of a batch) keep the order they were added in
+        order = sorted(range(len(positions)), key=positions.__getitem__)
+        if order == list(range(len(positions))):
+            return False
+
+        temporary_path = self.report_file_path.with_suffix(".md.tmp")
+        with open(self.report_file_path, "rb") as report_file, open(temporary_path, "wb") as sorted_file:
+            _copy_bytes(report_file, sorted_file, entries_start)
+
+            for index in order:
+                start = ends[index - 1] if index else entries_start
+                report_file.seek(start)
+                _copy_bytes(report_file, sorted_file, ends[index] - start)
+
+            # Anything written after the entries stays at the end
+            report_file.seek(ends[-1])
+            shutil.copyfileobj(report_file, sorted_file)
+
+            sorted_file.flush()
+            os.fsync(sorted_file.fileno())
+
+        temporary_path.replace(self.report_file_path)
+        logger.debug("Sorted %s report entries", len(positions))
+
         return True
 
+    def stream_report_entry(self, file_path: pathlib.Path, report_entry_chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Writes an entry to the report file while its data is still arriving.
+
+        The entry is written in the same format as add_report_entry. If the data source fails
+        after the entry was started, a note about the interruption is written and the error is re-raised.
+
+        Args:
+            file_path (Path): The path of the file being reported on.
+            report_entry_chunks (Iterable[str]): The pieces of the data to include in the report entry.
+
+        Yields:
+            str: Every piece of the data, after it has been written to the file.
+        """
+
+        # Entries added earlier must be written first to keep the order
+        self.save_report_file()
+
+        report_file = None
+        try:
+            for chunk in report_entry_chunks:
+                # The header is written only when the data starts arriving
+                if report_file is None:
+                    report_file = open(self.report_file_path, 'a')
+                    report_file.write(f"\n## File: {file_path.as_posix()}\n")
+                    logger.debug("Started streaming report entry for: %s", file_path)
+
+                report_file.write(chunk)
+                report_file.flush()
+
+                yield chunk
+
+            # Write an empty entry if no data was received at all
+            if report_file is None:
+                report_file = open(self.report_file_path, 'a')
+                report_file.write(f"\n## File: {file_path.as_posix()}\n")
+
+            report_file.write("\n")
+            logger.debug("Finished streaming report entry for: %s", file_path)
+        except Exception as e:
+            if report_file is not None:
+                report_file.write(f"\n\n*Review interrupted: {e}*\n")
+            raise
+        finally:
+            if report_file is not None:
+                report_file.close()
+
+    def _file_size(self) -> int:
+        """
+        Returns the size of the report file in bytes, 0 if it doesn't exist yet.
+        """
+
+        try:
+            return self.report_file_path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
     def save_report_file(self) -> bool:
         """
         Saves the accumulated report data to a Markdown file.
@@ -99,15 +270,15 @@ class ReportGenerator:
 
         # Checking for reports
         if self.report_data:
-            # Join all report entries into a single string
-            report_data = "\n\n".join(self.report_data)
-            logger.debug(f"Joining report data into a single string: {report_data}")
-
-            # Open the report file in write mode and write the report data to it
+            # Open the report file in append mode and write the report entries to it,
+            # one by one instead of joining them into a single string
             with open(self.report_file_path, 'a') as report_file:
-                report_file.write(report_data)
+                for index, report_entry in enumerate(self.report_data):
+                    if index:
+                        report_file.write("\n\n")
+                    report_file.write(report_entry)
 
-            logger.debug(f"Report data written to file: {self.report_file_path}")
+            logger.debug("%s report entries written to file: %s", len(self.report_data), self.report_file_path)
 
             # Clearing the list of unsaved reports
             self.report_data.clear()
@@ -149,27 +320,19 @@ class ReportGenerator:
             return False
 
     @staticmethod
-    def markdown_to_text(markdown_string: str) -> str:
+    def markdown_to_text(markdown_string: str, color: bool = False) -> str:
         """
-        Converts a Markdown formatted string to plain text.
+        Converts a Markdown formatted string to text for the terminal.
 
-        This method takes a string formatted in Markdown, converts it to HTML,
-        and then extracts the plain text from the HTML.
+        Headings, lists, quotes and code blocks are kept readable without the Markdown markup
+        (see MarkdownRenderer, which also renders reviews while they are streamed).
 
         Args:
             markdown_string (str): The input string containing Markdown formatted text.
+            color (bool, optional): If True, the text is styled with ANSI escape sequences.
 
         Returns:
-            str: The extracted plain text from the Markdown input.
+            str: The text rendered from the Markdown input.
         """
 
-        # Convert Markdown to HTML
-        html = markdown.markdown(markdown_string)
-        logger.debug(f"Markdown converted to HTML: {html}")
-    
-        # Parsing HTML and extracting text
-        soup = bs4.BeautifulSoup(html, "html.parser")
-        text = soup.get_text()
-        logger.debug(f"Extracted text from HTML: {text}")
-        
-        return text
+        return render_markdown(markdown_string, color)
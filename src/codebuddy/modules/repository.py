@@ -1,14 +1,22 @@
 
-import git
+import os
+import re
 import pathlib
-import pathspec
 import logging
+import threading
 
-from typing import Dict, List
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Set, Tuple, Union
 
+from .ingest import check_size, decode_text, read_text
+from .inventory import FileInventory, FileListView
 from .config import EXTENTIONS, ALL_CATEGORIES, FILTER_FILES, FILTER_DIRS
 
 
+# GitPython and pathspec are imported where they are used, to keep the startup fast
+if TYPE_CHECKING:
+    import git
+    import pathspec
+
 # Setting up the logger for this module
 logger = logging.getLogger(__name__)
 
@@ -19,22 +27,57 @@ class RepositoryTools:
     A class for managing and analyzing files in a Git repository.
     """
 
-    def __init__(self, repository_dir: pathlib.Path) -> None:
+    def __init__(
+            self,
+            repository_dir: pathlib.Path,
+            since: str = None,
+            use_git_index: bool = True,
+            rev: str = None
+        ) -> None:
         """
         Initializes the RepositoryTools with the given repository directory.
 
         Args:
             repository_dir (Path): The path to the repository directory.
+            since (str, optional): A git revision. If provided, only files added or modified
+                since this revision (including uncommitted changes) are taken into account.
+            use_git_index (bool, optional): If True, files of a git working tree are listed
+                by git instead of walking the directory.
+            rev (str, optional): A git revision. If provided, the files of this revision are read
+                from the git objects instead of the working tree (which may be missing, e.g. in a bare mirror).
         """
 
         # Resolve the repository directory to an absolute path
         self.repository_dir = repository_dir.resolve()
-        logger.debug(f"Resolved repository directory: {self.repository_dir}")
+        self.use_git_index = use_git_index
+        logger.debug("Resolved repository directory: %s", self.repository_dir)
+
+        # The files of a revision are read from the git objects instead of the working tree
+        self.rev = rev
+
+        # The contents of files are read by one "git cat-file --batch" process, shared by the workers
+        self._git = None
+        self._git_lock = threading.Lock()
+
+        # Cache of ignore patterns per directory, used by the walk and by the --since filter
+        self._ignore_specs = {}
 
         # Categorize the files in the repository
-        self.project_structure = self._categorize_files()
+        if rev:
+            self.inventory = self._categorize_files(self._list_tree_files(rev, since))
+        elif since:
+            self.inventory = self._categorize_files(
+                path.relative_to(self.repository_dir).as_posix()
+                for path in sorted(self.get_changed_files(since))
+                if not self._is_path_excluded(path)
+            )
+        else:
+            self.inventory = self._categorize_files()
 
-    def get_files(self, categories: list = ALL_CATEGORIES) -> Dict[str, List[pathlib.Path]]:
+        # The lists of files of every category are views of the inventory, their paths are created on access
+        self.project_structure = self.inventory.as_dict()
+
+    def get_files(self, categories: list = ALL_CATEGORIES) -> Dict[str, FileListView]:
         """
         Retrieves a dictionary of file paths categorized by the specified categories.
 
@@ -42,21 +85,21 @@ class RepositoryTools:
             categories (list): A list of categories for which to retrieve files. Defaults to ALL_CATEGORIES.
 
         Returns:
-            Dict[str, List[pathlib.Path]]: Dictionary with file paths sorted by category.
+            Dict[str, FileListView]: Dictionary with file paths sorted by category, every list is a read-only view.
         """
 
         if categories == ALL_CATEGORIES:
             # Return files of all categories
-            logger.debug(f"Specifies all file categories, returns the project structure...")
+            logger.debug("Specifies all file categories, returns the project structure...")
             return self.project_structure
         else:
             # Retrieving files of specific categories
-            logger.debug(f"Getting files for categories: {categories}")
+            logger.debug("Getting files for categories: %s", categories)
 
             result = {}
             for category in categories:
                 result[category] = self.project_structure.get(category)
-                logger.debug(f"Files for category '{category}': {result[category]}")
+                logger.debug("Files for category '%s': %s", category, result[category])
 
             return result
 
@@ -64,109 +107,451 @@ class RepositoryTools:
         """
         Reads and returns the content of the specified file.
 
+        Large files are sampled, documents are converted to text and binary files are rejected.
+
         Args:
             file_path (Path): The path to the file whose content is to be read.
 
         Returns:
             str: The content of the file as a string.
+
+        Raises:
+            FileSkipped: If the file must not be reviewed.
         """
 
+        # Reading the content of a file of the revision from the git objects
+        if self.rev:
+            index = self.inventory.index(file_path)
+            object_id = self.inventory.object_id(index)
+            check_size(self.inventory.size(index))
+
+            logger.debug("Reading file: %s (object %s)", file_path, object_id)
+            with self._git_lock:
+                _, _, _, data = self._git.get_object_data(object_id)
+
+            return decode_text(data, file_path.name)
+
         # Reading data from a file
-        logger.debug(f"Reading file: {file_path}")
-        with open(file_path, 'r') as f:
-            file_data = f.read()
+        logger.debug("Reading file: %s", file_path)
+        file_data = read_text(file_path)
 
         return file_data
 
-    def _read_gitignore(self) -> pathspec.PathSpec:
+    def get_file_size(self, file_path: pathlib.Path) -> int:
+        """
+        Returns the size of the specified file without reading it.
+
+        Args:
+            file_path (Path): The path to the file.
+
+        Returns:
+            int: The size of the file in bytes.
+        """
+
+        # The size is read from the file system once and kept in the inventory
+        try:
+            return self.inventory.size(self.inventory.index(file_path))
+        except KeyError:
+            return file_path.stat().st_size
+
+    def close(self) -> None:
+        """
+        Stops the git process reading the files of a revision.
+        """
+
+        if self._git is not None:
+            self._git.clear_cache()
+
+    def get_changed_files(self, since: str) -> Set[pathlib.Path]:
+        """
+        Collects the files added or modified since the given revision.
+
+        The working tree is compared with the revision, so committed, staged and
+        unstaged changes are all included, as well as untracked files that are not ignored.
+
+        Args:
+            since (str): The git revision to compare with (e.g. a commit hash, tag or "HEAD~1").
+
+        Returns:
+            Set[pathlib.Path]: Absolute paths of the changed files inside the repository directory.
+        """
+
+        import git
+
+        repo = git.Repo(self.repository_dir, search_parent_directories=True)
+        working_tree_dir = pathlib.Path(repo.working_tree_dir).resolve()
+
+        # Fail early with a clear message if the revision is unknown
+        repo.rev_parse(since)
+
+        # Added, copied, modified and renamed files (deleted ones can't be reviewed)
+        changed = repo.git.diff(
+            "--name-only", "--no-renames", "--diff-filter=ACMR", "-z", since, "--"
+        ).split("\0")
+        changed.extend(repo.untracked_files)
+
+        result = set()
+        for name in changed:
+            if not name:
+                continue
+
+            path = working_tree_dir / name
+
+            # Keep only files that are located in the analyzed directory
+            if path.is_file() and path.is_relative_to(self.repository_dir):
+                result.add(path)
+
+        logger.debug("Found %s file(s) changed since '%s'", len(result), since)
+
+        return result
+
+    def _read_gitignore(self, gitignore_path: pathlib.Path = None) -> "pathspec.PathSpec":
         """
         Reads the .gitignore file and returns a PathSpec object representing the patterns.
 
+        Args:
+            gitignore_path (Path, optional): The path to the file with ignore patterns.
+                Defaults to the .gitignore file in the root of the repository.
+
         Returns:
             pathspec.PathSpec: A PathSpec object containing the patterns from the .gitignore file.
         """
 
         # Define the path to the .gitignore file
-        gitignore_path = self.repository_dir / ".gitignore"
+        if gitignore_path is None:
+            gitignore_path = self.repository_dir / ".gitignore"
         patterns = []
 
         # Check if the .gitignore file exists
-        if gitignore_path.exists():
+        if gitignore_path.is_file():
             # Open and read the .gitignore file
-            logger.debug(f"Found .gitignore file: {gitignore_path}")
+            logger.debug("Found .gitignore file: %s", gitignore_path)
             with gitignore_path.open("r", encoding="utf-8") as f:
                 for line in f:
                     # Strip whitespace and ignore empty lines and comments
                     line = line.strip()
                     if line and not line.startswith("#"):
                         patterns.append(line)
-                        logger.debug(f"Added pattern to .gitignore: {line}")
+                        logger.debug("Added pattern to .gitignore: %s", line)
 
         # Create a PathSpec object from the collected patterns
-        return pathspec.PathSpec.from_lines("gitwildmatch", patterns)
+        import pathspec
+
+        return pathspec.GitIgnoreSpec.from_lines(patterns)
 
-    def _categorize_files(self) -> Dict[str, List[pathlib.Path]]:
+    def _get_ignore_specs(self, rel_dir: str) -> List[Tuple[str, "pathspec.PathSpec"]]:
         """
-        Categorizes files in the repository into 'code' and 'docs' categories based on their extensions,
-        while respecting the .gitignore file and a list of filtered files and directories.
+        Returns the ignore patterns that apply to the entries of a directory.
+
+        The patterns of .git/info/exclude come first, followed by the .gitignore files
+        from the root of the repository down to the directory itself. The results are cached.
+
+        Args:
+            rel_dir (str): The directory relative to the repository, "" for the root or ending with "/".
 
         Returns:
-            Dict[str, List[pathlib.Path]]: A dictionary with two keys: 'code' and 'docs',
-            each mapping to a list of file paths that belong to that category.
+            List[Tuple[str, PathSpec]]: The directories the patterns are relative to, with the patterns.
         """
 
-        # Read the .gitignore patterns
-        spec = self._read_gitignore()
-        logger.debug(f"Read .gitignore patterns: {spec.patterns}")
+        specs = self._ignore_specs.get(rel_dir)
+        if specs is not None:
+            return specs
+
+        if rel_dir:
+            # Inherit the patterns of the parent directory
+            parent_dir = rel_dir[:-1].rpartition("/")[0]
+            specs = list(self._get_ignore_specs(parent_dir + "/" if parent_dir else ""))
+        else:
+            specs = []
+            exclude_spec = self._read_gitignore(self.repository_dir / ".git" / "info" / "exclude")
+            if exclude_spec.patterns:
+                specs.append(("", exclude_spec))
+
+        gitignore_spec = self._read_gitignore(self.repository_dir / rel_dir / ".gitignore")
+        if gitignore_spec.patterns:
+            specs.append((rel_dir, gitignore_spec))
 
-        # Initialize the result dictionary with 'code' and 'docs' categories
-        result = {}
-        for category in ALL_CATEGORIES:
-            result[category] = []
+        self._ignore_specs[rel_dir] = specs
 
-        # Recursively iterate over all files and directories in the repository
-        for path in self.repository_dir.rglob("*"):
-            # Get the relative path of the current file/directory
-            rel_path = path.relative_to(self.repository_dir)
-            logger.debug(f"Processing path: {rel_path}")
+        return specs
+
+    def _is_excluded(self, rel_path: str, is_dir: bool) -> bool:
+        """
+        Checks whether an entry of the repository is excluded from the analysis,
+        assuming that its parent directory is not.
+
+        Args:
+            rel_path (str): The path of the entry relative to the repository, in POSIX form.
+            is_dir (bool): Whether the entry is a directory.
 
-            # Skip files that match the .gitignore patterns
-            if spec.match_file(rel_path):
-                logger.debug(f"Skipped path due to .gitignore: {rel_path}")
+        Returns:
+            bool: True if the entry (and everything inside it) must be skipped.
+        """
+
+        rel_dir, _, name = rel_path.rpartition("/")
+
+        # The internals of git are never analyzed
+        if is_dir and name == ".git":
+            return True
+
+        # Skip directories that are in the FILTER_DIRS list
+        if any(rel_path.startswith(dir) for dir in FILTER_DIRS):
+            logger.debug("Skipped path due to FILTER_DIRS: %s", rel_path)
+            return True
+
+        # The last matching pattern wins, deeper .gitignore files take precedence
+        ignored = False
+        for base_dir, spec in self._get_ignore_specs(rel_dir + "/" if rel_dir else ""):
+            result = spec.check_file(rel_path[len(base_dir):] + ("/" if is_dir else ""))
+            if result.include is not None:
+                ignored = result.include
+
+        if ignored:
+            logger.debug("Skipped path due to .gitignore: %s", rel_path)
+
+        return ignored
+
+    def _list_git_files(self) -> List[str]:
+        """
+        Lists the files of the repository using the git index, without walking the directory.
+
+        Tracked files are read from the index, untracked files are added unless git ignores them.
+        The ignore rules are applied by git itself, so no .gitignore files are parsed.
+
+        Returns:
+            List[str]: Paths of the files relative to the repository directory, or None if the directory
+                is not a git working tree.
+        """
+
+        # Loading GitPython is not worth it outside of a working tree
+        if not any((path / ".git").exists() for path in (self.repository_dir, *self.repository_dir.parents)):
+            logger.debug("Not a git repository: %s", self.repository_dir)
+            return None
+
+        import git
+
+        try:
+            repo = git.Repo(self.repository_dir, search_parent_directories=True)
+        except (git.InvalidGitRepositoryError, git.NoSuchPathError):
+            logger.debug("Not a git repository: %s", self.repository_dir)
+            return None
+
+        if repo.bare:
+            return None
+
+        # Paths are listed relative to the repository directory, limited to its subtree,
+        # with a tag telling tracked files outside of a sparse checkout ("S") apart
+        git_cmd = git.Git(self.repository_dir)
+        try:
+            listed = git_cmd.ls_files("-z", "-t", "--cached", "--others", "--exclude-standard", "--deduplicate")
+            deleted = git_cmd.ls_files("-z", "--deleted")
+        except git.GitCommandError as e:
+            logger.warning("Can't list files with git, walking the directory instead: %s", e)
+            return None
+
+        deleted = set(deleted.split("\0"))
+
+        result = []
+        for entry in listed.split("\0"):
+            if not entry:
                 continue
 
-            # Skip files that are in the FILTER_FILES list
-            if path.name in FILTER_FILES:
-                logger.debug(f"Skipped path due to FILTER_FILES: {rel_path}")
+            tag, name = entry.split(" ", 1)
+            if tag == "S" or name in deleted:
+                continue
+
+            # Skip files inside directories that are in the FILTER_DIRS list
+            if any(name.startswith(dir) for dir in FILTER_DIRS):
                 continue
 
-            # Skip directories that are in the FILTER_DIRS list
-            if any(rel_path.as_posix().startswith(dir) for dir in FILTER_DIRS):
-                logger.debug(f"Skipped path due to FILTER_DIRS: {rel_path}")
+            result.append(name)
+
+        logger.debug("Listed %s file(s) using the git index", len(result))
+
+        return result
+
+    def _list_tree_files(self, rev: str, since: str = None) -> Iterator[Tuple[str, str, int]]:
+        """
+        Lists the files of a revision from its git tree, without a checkout.
+
+        Tracked files are reviewed whatever the ignore rules say, like in a working tree.
+        Symbolic links and submodules are left out.
+
+        Args:
+            rev (str): The git revision (e.g. a tag, a branch or a commit hash).
+            since (str, optional): Another git revision. If provided, only files added or modified
+                between this revision and rev are listed.
+
+        Yields:
+            Tuple[str, str, int]: The path of the next file relative to the repository directory,
+                its object id and its size.
+        """
+
+        import git
+
+        # Paths are listed relative to the repository directory, limited to its subtree
+        self._git = git.Git(self.repository_dir)
+
+        # Fail early with a clear message if the revision is unknown
+        commit = self._git.rev_parse("--verify", "--end-of-options", f"{rev}^{{commit}}")
+        listed = self._git.ls_tree("-r", "-l", "-z", commit)
+
+        changed = None
+        if since:
+            changed = set(self._git.diff_tree(
+                "-r", "--relative", "--name-only", "--no-renames", "--diff-filter=ACMR", "-z", since, commit
+            ).split("\0"))
+
+        count = 0
+        for entry in listed.split("\0"):
+            if not entry:
+                continue
+
+            # Every entry is "<mode> <type> <object id> <size>\t<path>"
+            info, name = entry.split("\t", 1)
+            mode, object_type, object_id, size = info.split()
+            if object_type != "blob" or mode == "120000":
+                continue
+
+            if changed is not None and name not in changed:
+                continue
+
+            # Skip files inside directories that are in the FILTER_DIRS list
+            if any(name.startswith(dir) for dir in FILTER_DIRS):
+                continue
+
+            count += 1
+            yield name, object_id, int(size)
+
+        logger.debug("Listed %s file(s) of revision '%s' (%s)", count, rev, commit)
+
+    def _walk_files(self) -> Iterator[str]:
+        """
+        Walks the repository with os.scandir and yields the files that are not excluded.
+
+        Excluded directories are pruned before descending into them, so large ignored
+        trees (such as node_modules or build directories) are never listed.
+
+        Yields:
+            str: The path of the next file relative to the repository directory, in a stable (sorted) order.
+        """
+
+        stack = [(self.repository_dir, "")]
+
+        while stack:
+            dir_path, rel_dir = stack.pop()
+
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError as e:
+                logger.warning("Can't read directory '%s': %s", dir_path, e)
+                continue
+
+            subdirs = []
+            for entry in entries:
+                rel_path = rel_dir + entry.name
+                is_dir = entry.is_dir(follow_symlinks=False)
+
+                if self._is_excluded(rel_path, is_dir):
+                    continue
+
+                if is_dir:
+                    subdirs.append((entry.path, rel_path + "/"))
+                elif entry.is_file():
+                    yield rel_path
+
+            # Visit the subdirectories in sorted order
+            stack.extend(reversed(subdirs))
+
+    def _categorize_files(self, entries: Iterable[Union[str, Tuple[str, str, int]]] = None) -> FileInventory:
+        """
+        Categorizes files in the repository into 'code' and 'docs' categories based on their extensions,
+        while respecting the .gitignore files and a list of filtered files and directories.
+
+        Args:
+            entries (Iterable, optional): Paths of files relative to the repository directory to categorize,
+                or tuples with the path, the object id and the size of files of a revision.
+                Defaults to all files in the repository.
+
+        Returns:
+            FileInventory: The files of the 'code' and 'docs' categories.
+        """
+
+        # Initialize the inventory with 'code' and 'docs' categories
+        result = FileInventory(self.repository_dir, ALL_CATEGORIES)
+
+        if entries is None:
+            # List the files using git if possible (git finds nothing in directories
+            # it ignores entirely), otherwise walk the directory
+            entries = self._list_git_files() if self.use_git_index else None
+            if not entries:
+                entries = self._walk_files()
+
+        for entry in entries:
+            name, object_id, size = entry if isinstance(entry, tuple) else (entry, None, -1)
+            logger.debug("Processing path: %s", name)
+
+            # Skip files that are in the FILTER_FILES list
+            file_name = name.rpartition("/")[2]
+            if file_name in FILTER_FILES:
+                logger.debug("Skipped path due to FILTER_FILES: %s", name)
                 continue
 
-            # Process only files (not directories)
-            if path.is_file():
-                # Get the file extension
-                ext = path.suffix.lower()
-                logger.debug(f"File extension: {ext}")
+            # Get the file extension
+            ext = os.path.splitext(file_name)[1].lower()
+            logger.debug("File extension: %s", ext)
 
-                # Categorize the file based on its extension
-                for category in ALL_CATEGORIES:
-                    if ext in EXTENTIONS.get(category):
-                        result[category].append(path)
-                        logger.debug(f"Categorized file '{path}' as '{category}'")
+            # Categorize the file based on its extension
+            for category in ALL_CATEGORIES:
+                if ext in EXTENTIONS.get(category):
+                    result.add(name, category, size, object_id)
+                    logger.debug("Categorized file '%s' as '%s'", name, category)
 
         return result
 
+    def _is_path_excluded(self, path: pathlib.Path) -> bool:
+        """
+        Checks whether a file or any of its parent directories is excluded from the analysis.
+
+        Args:
+            path (Path): The absolute path of the file.
+
+        Returns:
+            bool: True if the file must be skipped.
+        """
+
+        parts = path.relative_to(self.repository_dir).parts
+
+        for index in range(1, len(parts) + 1):
+            if self._is_excluded("/".join(parts[:index]), index < len(parts)):
+                return True
+
+        return False
+
     @staticmethod
-    def clone_from(repo_url: str, local_dir: pathlib.Path) -> git.Repo:
+    def clone_from(
+            repo_url: str,
+            local_dir: pathlib.Path,
+            depth: int = None,
+            ref: str = None,
+            blobless: bool = False,
+            sparse: bool = False
+        ) -> "git.Repo":
         """
         Clones a Git repository from the specified URL into a local directory
 
+        The options reduce the download to what is reviewed: the latest commits only (depth),
+        the contents of files only when they are checked out (blobless, a partial clone
+        that fetches other blobs on demand), and only files with reviewed extensions (sparse).
+
         Args:
             repo_url (str): The URL of the Git repository to clone.
             local_dir (pathlib.Path): The local directory path where the repository should be cloned.
+            depth (int, optional): The number of commits to download, all of them if not provided.
+            ref (str, optional): The branch, tag or full commit hash to check out instead of the default branch.
+            blobless (bool, optional): If True, the contents of files are downloaded only when needed.
+            sparse (bool, optional): If True, only files with the extensions in EXTENTIONS are checked out.
 
         Returns:
             git.Repo: A git.Repo object representing the cloned repository.
@@ -175,9 +560,53 @@ class RepositoryTools:
         # Convert to a string with the full path to the local directory
         local_dir = local_dir.resolve().as_posix()
 
+        import git
+
+        # A commit can't be cloned directly, it is fetched after cloning the default branch
+        commit = ref if ref and re.fullmatch(r"[0-9a-f]{40}|[0-9a-f]{64}", ref) else None
+
+        options = {}
+        if depth:
+            options["depth"] = depth
+        if blobless:
+            options["filter"] = "blob:none"
+        if ref and not commit:
+            options["branch"] = ref
+        if sparse or commit:
+            # The files are checked out once the sparse patterns are set or the commit is fetched
+            options["no_checkout"] = True
+
         # Cloning a repository
-        logger.debug(f"Cloning repository from {repo_url} to {local_dir}")
-        repo = git.Repo.clone_from(repo_url, f"{local_dir}")
-        logger.debug(f"Cloned repository: {repo}")
+        logger.debug("Cloning repository from %s to %s with options %s", repo_url, local_dir, options)
+        repo = git.Repo.clone_from(repo_url, f"{local_dir}", **options)
+
+        if sparse:
+            repo.git.sparse_checkout("set", "--no-cone", *_sparse_patterns())
+            logger.debug("Limited the checkout to the reviewed extensions")
+
+        if commit:
+            repo.git.fetch("origin", commit, depth=depth)
+            repo.git.checkout(commit)
+        elif sparse:
+            repo.git.checkout()
+
+        logger.debug("Cloned repository: %s", repo)
 
         return repo
+
+
+def _sparse_patterns() -> List[str]:
+    """
+    Builds the sparse checkout patterns matching the files with reviewed extensions in any directory.
+
+    Returns:
+        List[str]: The patterns (the .gitignore files are checked out too, since they exclude files from the review).
+    """
+
+    patterns = [".gitignore"]
+    for category in ALL_CATEGORIES:
+        for ext in sorted(EXTENTIONS.get(category)):
+            # Extensions are compared case-insensitively, git patterns are case-sensitive
+            patterns.append("*" + "".join(f"[{char.lower()}{char.upper()}]" if char.isalpha() else char for char in ext))
+
+    return patterns
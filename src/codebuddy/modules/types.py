@@ -3,6 +3,8 @@ import click
 import urllib
 import logging
 
+from .balancer import parse_endpoint
+
 
 # Setting up the logger for this module
 logger = logging.getLogger(__name__)
@@ -14,25 +16,28 @@ class APIURL(click.ParamType):
 
     def convert(self, value, param, ctx):
         try:
+            # Separate the options that may follow the URL (e.g. ",weight=2,concurrency=4")
+            url, _ = parse_endpoint(value)
+
             # Parse the URL using urllib's urlparse
-            result = urllib.parse.urlparse(value)
+            result = urllib.parse.urlparse(url)
 
             # Check if both scheme (e.g., http, https) and netloc (network location) are present
             if all([result.scheme, result.netloc]):
                 # Log the valid URL at the debug level
-                logger.debug(f"Valid API URL: {value}")
+                logger.debug("Valid API URL: %s", value)
 
                 # Return the valid URL
                 return value
             else:
                 # Log an error if the URL is invalid
-                logger.error(f"Invalid API URL: {value} - Missing scheme or netloc")
+                logger.error("Invalid API URL: %s - Missing scheme or netloc", value)
 
                 # Raise a ValueError to indicate invalid input
                 raise ValueError
-        except ValueError:
+        except ValueError as e:
             # Handle the ValueError and provide a user-friendly error message
-            self.fail(f"'{value}' is not a valid URL.", param, ctx)
+            self.fail(f"'{value}' is not a valid URL{f' ({e})' if str(e) else ''}.", param, ctx)
 
 
 class GitURL(click.ParamType):
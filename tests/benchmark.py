@@ -0,0 +1,362 @@
+
+"""
+Benchmarks of the overhead of CodeBuddy itself, without a GPU.
+
+Reviews are requested from a local mock server with configurable latency, jitter,
+error rate and response size, and the repository is generated with a configurable
+number and size of files. Every stage runs in a fresh process, so its peak memory
+usage is measured separately.
+
+Usage:
+    python tests/benchmark.py --files 2000 --latency 0.05 --jitter 0.02 --jobs 8
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import pathlib
+import logging
+import tempfile
+import multiprocessing
+
+import click
+
+# Make the package and the mock server importable when running as a script
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_server import make_review, start_mock_api
+
+
+# Directory with the generated repositories (ignored by git)
+SYNTHETIC_REPOS_DIR = pathlib.Path(__file__).parent / "synthetic_repos"
+
+# Extensions of the generated files and their share in the repository
+FILE_TYPES = [(".py", 0.5), (".js", 0.2), (".md", 0.2), (".txt", 0.1)]
+
+STAGES = ["discovery", "pipeline", "reports"]
+
+
+def generate_repo(repo_dir: pathlib.Path, files: int, file_size: int, depth: int = 3, use_git: bool = False) -> pathlib.Path:
+    """
+    Generates a repository with source files and documents of random size.
+
+    The same parameters always give the same repository, which is reused if it exists.
+    Some files are placed in an ignored directory, to be filtered out during discovery.
+
+    Args:
+        repo_dir (Path): The directory of the repository.
+        files (int): The number of files to review.
+        file_size (int): The average size of a file in bytes.
+        depth (int, optional): The maximum depth of the directory tree.
+        use_git (bool, optional): Whether to create a git repository with the files in its index.
+
+    Returns:
+        Path: The directory of the repository.
+    """
+
+    marker = repo_dir / ".synthetic"
+    params = json.dumps({"files": files, "file_size": file_size, "depth": depth, "use_git": use_git})
+    if marker.exists() and marker.read_text() == params:
+        return repo_dir
+
+    rng = random.Random(files * 31 + file_size)
+    line = "value = compute(value, 42)  # a line of synthetic source code\n"
+    extensions = [extension for extension, _ in FILE_TYPES]
+    weights = [weight for _, weight in FILE_TYPES]
+
+    repo_dir.mkdir(parents=True, exist_ok=True)
+    (repo_dir / ".gitignore").write_text("build/\n")
+
+    for index in range(files):
+        parts = [f"dir_{rng.randrange(8)}" for _ in range(rng.randrange(depth + 1))]
+        file_path = repo_dir.joinpath(*parts, f"file_{index}{rng.choices(extensions, weights)[0]}")
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        size = max(1, int(rng.uniform(0.5, 1.5) * file_size))
+        file_path.write_text((line * (size // len(line) + 1))[:size])
+
+    # Ignored files, to measure filtering
+    (repo_dir / "build").mkdir(exist_ok=True)
+    for index in range(files // 10):
+        (repo_dir / "build" / f"output_{index}.js").write_text(line)
+
+    if use_git:
+        import git
+
+        repo = git.Repo.init(repo_dir)
+        repo.git.add(A=True)
+
+    marker.write_text(params)
+
+    return repo_dir
+
+
+def percentile(values: list, p: float) -> float:
+    """
+    Returns the p-th percentile of the values (nearest rank), or None if there are none.
+    """
+
+    if not values:
+        return None
+
+    values = sorted(values)
+
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def _peak_rss() -> float:
+    """
+    Returns the peak memory usage of the current process in MiB, or None if unknown.
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _silence_logging() -> None:
+    """
+    Discards the log output, but keeps the cost of formatting the records.
+    """
+
+    for handler in logging.getLogger().handlers:
+        # The records are written by the handlers of the queue listener
+        for listener_handler in getattr(getattr(handler, "listener", None), "handlers", [handler]):
+            if isinstance(listener_handler, logging.StreamHandler):
+                listener_handler.setStream(open(os.devnull, "w"))
+
+
+def _bench_discovery(repo_dir: pathlib.Path) -> dict:
+    from codebuddy.modules import repository
+
+    start = time.perf_counter()
+    files = repository.RepositoryTools(repo_dir).get_files()
+
+    return {
+        "files": sum(len(file_paths) for file_paths in files.values()),
+        "seconds": time.perf_counter() - start,
+        "latencies": [],
+    }
+
+
+def _bench_pipeline(repo_dir: pathlib.Path, api_url: str, jobs: int, options: list) -> dict:
+    from codebuddy import cli
+    from codebuddy.modules import planning
+    from codebuddy.modules import reports
+    from codebuddy.modules import repository
+
+    _silence_logging()
+
+    # Per-file latency is measured from reading the file to writing its report entry
+    started = {}
+    latencies = []
+
+    get_file_data = repository.RepositoryTools.get_file_data
+    add_report_entry = reports.ReportGenerator.add_report_entry
+    stream_report_entry = reports.ReportGenerator.stream_report_entry
+
+    def timed_get_file_data(self, file_path):
+        started[file_path] = time.perf_counter()
+        return get_file_data(self, file_path)
+
+    def timed_add_report_entry(self, file_path, *args, **kwargs):
+        result = add_report_entry(self, file_path, *args, **kwargs)
+        latencies.append(time.perf_counter() - started.pop(file_path))
+        return result
+
+    def timed_stream_report_entry(self, file_path, *args, **kwargs):
+        yield from stream_report_entry(self, file_path, *args, **kwargs)
+        latencies.append(time.perf_counter() - started.pop(file_path))
+
+    repository.RepositoryTools.get_file_data = timed_get_file_data
+    reports.ReportGenerator.add_report_entry = timed_add_report_entry
+    reports.ReportGenerator.stream_report_entry = timed_stream_report_entry
+
+    with tempfile.TemporaryDirectory() as reports_dir:
+        # The mock server would distort the token calibration of real runs
+        planning.PLANNING_CONFIG["path"] = str(pathlib.Path(reports_dir) / "calibration.json")
+
+        args = [str(repo_dir), "--api", api_url, "--reports", reports_dir, "--jobs", str(jobs), "--no-cache"] + options
+
+        start = time.perf_counter()
+        cli.main(args=args, standalone_mode=False)
+        seconds = time.perf_counter() - start
+
+    return {"files": len(latencies), "seconds": seconds, "latencies": latencies}
+
+
+def _bench_reports(files: int, response_size: int) -> dict:
+    from codebuddy.modules import reports
+
+    _silence_logging()
+
+    review = make_review(response_size)
+    latencies = []
+
+    with tempfile.TemporaryDirectory() as reports_dir:
+        report_generator = reports.ReportGenerator(pathlib.Path(reports_dir), pathlib.Path(reports_dir))
+
+        start = time.perf_counter()
+        for index in range(files):
+            entry_start = time.perf_counter()
+            report_generator.add_report_entry(pathlib.Path(f"dir_0/file_{index}.py"), review)
+            latencies.append(time.perf_counter() - entry_start)
+        seconds = time.perf_counter() - start
+
+    return {"files": files, "seconds": seconds, "latencies": latencies}
+
+
+def _run_stage(stage: str, params: dict, connection) -> None:
+    """
+    Runs a stage in a child process and sends its measurements back.
+    """
+
+    if stage == "discovery":
+        result = _bench_discovery(params["repo_dir"])
+    elif stage == "pipeline":
+        result = _bench_pipeline(params["repo_dir"], params["api_url"], params["jobs"], params["options"])
+    else:
+        result = _bench_reports(params["files"], params["response_size"])
+
+    result["peak_rss_mb"] = _peak_rss()
+    connection.send(result)
+    connection.close()
+
+
+def run_stage(stage: str, **params) -> dict:
+    """
+    Runs a benchmark stage in a fresh process.
+
+    Args:
+        stage (str): The stage to run ("discovery", "pipeline" or "reports").
+        **params: The parameters of the stage.
+
+    Returns:
+        dict: The number of files, files per second, latency percentiles in milliseconds and peak RSS in MiB.
+    """
+
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+
+    process = context.Process(target=_run_stage, args=(stage, params, sender))
+    process.start()
+    sender.close()
+
+    try:
+        result = receiver.recv()
+    except EOFError:
+        raise RuntimeError(f"Benchmark stage '{stage}' failed")
+    finally:
+        process.join()
+
+    latencies = result.pop("latencies")
+    result["files_per_sec"] = result["files"] / result["seconds"] if result["seconds"] else None
+    for p in (50, 95, 99):
+        value = percentile(latencies, p)
+        result[f"p{p}_ms"] = value * 1000 if value is not None else None
+
+    return result
+
+
+def run_benchmark(
+        repo_dir: pathlib.Path,
+        files: int,
+        stages: list = STAGES,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        response_size: int = 500,
+        jobs: int = 8,
+        options: list = ()
+    ) -> dict:
+    """
+    Runs the benchmark stages against a local mock server.
+
+    Returns:
+        dict: The measurements of every stage, keyed by its name.
+    """
+
+    server = start_mock_api(latency, jitter, error_rate, response_size)
+    results = {}
+
+    try:
+        for stage in stages:
+            results[stage] = run_stage(
+                stage,
+                repo_dir=repo_dir,
+                api_url=server.url,
+                jobs=jobs,
+                options=list(options),
+                files=files,
+                response_size=response_size
+            )
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return results
+
+
+def format_results(results: dict) -> str:
+    """
+    Formats the measurements as a table.
+    """
+
+    columns = ["files", "seconds", "files_per_sec", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb"]
+    lines = [f"{'stage':<10}" + "".join(f"{column:>14}" for column in columns)]
+
+    for stage, result in results.items():
+        cells = []
+        for column in columns:
+            value = result.get(column)
+            if value is None:
+                cells.append(f"{'-':>14}")
+            elif isinstance(value, int):
+                cells.append(f"{value:>14}")
+            else:
+                cells.append(f"{value:>14.2f}")
+        lines.append(f"{stage:<10}" + "".join(cells))
+
+    return "\n".join(lines)
+
+
+@click.command(help="Measures the overhead of CodeBuddy with a local mock LM server.")
+@click.option("--files", type=click.IntRange(min=1), default=1000, show_default=True, help="Number of files in the synthetic repository.")
+@click.option("--file-size", type=click.IntRange(min=1), default=2000, show_default=True, help="Average size of a file in bytes.")
+@click.option("--depth", type=click.IntRange(min=0), default=3, show_default=True, help="Maximum depth of the directory tree.")
+@click.option("--git", "use_git", is_flag=True, help="Create a git repository, so files are listed from its index.")
+@click.option("--latency", type=float, default=0.0, show_default=True, help="Seconds every response is delayed by.")
+@click.option("--jitter", type=float, default=0.0, show_default=True, help="Maximum random seconds added to the latency.")
+@click.option("--error-rate", type=click.FloatRange(0, 1), default=0.0, show_default=True, help="Share of requests answered with 503.")
+@click.option("--response-size", type=click.IntRange(min=1), default=500, show_default=True, help="Size of a review in characters.")
+@click.option("--jobs", type=click.IntRange(min=1), default=8, show_default=True, help="Number of files reviewed concurrently.")
+@click.option("--stage", "stages", type=click.Choice(STAGES), multiple=True, help="Stage to run, can be repeated (all by default).")
+@click.option("--batch", is_flag=True, help="Run the pipeline with --batch.")
+@click.option("--stream", is_flag=True, help="Run the pipeline with --stream.")
+@click.option("--json", "json_path", type=click.Path(dir_okay=False), help="Save the measurements to a JSON file.")
+def main(files, file_size, depth, use_git, latency, jitter, error_rate, response_size, jobs, stages, batch, stream, json_path):
+    repo_dir = SYNTHETIC_REPOS_DIR / f"repo_{files}_{file_size}_{depth}{'_git' if use_git else ''}"
+    click.echo(f"Generating repository: {repo_dir}")
+    generate_repo(repo_dir, files, file_size, depth, use_git)
+
+    options = (["--batch"] if batch else []) + (["--stream"] if stream else [])
+    results = run_benchmark(repo_dir, files, list(stages) or STAGES, latency, jitter, error_rate, response_size, jobs, options)
+
+    click.echo(format_results(results))
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,3 +16,29 @@ src_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
 
 # Insert the 'src' directory into the system path at the beginning
 sys.path.insert(0, src_dir)
+
+import pytest
+
+from mock_server import start_mock_api
+
+
+# Local OpenAI-compatible server answering every request with a fixed review
+@pytest.fixture
+def mock_api():
+    server = start_mock_api()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+# Another local server, for tests with several servers
+@pytest.fixture
+def mock_api_2():
+    server = start_mock_api()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,125 @@
+
+import json
+import time
+import random
+import threading
+import http.server
+
+
+class MockAPIHandler(http.server.BaseHTTPRequestHandler):
+
+    # Keep connections alive between requests, like a real LM server
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+
+        # Read and remember the request body
+        length = int(self.headers.get("Content-Length", 0))
+        server.requests.append(json.loads(self.rfile.read(length)))
+
+        # Simulate the time the model needs to generate the response
+        delay = server.latency + random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+
+        # Reply with the next queued status code, or 200 if there is none
+        status = server.statuses.pop(0) if server.statuses else 200
+        if server.down or random.random() < server.error_rate:
+            status = 503
+
+        if status == 200 and server.requests[-1].get("stream"):
+            self.send_stream()
+            return
+
+        # Token counts are approximated by the number of words
+        body = json.dumps({
+            "choices": [{"message": {"content": server.content}}],
+            "usage": {
+                "prompt_tokens": len(json.dumps(server.requests[-1]).split()),
+                "completion_tokens": len(server.content.split())
+            }
+        }).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status != 200 and server.retry_after:
+            self.send_header("Retry-After", server.retry_after)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # Health checks succeed unless the server is marked as down
+        status = 503 if self.server.down else 200
+        body = json.dumps({"data": [{"id": model} for model in self.server.models]}).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self):
+        # Send the content word by word as server-sent events
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        for word in self.server.content.split(" "):
+            self.send_chunk(json.dumps({"choices": [{"delta": {"content": word + " "}}]}))
+
+            # Simulate a server that stops sending data
+            if self.server.stall:
+                time.sleep(self.server.stall)
+                return
+
+        self.send_chunk("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_chunk(self, data):
+        event = f"data: {data}\n\n".encode()
+        self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+def make_review(size):
+    # Build a Markdown review of about the given number of characters
+    line = "- The function could use a more descriptive name.\n"
+
+    return ("### Review\n" + line * (size // len(line) + 1))[:size]
+
+
+def start_mock_api(latency=0.0, jitter=0.0, error_rate=0.0, response_size=None):
+    """
+    Starts a local OpenAI-compatible server in a background thread.
+
+    Args:
+        latency (float): Seconds every response is delayed by.
+        jitter (float): Maximum number of seconds randomly added to the latency.
+        error_rate (float): Share of the requests answered with 503.
+        response_size (int): Size of the review in characters, "Test review" if not provided.
+    """
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), MockAPIHandler)
+    server.daemon_threads = True
+    server.requests = []
+    server.statuses = []
+    server.models = ["test-model"]
+    server.content = make_review(response_size) if response_size else "Test review"
+    server.latency = latency
+    server.jitter = jitter
+    server.error_rate = error_rate
+    server.stall = 0
+    server.retry_after = None
+    server.down = False
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server
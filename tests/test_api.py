@@ -0,0 +1,117 @@
+
+import time
+import asyncio
+import pytest
+
+from codebuddy.modules import api
+
+
+def test_lmapi(mock_api):
+    # Initialize the LMAPI with the URL of the mock server
+    lm_api = api.LMAPI(mock_api.url)
+
+    # Assert that the content of the message is extracted from the response
+    assert lm_api.get_response([{"role": "user", "content": "Hello"}]) == "Test review"
+    assert mock_api.requests[0]["messages"][0]["content"] == "Hello"
+
+
+def test_async_lmapi(mock_api):
+    async def run():
+        # Send many requests concurrently through one client
+        async with api.AsyncLMAPI(mock_api.url, max_connections=4) as lm_api:
+            prompts = [[{"role": "user", "content": str(i)}] for i in range(20)]
+            return await asyncio.gather(*(lm_api.get_response(prompt) for prompt in prompts))
+
+    responses = asyncio.run(run())
+
+    # Assert that every request received a response
+    assert responses == ["Test review"] * 20
+    assert len(mock_api.requests) == 20
+
+
+def test_lmapi_retries(mock_api, monkeypatch):
+    # Make retries fast for testing
+    monkeypatch.setitem(api.API_CONFIG, "backoff_factor", 0.01)
+
+    # The first two requests fail with a temporary error
+    mock_api.statuses = [503, 429]
+
+    # Assert that the request is retried until it succeeds
+    lm_api = api.LMAPI(mock_api.url)
+    assert lm_api.get_response([{"role": "user", "content": "Hello"}]) == "Test review"
+    assert len(mock_api.requests) == 3
+
+
+def test_lmapi_errors(mock_api, monkeypatch):
+    # Make retries fast for testing
+    monkeypatch.setitem(api.API_CONFIG, "backoff_factor", 0.01)
+    monkeypatch.setitem(api.API_CONFIG, "retries", 2)
+
+    # The server keeps failing
+    mock_api.statuses = [500] * 10
+
+    # Assert that an error is raised instead of returning an empty review
+    with pytest.raises(api.LMAPIError):
+        api.LMAPI(mock_api.url).get_response([{"role": "user", "content": "Hello"}])
+
+    with pytest.raises(api.LMAPIError):
+        asyncio.run(api.AsyncLMAPI(mock_api.url).get_response([{"role": "user", "content": "Hello"}]))
+
+    # Assert that the number of attempts is bounded
+    assert len(mock_api.requests) == 6
+
+    # Assert that errors which are not worth retrying fail immediately
+    mock_api.statuses = [400]
+    with pytest.raises(api.LMAPIError):
+        api.LMAPI(mock_api.url).get_response([{"role": "user", "content": "Hello"}])
+    assert len(mock_api.requests) == 7
+
+
+def test_lmapi_connection_error(monkeypatch):
+    # Make retries fast for testing
+    monkeypatch.setitem(api.API_CONFIG, "backoff_factor", 0.01)
+
+    # Assert that an unreachable server results in an error
+    with pytest.raises(api.LMAPIError):
+        api.LMAPI("http://127.0.0.1:1").get_response([{"role": "user", "content": "Hello"}])
+
+
+def test_lmapi_stream(mock_api):
+    # Assert that the response is received in pieces
+    chunks = list(api.LMAPI(mock_api.url).stream_response([{"role": "user", "content": "Hello"}]))
+    assert chunks == ["Test ", "review "]
+    assert mock_api.requests[0]["stream"] == True
+
+
+def test_lmapi_stream_timeout(mock_api, monkeypatch):
+    # The server stops sending data after the first piece
+    monkeypatch.setitem(api.API_CONFIG, "stream_timeout", 0.2)
+    mock_api.stall = 1
+
+    # Assert that the dead stream is aborted after the first piece
+    chunks = []
+    with pytest.raises(api.LMAPIError):
+        for chunk in api.LMAPI(mock_api.url).stream_response([{"role": "user", "content": "Hello"}]):
+            chunks.append(chunk)
+    assert chunks == ["Test "]
+
+
+def test_lmapi_retry_after(mock_api, monkeypatch):
+    # Make the backoff much shorter than the delay requested by the server
+    monkeypatch.setitem(api.API_CONFIG, "backoff_factor", 0.01)
+
+    # The server is rate limiting and asks to wait
+    mock_api.statuses = [429]
+    mock_api.retry_after = "0.5"
+
+    # Assert that the request is retried after the requested delay
+    lm_api = api.LMAPI(mock_api.url)
+    start = time.monotonic()
+    assert lm_api.get_response([{"role": "user", "content": "Hello"}]) == "Test review"
+    assert time.monotonic() - start >= 0.5
+    assert len(mock_api.requests) == 2
+
+    # Assert that rate limiting decreases the concurrency, but doesn't count as a failure
+    endpoint = lm_api.endpoints.endpoints[0]
+    assert endpoint.limit < api.API_CONFIG.get("initial_concurrency")
+    assert endpoint.healthy == True
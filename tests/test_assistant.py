@@ -1,4 +1,5 @@
 
+import asyncio
 import pytest
 
 from codebuddy.modules import assistant
@@ -18,3 +19,19 @@ def test_assistant(request):
 
         # Assert that the review is not an empty string, indicating that the review was generated successfully
         assert file_review != ""
+
+
+def test_assistant_async(mock_api):
+    async def run():
+        # Initialize the Assistant class with the URL of the mock server
+        ai = assistant.Assistant(mock_api.url)
+
+        # Request a review of a code snippet using the asynchronous method
+        file_review = await ai.areview('code', 'print("hello world")')
+        await ai.aclose()
+
+        return file_review
+
+    # Assert that the review is returned by the asynchronous counterpart
+    assert asyncio.run(run()) == "Test review"
+    assert 'print("hello world")' in mock_api.requests[0]["messages"][1]["content"]
@@ -0,0 +1,154 @@
+
+import time
+import asyncio
+import pytest
+
+from codebuddy.modules import api
+from codebuddy.modules import balancer
+
+
+def test_parse_endpoint():
+    # Assert that options following the URL are parsed
+    assert balancer.parse_endpoint("http://localhost:1234") == ("http://localhost:1234", {})
+    assert balancer.parse_endpoint("http://localhost:1234,weight=2,concurrency=4") == (
+        "http://localhost:1234", {"weight": 2.0, "concurrency": 4}
+    )
+
+    # Assert that invalid options are rejected
+    with pytest.raises(ValueError):
+        balancer.parse_endpoint("http://localhost:1234,speed=2")
+    with pytest.raises(ValueError):
+        balancer.parse_endpoint("http://localhost:1234,concurrency=0")
+
+
+def test_endpoint_pool():
+    pool = balancer.EndpointPool(["http://a", "http://b,weight=2", "http://c,concurrency=1"])
+    a, b, c = pool.endpoints
+
+    # Assert that requests go to the endpoint with the fewest requests relative to its weight
+    acquired = [pool.acquire() for _ in range(4)]
+    assert acquired.count(b) == 2
+    assert acquired.count(a) == 1
+    assert acquired.count(c) == 1
+
+    # Assert that an endpoint at its concurrency limit is not chosen
+    assert pool.acquire() in (a, b)
+    assert c.outstanding == 1
+
+    # Assert that an ejected endpoint is avoided while others are available
+    for _ in range(api.API_CONFIG.get("eject_failures")):
+        pool.release(a, success=False)
+    assert a.healthy == False
+    assert pool.acquire(exclude=[c]) == b
+
+
+def test_lmapi_failover(mock_api, mock_api_2, monkeypatch):
+    # Make retries and health checks fast for testing
+    monkeypatch.setitem(api.API_CONFIG, "backoff_factor", 0.01)
+    monkeypatch.setitem(api.API_CONFIG, "retries", 0)
+    monkeypatch.setitem(api.API_CONFIG, "eject_time", 0.1)
+
+    # The first server is down
+    mock_api.down = True
+    lm_api = api.LMAPI([mock_api.url, mock_api_2.url])
+
+    # Assert that all requests are answered by the second server
+    for _ in range(6):
+        assert lm_api.get_response([{"role": "user", "content": "Hello"}]) == "Test review"
+    assert len(mock_api_2.requests) == 6
+
+    # Assert that the first server is ejected and doesn't get requests any more
+    assert len(mock_api.requests) == api.API_CONFIG.get("eject_failures")
+    assert lm_api.endpoints.endpoints[0].healthy == False
+
+    # Assert that the first server is re-admitted once it recovers
+    mock_api.down = False
+    for _ in range(20):
+        lm_api.get_response([{"role": "user", "content": "Hello"}])
+        time.sleep(0.05)
+    assert lm_api.endpoints.endpoints[0].healthy == True
+    assert len(mock_api.requests) > api.API_CONFIG.get("eject_failures")
+
+
+def test_endpoint_pool_aimd(monkeypatch):
+    monkeypatch.setitem(api.API_CONFIG, "initial_concurrency", 2)
+    pool = balancer.EndpointPool(["http://a,concurrency=8"])
+    endpoint = pool.endpoints[0]
+
+    def round_trip(latency):
+        # Fill the current limit and receive a response for every request
+        acquired = [pool.acquire() for _ in range(endpoint.capacity())]
+        for acquired_endpoint in acquired:
+            pool.release(acquired_endpoint, success=True, latency=latency)
+
+    # Assert that fast responses increase the limit up to the maximum
+    for _ in range(20):
+        round_trip(0.1)
+    assert endpoint.capacity() == 8
+
+    # Assert that slow responses decrease the limit, once per round trip
+    endpoint.last_decrease = 0
+    round_trip(1.0)
+    assert endpoint.limit == pytest.approx(8 * 0.9)
+
+    # Assert that an overloaded server halves the limit and is paused as requested
+    endpoint.last_decrease = 0
+    pool.release(pool.acquire(), success=True, overloaded=True, retry_after=0.3)
+    assert endpoint.limit == pytest.approx(8 * 0.9 * 0.5)
+    acquired_endpoint, wait = pool.try_acquire()
+    assert acquired_endpoint is None and 0.2 < wait <= 0.3
+
+    start = time.monotonic()
+    pool.acquire()
+    assert time.monotonic() - start >= 0.2
+
+
+def test_async_lmapi_concurrency_limit(mock_api):
+    mock_api.latency = 0.05
+    lm_api = api.AsyncLMAPI(mock_api.url + ",concurrency=2")
+    endpoint = lm_api.endpoints.endpoints[0]
+
+    # Record the requests in flight whenever one is sent
+    peak = []
+    try_acquire = lm_api.endpoints.try_acquire
+
+    def record(*args, **kwargs):
+        result = try_acquire(*args, **kwargs)
+        peak.append(endpoint.outstanding)
+        return result
+
+    lm_api.endpoints.try_acquire = record
+
+    async def run():
+        async with lm_api:
+            prompts = [[{"role": "user", "content": str(i)}] for i in range(6)]
+            return await asyncio.gather(*(lm_api.get_response(prompt) for prompt in prompts))
+
+    # Assert that the asynchronous client waits for the concurrency limit of the server
+    assert asyncio.run(run()) == ["Test review"] * 6
+    assert max(peak) == 2
+
+
+def test_async_lmapi_ejected_endpoints(mock_api, monkeypatch):
+    monkeypatch.setitem(api.API_CONFIG, "retries", 1)
+    monkeypatch.setitem(api.API_CONFIG, "backoff_factor", 0.01)
+    mock_api.down = True
+
+    # Eject every endpoint, without health checks during the test
+    lm_api = api.AsyncLMAPI([mock_api.url, mock_api.url + "/"])
+    for endpoint in lm_api.endpoints.endpoints:
+        endpoint.healthy = False
+        endpoint.next_check = time.monotonic() + 60
+
+    async def run(lm_api):
+        async with lm_api:
+            return await lm_api.get_response([{"role": "user", "content": "Hello"}])
+
+    # Assert that the ejected endpoints are tried as a last resort and their failure is an LMAPIError
+    with pytest.raises(api.LMAPIError):
+        asyncio.run(run(lm_api))
+    assert len(mock_api.requests) == 2
+
+    # Assert that a client without endpoints fails with an LMAPIError as well
+    with pytest.raises(api.LMAPIError, match="No endpoint is available"):
+        asyncio.run(run(api.AsyncLMAPI([])))
@@ -0,0 +1,73 @@
+
+import pytest
+import pathlib
+
+from codebuddy.modules import assistant
+from codebuddy.modules import batching
+from codebuddy.modules import cache
+
+
+def test_plan_batches(tmp_path):
+    # Create small files with a large file in between
+    sizes = {"a.py": 10, "b.py": 10, "large.py": 5000, "c.py": 10, "d.py": 10, "e.py": 10}
+    for name, size in sizes.items():
+        (tmp_path / name).write_text("x" * size)
+
+    files = {"code": [tmp_path / name for name in sizes], "docs": []}
+
+    # Assert that consecutive small files are batched and the order is preserved
+    tasks = batching.plan_batches(files, small_file_tokens=100, max_tokens=1000, max_files=2)
+    assert [[path.name for path in file_paths] for _, file_paths in tasks] == [
+        ["a.py", "b.py"], ["large.py"], ["c.py", "d.py"], ["e.py"]
+    ]
+
+
+def test_split_batch_review():
+    review = "Intro\n### File: src/a.py\n- bug 1\n\n### File: `b.py`\n- bug 2\n"
+
+    # Assert that the review is split by the file headers
+    assert batching.split_batch_review(review, ["src/a.py", "src/b.py"]) == {
+        "src/a.py": "- bug 1",
+        "src/b.py": "- bug 2"
+    }
+
+    # Assert that a missing section is detected
+    with pytest.raises(batching.BatchParseError):
+        batching.split_batch_review(review, ["src/a.py", "src/b.py", "src/c.py"])
+
+
+def test_review_batch(mock_api):
+    # The server answers with a section for every file
+    mock_api.content = "### File: a.py\nReview A\n### File: b.py\nReview B"
+    ai = assistant.Assistant(mock_api.url)
+
+    # Assert that both files are reviewed in one request
+    reviews = ai.review_batch("code", [("a.py", "print(1)"), ("b.py", "print(2)")])
+    assert reviews == {"a.py": "Review A", "b.py": "Review B"}
+    assert len(mock_api.requests) == 1
+
+    prompt = mock_api.requests[0]["messages"][1]["content"]
+    assert "### File: a.py\nprint(1)" in prompt
+    assert "### File: b.py\nprint(2)" in prompt
+
+
+def test_review_batch_budget(tmp_path, mock_api):
+    review_cache = cache.ReviewCache(tmp_path / "reviews.sqlite3")
+    ai = assistant.Assistant(mock_api.url, review_cache)
+    files = [(f"{name}.py", f"print('{name}')") for name in "abcdefgh"]
+
+    # Assert that the response budget grows with the number of files
+    mock_api.content = "### File: a.py\nReview A"
+    with pytest.raises(batching.BatchParseError):
+        ai.review_batch("code", files)
+    assert mock_api.requests[0]["max_tokens"] == batching.batch_max_tokens(8) > batching.API_CONFIG["max_tokens"]
+
+    # Assert that a response that can't be split is not cached
+    mock_api.content = "\n".join(f"### File: {name}\nReview" for name, _ in files)
+    assert len(ai.review_batch("code", files)) == 8
+    assert len(mock_api.requests) == 2
+
+    assert len(ai.review_batch("code", files)) == 8
+    assert len(mock_api.requests) == 2
+
+    review_cache.close()
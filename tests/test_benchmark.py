@@ -0,0 +1,23 @@
+
+import benchmark
+
+
+def test_percentile():
+    # Assert that percentiles use the nearest rank
+    values = list(range(1, 101))
+    assert benchmark.percentile(values, 50) == 50
+    assert benchmark.percentile(values, 99) == 99
+    assert benchmark.percentile([], 50) is None
+
+
+def test_benchmark(tmp_path):
+    # Run every stage on a small synthetic repository
+    repo_dir = benchmark.generate_repo(tmp_path / "repo", files=20, file_size=200)
+    results = benchmark.run_benchmark(repo_dir, files=20, jobs=4)
+
+    # Assert that every file is discovered and reviewed, and that the measurements are complete
+    assert results["discovery"]["files"] == 20
+    assert results["pipeline"]["files"] == 20
+    assert results["reports"]["files"] == 20
+    assert results["pipeline"]["p50_ms"] <= results["pipeline"]["p99_ms"]
+    assert results["pipeline"]["peak_rss_mb"] > 0
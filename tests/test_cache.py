@@ -0,0 +1,126 @@
+
+import time
+import asyncio
+import pytest
+
+from codebuddy.modules import assistant
+from codebuddy.modules import cache
+from codebuddy.modules import config
+
+
+def test_review_cache(tmp_path):
+    # Open a cache in a temporary directory
+    review_cache = cache.ReviewCache(tmp_path / "reviews.sqlite3", max_size=10 ** 6, max_age=3600)
+
+    # Assert that keys depend on the category and the request
+    key = cache.ReviewCache.make_key("code", {"messages": [], "temperature": 0.5}, "model-a")
+    assert key == cache.ReviewCache.make_key("code", {"temperature": 0.5, "messages": []}, "model-a")
+    assert key != cache.ReviewCache.make_key("docs", {"messages": [], "temperature": 0.5}, "model-a")
+    assert key != cache.ReviewCache.make_key("code", {"messages": [], "temperature": 0.7}, "model-a")
+    assert key != cache.ReviewCache.make_key("code", {"messages": [], "temperature": 0.5}, "model-b")
+
+    # Assert that a stored review is returned and counted
+    assert review_cache.get(key) is None
+    review_cache.put(key, "Test review")
+    assert review_cache.get(key) == "Test review"
+    assert (review_cache.hits, review_cache.misses) == (1, 1)
+
+    review_cache.close()
+
+
+def test_review_cache_eviction(tmp_path):
+    # Open a cache that fits about two reviews
+    review_cache = cache.ReviewCache(tmp_path / "reviews.sqlite3", max_size=200, max_age=3600)
+
+    for key in ("a", "b", "c"):
+        review_cache.put(key, "x" * 90)
+        time.sleep(0.01)
+
+    # Mark the oldest review as recently used
+    review_cache.get("a")
+
+    # Assert that the least recently used review is evicted
+    assert review_cache.evict() == 1
+    assert review_cache.get("b") is None
+    assert review_cache.get("a") is not None
+    assert review_cache.get("c") is not None
+
+    # Assert that reviews unused for too long are evicted
+    review_cache.max_age = 0
+    assert review_cache.evict() == 2
+
+    review_cache.close()
+
+
+def test_assistant_cache(tmp_path, mock_api):
+    # Initialize the Assistant with a cache
+    review_cache = cache.ReviewCache(tmp_path / "reviews.sqlite3")
+    ai = assistant.Assistant(mock_api.url, review_cache)
+
+    # Assert that the second review of the same data does not reach the API
+    assert ai.review("code", "print('hello world')") == "Test review"
+    assert ai.review("code", "print('hello world')") == "Test review"
+    assert len(mock_api.requests) == 1
+
+    # Assert that changed data is sent to the API
+    ai.review("code", "print('hello')")
+    assert len(mock_api.requests) == 2
+
+    review_cache.close()
+
+
+def test_assistant_cache_skips_empty_reviews(tmp_path, mock_api):
+    review_cache = cache.ReviewCache(tmp_path / "reviews.sqlite3")
+    ai = assistant.Assistant(mock_api.url, review_cache)
+
+    # Assert that an empty completion is requested again instead of being replayed
+    mock_api.content = "  "
+    ai.review("code", "print('hello world')")
+    mock_api.content = "Test review"
+    assert ai.review("code", "print('hello world')") == "Test review"
+    assert len(mock_api.requests) == 2
+
+    # Assert that the asynchronous review uses the same cache
+    async def run():
+        file_review = await ai.areview("code", "print('hello world')")
+        await ai.aclose()
+        return file_review
+
+    assert asyncio.run(run()) == "Test review"
+    assert len(mock_api.requests) == 2
+
+    review_cache.close()
+
+
+def test_assistant_cache_servers(tmp_path, mock_api, mock_api_2):
+    review_cache = cache.ReviewCache(tmp_path / "reviews.sqlite3")
+    assistant.Assistant(mock_api.url, review_cache).review("code", "print('hello world')")
+
+    # Assert that adding and reordering servers of the same model keeps the cached reviews
+    ai = assistant.Assistant([mock_api_2.url, mock_api.url], review_cache)
+    assert ai.review("code", "print('hello world')") == "Test review"
+    assert len(mock_api.requests) + len(mock_api_2.requests) == 1
+
+    review_cache.close()
+
+
+def test_assistant_cache_model(tmp_path, mock_api, monkeypatch):
+    review_cache = cache.ReviewCache(tmp_path / "reviews.sqlite3")
+    assistant.Assistant(mock_api.url, review_cache).review("code", "print('hello world')")
+
+    # Assert that a server running another model doesn't get the cached reviews
+    mock_api.models = ["other-model"]
+    assistant.Assistant(mock_api.url, review_cache).review("code", "print('hello world')")
+    assert len(mock_api.requests) == 2
+
+    # Assert that a configured model is used without asking the server, and sent with the requests
+    monkeypatch.setitem(config.API, "model", "configured-model")
+    mock_api.models = []
+    ai = assistant.Assistant(mock_api.url, review_cache)
+    assert ai.lm_api.get_model() == "configured-model"
+    ai.review("code", "print('hello world')")
+    ai.review("code", "print('hello world')")
+    assert len(mock_api.requests) == 3
+    assert mock_api.requests[-1]["model"] == "configured-model"
+
+    review_cache.close()
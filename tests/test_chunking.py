@@ -0,0 +1,125 @@
+
+import time
+import threading
+import concurrent.futures
+import pytest
+
+from codebuddy.modules import assistant
+from codebuddy.modules import chunking
+
+
+PYTHON_SOURCE = '''import os
+
+
+def first():
+    return 1
+
+
+@decorator
+def second():
+    return 2
+
+
+class Third:
+    def method_one(self):
+        return 3
+
+    def method_two(self):
+        return 4
+'''
+
+
+def test_split_small_file():
+    # Assert that a file fitting into the budget is not split
+    chunks = chunking.split_source(PYTHON_SOURCE, ".py", max_tokens=1000)
+    assert len(chunks) == 1
+    assert chunks[0].text == PYTHON_SOURCE
+
+
+def test_split_python():
+    # Split the source into small parts
+    chunks = chunking.split_source(PYTHON_SOURCE, ".py", max_tokens=12)
+
+    # Assert that joining the parts gives back the source
+    assert "".join(chunk.text for chunk in chunks) == PYTHON_SOURCE
+
+    # Assert that the parts start at statement boundaries
+    starts = [PYTHON_SOURCE.splitlines()[chunk.start_line - 1] for chunk in chunks]
+    assert "@decorator" in starts
+    assert "class Third:" in starts
+    assert "    def method_two(self):" in starts
+
+    # Assert that the line ranges are contiguous
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.start_line == previous.end_line + 1
+
+
+def test_split_fallback():
+    # Lines of text separated by blank lines, without any syntax
+    data = "".join(f"line {number}\nmore text\n\n" for number in range(20))
+
+    # Assert that the text is split at blank lines and fits into the budget
+    chunks = chunking.split_source(data, ".js", max_tokens=20)
+    assert "".join(chunk.text for chunk in chunks) == data
+    assert all(chunking.estimate_tokens(chunk.text) <= 20 for chunk in chunks)
+    assert all(chunk.text.endswith("\n\n") for chunk in chunks)
+
+    # Assert that invalid Python is split the same way
+    assert chunking.split_source(data, ".py", max_tokens=20) == chunks
+
+
+def test_review_chunks(mock_api):
+    # Initialize the Assistant with the URL of the mock server
+    ai = assistant.Assistant(mock_api.url)
+    chunks = chunking.split_source(PYTHON_SOURCE, ".py", max_tokens=12)
+
+    # Assert that every part is reviewed and the reviews are combined
+    assert ai.review_chunks("code", chunks) == "Test review"
+    assert len(mock_api.requests) == len(chunks) + 1
+
+    # Assert that the combining request contains all partial reviews
+    reduce_prompt = mock_api.requests[-1]["messages"][1]["content"]
+    assert reduce_prompt.count("Test review") == len(chunks)
+    assert f"Part {len(chunks)} of {len(chunks)}" in reduce_prompt
+
+
+def test_review_chunks_shared_pool(mock_api):
+    ai = assistant.Assistant(mock_api.url, part_jobs=2)
+    chunks = chunking.split_source(PYTHON_SOURCE, ".py", max_tokens=12)
+    assert len(chunks) > 2
+
+    # Count the parts under review at the same time
+    lock = threading.Lock()
+    in_flight = []
+    peak = []
+    review = ai.review
+
+    def slow_review(category, data):
+        if category == "reduce":
+            return review(category, data)
+
+        with lock:
+            in_flight.append(data)
+            peak.append(len(in_flight))
+        time.sleep(0.05)
+        with lock:
+            in_flight.remove(data)
+
+        return review(category, data)
+
+    ai.review = slow_review
+
+    # Assert that the parts of files reviewed by several workers share the limit
+    with concurrent.futures.ThreadPoolExecutor(3) as executor:
+        results = list(executor.map(lambda _: ai.review_chunks("code", chunks), range(3)))
+
+    assert results == ["Test review"] * 3
+    assert max(peak) == 2
+
+    # Assert that closing the assistant stops the workers and closes the pooled connections
+    connections = ai.lm_api.session.get_adapter(mock_api.url).poolmanager.pools
+    assert len(connections) == 1
+    ai.close()
+    assert ai._part_executor._shutdown
+    assert len(connections) == 0
+    assert ai.lm_api.endpoints._closed
@@ -0,0 +1,142 @@
+
+import base64
+
+from click.testing import CliRunner
+
+from codebuddy import cli
+from codebuddy.modules import compaction
+from codebuddy.modules import planning
+
+
+PYTHON_SOURCE = '''#!/usr/bin/env python
+# Copyright (c) 2024 Example Corp.
+# Licensed under the Apache License, Version 2.0.
+
+import os
+
+# ==========================================
+
+
+def first(path):
+    """
+    Returns the first line of a file.
+
+    Args:
+        path (str): The path of the file.
+    """
+
+    with open(path) as f:
+        return f.readline()
+
+
+ICON = "%s"
+
+TABLE = [
+%s]
+
+
+def second():
+    return os.sep
+''' % (
+    base64.b64encode(bytes(range(256)) * 2).decode(),
+    "".join(f"    ({index}, {index * index}, 0x{index:02x}),\n" for index in range(30))
+)
+
+
+def test_compact_python():
+    compacted = compaction.compact(PYTHON_SOURCE, ".py", drop_docstrings=True)
+    original_lines = PYTHON_SOURCE.splitlines()
+    lines = compacted.text.splitlines()
+
+    # Assert that no line is added or removed, so the line numbers stay those of the file
+    assert len(lines) == len(original_lines)
+    assert lines[original_lines.index("def second():")] == "def second():"
+    assert lines[original_lines.index("        return f.readline()")] == "\t\treturn f.readline()"
+
+    # Assert that the license, the banner and the docstring are gone, but the shebang is kept
+    assert lines[0] == "#!/usr/bin/env python"
+    assert lines[1] == "# [license header removed]"
+    assert "Copyright" not in compacted.text
+    assert "=====" not in compacted.text
+    assert '\t"""..."""' in lines
+    assert "Returns the first line" not in compacted.text
+
+    # Assert that the blob and the table are elided, keeping a few rows as an example
+    assert f'ICON = "[{len(base64.b64encode(bytes(range(256)) * 2))} characters of base64 elided]"' in lines
+    assert "\t(2, 4, 0x02)," in lines
+    assert "\t# [27 lines of data elided]" in lines
+    assert "(29, 841, 0x1d)" not in compacted.text
+
+    # Assert that the savings are reported
+    assert compacted.tokens < compacted.original_tokens / 3
+
+
+def test_compact_multiline_strings():
+    source = 'def first():\n    text = """\n        indented\n    """\n    return text\n'
+
+    # Assert that the code is reindented, but the lines inside the string are kept as they are
+    lines = compaction.compact(source, ".py").text.splitlines()
+    assert lines == ["def first():", '\ttext = """', "        indented", '    """', "\treturn text"]
+
+    # Assert that code that can't be tokenized keeps its indentation
+    source = 'def first():\n    text = """\n        unterminated\n'
+    assert compaction.compact(source, ".py").text == source
+
+    # Assert that the indentation of languages whose strings aren't tokenized is kept (e.g. in template literals)
+    source = "function first() {\n    return `\n        indented\n    `;\n}\n"
+    assert compaction.compact(source, ".js").text == source
+
+
+def test_compact_options():
+    # Assert that docstrings are kept unless they are dropped explicitly
+    compacted = compaction.compact(PYTHON_SOURCE, ".py", drop_docstrings=False)
+    assert "Returns the first line of a file." in compacted.text
+
+    # Assert that a docstring sharing its line with code is kept
+    source = 'def f(): """Docstring."""\n'
+    assert compaction.compact(source, ".py", drop_docstrings=True).text == 'def f(): """Docstring."""\n'
+
+
+def test_compact_block_comments():
+    source = (
+        "/*\n"
+        " * SPDX-License-Identifier: MIT\n"
+        " */\n"
+        "/* Parses the input. */\n"
+        "int parse(void) {\n"
+        "  return 0;\n"
+        "}\n"
+    )
+    lines = compaction.compact(source, ".c").text.splitlines()
+
+    # Assert that only the license comment is removed and the indentation is kept
+    assert lines == ["// [license header removed]", "", "", "/* Parses the input. */", "int parse(void) {", "  return 0;", "}"]
+
+    # Assert that a first comment without a license is kept
+    assert compaction.compact("/* Parses the input. */\nint x;\n", ".c").text == "/* Parses the input. */\nint x;\n"
+
+
+def test_compact_docs():
+    source = "# Title   \n\n    code block\n\n==========\n" + "![logo](data:image/png;base64," + base64.b64encode(bytes(range(256))).decode() + ")\n"
+    lines = compaction.compact(source, ".md").text.splitlines()
+
+    # Assert that the Markdown keeps its indentation and underlines, but not the trailing whitespace and blobs
+    assert lines[:5] == ["# Title", "", "    code block", "", "=========="]
+    assert lines[5].startswith("![logo](data:image/png;base64,[") and "characters of base64 elided" in lines[5]
+
+
+def test_cli_compact(tmp_path, mock_api, monkeypatch):
+    monkeypatch.setitem(planning.PLANNING_CONFIG, "path", str(tmp_path / "calibration.json"))
+    repository_dir = tmp_path / "repo"
+    repository_dir.mkdir()
+    (repository_dir / "main.py").write_text(PYTHON_SOURCE)
+
+    result = CliRunner().invoke(cli, [
+        str(repository_dir), "--api", mock_api.url, "--reports", str(tmp_path / "reports"), "--no-cache", "--compact"
+    ])
+    assert result.exit_code == 0
+
+    # Assert that the compacted file is sent for the review
+    prompt = mock_api.requests[0]["messages"][1]["content"]
+    assert "# [license header removed]" in prompt
+    assert "Copyright" not in prompt
@@ -0,0 +1,78 @@
+
+import random
+
+from click.testing import CliRunner
+
+from codebuddy import cli
+from codebuddy.modules import dedup
+from codebuddy.modules import planning
+
+
+def make_source(seed, lines=60):
+    # Generate a source file with random names, so that different seeds give unrelated files
+    generator = random.Random(seed)
+    words = ["value", "count", "items", "result", "index", "total", "name", "data", "size", "offset"]
+
+    return "\n".join(
+        f"{generator.choice(words)}_{i} = compute({generator.choice(words)}, {generator.randint(0, 1000)})"
+        for i in range(lines)
+    )
+
+
+def test_minhash_signature():
+    original = make_source(1)
+    lines = original.splitlines()
+
+    # A copy with one changed line and different indentation
+    lines[10] = "changed = True"
+    copy = "\n".join("    " + line for line in lines)
+
+    # Assert that the similarity of the copy is high and the similarity of an unrelated file is low
+    assert dedup.similarity(dedup.minhash_signature(original), dedup.minhash_signature(copy)) > 0.9
+    assert dedup.similarity(dedup.minhash_signature(original), dedup.minhash_signature(make_source(2))) < 0.3
+
+    # Assert that short texts are not compared
+    assert dedup.minhash_signature("x = 1") is None
+
+
+def test_find_duplicates(tmp_path):
+    # A module, its vendored copy, an unrelated module and the same copy among the docs
+    contents = {
+        "src/module.py": make_source(1),
+        "vendor/module.py": make_source(1) + "\n# vendored",
+        "src/other.py": make_source(2),
+        "docs/module.txt": make_source(1),
+    }
+    for name, content in contents.items():
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text(content)
+
+    files = {
+        "code": [tmp_path / "src/module.py", tmp_path / "src/other.py", tmp_path / "vendor/module.py"],
+        "docs": [tmp_path / "docs/module.txt"],
+    }
+
+    # Assert that only the copy in the same category refers to the first file
+    duplicates = dedup.find_duplicates(files, lambda path: path.read_text())
+    assert list(duplicates) == [tmp_path / "vendor/module.py"]
+    assert duplicates[tmp_path / "vendor/module.py"][0] == tmp_path / "src/module.py"
+    assert duplicates[tmp_path / "vendor/module.py"][1] > 0.9
+
+
+def test_cli_dedup(tmp_path, mock_api, monkeypatch):
+    monkeypatch.setitem(planning.PLANNING_CONFIG, "path", str(tmp_path / "calibration.json"))
+    repository_dir = tmp_path / "repo"
+    (repository_dir / "vendor").mkdir(parents=True)
+    (repository_dir / "module.py").write_text(make_source(1))
+    (repository_dir / "vendor" / "module.py").write_text(make_source(1))
+
+    result = CliRunner().invoke(cli, [
+        str(repository_dir), "--api", mock_api.url, "--reports", str(tmp_path / "reports"), "--no-cache", "--dedup"
+    ])
+    assert result.exit_code == 0
+
+    # Assert that only one of the files is reviewed and the other refers to its review
+    assert len(mock_api.requests) == 1
+    report = next((tmp_path / "reports").glob("*.md")).read_text()
+    assert "repo/module.py\nTest review" in report
+    assert "repo/vendor/module.py\nNear-duplicate of `module.py` (100% similar)" in report
@@ -0,0 +1,79 @@
+
+import time
+import pytest
+
+from codebuddy.modules import engine
+
+
+def slow_square(value):
+    # Later items finish first, so the order of completion is reversed
+    time.sleep((5 - value) * 0.01)
+
+    if value == 3:
+        raise ValueError("bad value")
+
+    return value * value
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_review_pool(jobs):
+    # Initialize the pool with the given number of jobs
+    review_pool = engine.ReviewPool(jobs)
+
+    # Collect the outcomes of all tasks
+    results = list(review_pool.map(slow_square, range(5)))
+
+    # Assert that the results are returned in the order of the items
+    assert [item for item, _, _ in results] == [0, 1, 2, 3, 4]
+    assert [result for _, result, _ in results] == [0, 1, 4, None, 16]
+
+    # Assert that the error is returned for the failed item only
+    errors = [error for _, _, error in results]
+    assert isinstance(errors[3], ValueError)
+    assert errors.count(None) == 4
+
+
+def count_down(value):
+    # Later items finish first, so the order of completion is reversed
+    for piece in range(value):
+        time.sleep((5 - value) * 0.01)
+        yield piece
+
+    if value == 3:
+        raise ValueError("bad value")
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_review_pool_stream(jobs):
+    # Initialize the pool with the given number of jobs
+    review_pool = engine.ReviewPool(jobs)
+
+    results = []
+    for item, pieces in review_pool.stream(count_down, range(5)):
+        try:
+            results.append((item, list(pieces)))
+        except ValueError:
+            results.append((item, None))
+
+    # Assert that the pieces of every item are received in order
+    assert results == [(0, []), (1, [0]), (2, [0, 1]), (3, None), (4, [0, 1, 2, 3])]
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_review_pool_stream_call_errors(jobs):
+    def fail_early(value):
+        # Raised by the call itself, before any piece is produced
+        if value == 1:
+            raise ValueError("bad value")
+
+        return [value]
+
+    results = []
+    for item, pieces in engine.ReviewPool(jobs).stream(fail_early, range(3)):
+        try:
+            results.append((item, list(pieces)))
+        except ValueError:
+            results.append((item, None))
+
+    # Assert that the error is raised by the iterator of the failed item, not by the pool
+    assert results == [(0, [0]), (1, None), (2, [2])]
@@ -0,0 +1,90 @@
+
+import pytest
+import zipfile
+
+from codebuddy.modules import ingest
+
+
+def test_read_text(tmp_path):
+    # Assert that line endings are normalized
+    (tmp_path / "crlf.txt").write_bytes(b"first\r\nsecond\r\n")
+    assert ingest.read_text(tmp_path / "crlf.txt") == "first\nsecond\n"
+
+    # Assert that encodings other than UTF-8 are detected
+    (tmp_path / "utf16.txt").write_bytes("print('привет')".encode("utf-16"))
+    assert ingest.read_text(tmp_path / "utf16.txt") == "print('привет')"
+
+    (tmp_path / "cp1251.txt").write_bytes("Привет, это текстовый файл.\n".encode("cp1251") * 20)
+    assert ingest.read_text(tmp_path / "cp1251.txt").startswith("Привет, это текстовый файл.\n")
+
+    # Assert that empty files are read
+    (tmp_path / "empty.py").write_bytes(b"")
+    assert ingest.read_text(tmp_path / "empty.py") == ""
+
+
+def test_read_binary(tmp_path):
+    # Assert that binary files are skipped
+    (tmp_path / "image.md").write_bytes(b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR" * 10)
+    with pytest.raises(ingest.FileSkipped):
+        ingest.read_text(tmp_path / "image.md")
+
+
+def test_read_large_file(tmp_path, monkeypatch):
+    # Limit the size of files that are read entirely
+    monkeypatch.setitem(ingest.INGEST_CONFIG, "max_size", 1000)
+    monkeypatch.setitem(ingest.INGEST_CONFIG, "sample_size", 100)
+
+    lines = [f"line {number}\n" for number in range(500)]
+    (tmp_path / "large.log").write_text("".join(lines))
+
+    # Assert that only whole lines from the head and the tail are read
+    text = ingest.read_text(tmp_path / "large.log")
+    assert text.startswith("line 0\nline 1\n")
+    assert text.endswith("line 498\nline 499\n")
+    assert "omitted" in text
+    assert len(text) < 300
+
+    # Assert that too large files are skipped
+    monkeypatch.setitem(ingest.INGEST_CONFIG, "skip_size", 1000)
+    with pytest.raises(ingest.FileSkipped):
+        ingest.read_text(tmp_path / "large.log")
+
+
+def test_read_document(tmp_path):
+    # Create a minimal Word document
+    namespace = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    document = (
+        f'<w:document xmlns:w="{namespace}"><w:body>'
+        '<w:p><w:r><w:t>First </w:t></w:r><w:r><w:t>paragraph</w:t></w:r></w:p>'
+        '<w:p><w:r><w:t>Second paragraph</w:t></w:r></w:p>'
+        '</w:body></w:document>'
+    )
+    with zipfile.ZipFile(tmp_path / "document.docx", "w") as archive:
+        archive.writestr("word/document.xml", document)
+
+    # Assert that the text is extracted by paragraphs
+    assert ingest.read_text(tmp_path / "document.docx") == "First paragraph\nSecond paragraph"
+
+    # Assert that a broken document is skipped
+    (tmp_path / "broken.docx").write_bytes(b"not a zip file")
+    with pytest.raises(ingest.FileSkipped):
+        ingest.read_text(tmp_path / "broken.docx")
+
+
+def test_read_large_document(tmp_path, monkeypatch):
+    # Limit the size of documents that are read entirely
+    monkeypatch.setitem(ingest.INGEST_CONFIG, "max_size", 1000)
+    monkeypatch.setitem(ingest.INGEST_CONFIG, "sample_size", 100)
+
+    namespace = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    paragraphs = "".join(f"<w:p><w:r><w:t>paragraph {number}</w:t></w:r></w:p>" for number in range(500))
+    with zipfile.ZipFile(tmp_path / "large.docx", "w") as archive:
+        archive.writestr("word/document.xml", f'<w:document xmlns:w="{namespace}"><w:body>{paragraphs}</w:body></w:document>')
+
+    # Assert that only whole paragraphs from the head and the tail are kept
+    text = ingest.read_text(tmp_path / "large.docx")
+    full_text = "\n".join(f"paragraph {number}" for number in range(500))
+    assert text.startswith("paragraph 0\nparagraph 1\n")
+    assert text.endswith("paragraph 498\nparagraph 499")
+    assert f"[... {len(full_text) - 200} characters omitted ...]" in text
+    assert len(text) < 300
@@ -0,0 +1,69 @@
+
+import pytest
+import pathlib
+
+from codebuddy.modules import inventory
+
+
+def test_inventory_files(tmp_path):
+    file_inventory = inventory.FileInventory(tmp_path, ["code", "docs"])
+    for name, category in [("main.py", "code"), ("src/app.py", "code"), ("src/README.md", "docs"), ("src/ünï.py", "code")]:
+        file_inventory.add(name, category)
+
+    # Assert that every directory is stored once
+    assert file_inventory._dirs == ["", "src/"]
+    assert len(file_inventory) == 4
+
+    # Assert that the files are found by their paths and keep their names and categories
+    index = file_inventory.index(tmp_path / "src" / "ünï.py")
+    assert file_inventory.name(index) == "src/ünï.py"
+    assert file_inventory.category(index) == "code"
+    assert file_inventory.object_id(index) is None
+
+    with pytest.raises(KeyError):
+        file_inventory.index(tmp_path / "src" / "missing.py")
+    with pytest.raises(KeyError):
+        file_inventory.index(pathlib.Path("/elsewhere/main.py"))
+
+    # Assert that the size and the modification time are read once, when they are needed
+    (tmp_path / "main.py").write_text("pass\n")
+    index = file_inventory.index(tmp_path / "main.py")
+    assert file_inventory.size(index) == 5
+    assert file_inventory.mtime(index) == (tmp_path / "main.py").stat().st_mtime
+    (tmp_path / "main.py").write_text("print('changed')\n")
+    assert file_inventory.size(index) == 5
+
+
+def test_inventory_revision(tmp_path):
+    file_inventory = inventory.FileInventory(tmp_path, ["code"])
+    file_inventory.add("main.py", "code", 12, "a" * 40)
+    file_inventory.add("lib/util.py", "code", 34, "b" * 40)
+
+    # Assert that the object ids and sizes of the files of a revision are kept without the file system
+    index = file_inventory.index(tmp_path / "lib" / "util.py")
+    assert file_inventory.object_id(index) == "b" * 40
+    assert file_inventory.size(index) == 34
+    assert file_inventory.mtime(index) is None
+
+    # Assert that object ids of another width are rejected
+    with pytest.raises(ValueError):
+        file_inventory.add("other.py", "code", 1, "c" * 64)
+
+
+def test_file_list_view(tmp_path):
+    file_inventory = inventory.FileInventory(tmp_path, ["code", "docs"])
+    file_inventory.add("b.py", "code")
+    file_inventory.add("a.md", "docs")
+    file_inventory.add("a.py", "code")
+    files = file_inventory.as_dict()
+
+    # Assert that the views behave like the lists of paths, in the order the files were added
+    code = [tmp_path / "b.py", tmp_path / "a.py"]
+    assert files["code"] == code
+    assert list(files["code"]) == code
+    assert len(files["code"]) == 2
+    assert files["code"][-1] == tmp_path / "a.py"
+    assert files["code"][:1] == [tmp_path / "b.py"]
+    assert files["code"] + files["docs"] == code + [tmp_path / "a.md"]
+    assert tmp_path / "a.py" in files["code"]
+    assert files["docs"] != code
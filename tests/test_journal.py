@@ -0,0 +1,54 @@
+
+import pathlib
+
+from codebuddy.modules import journal
+from codebuddy.modules import reports
+
+
+def test_progress_journal(tmp_path):
+    report_generator = reports.ReportGenerator(pathlib.Path('tests/fake_repo'), tmp_path)
+    progress_journal = journal.ProgressJournal(report_generator.journal_file_path)
+
+    # Report one file and skip another
+    report_generator.add_report_entry(pathlib.Path('main.py'), "Test report 1")
+    progress_journal.record("main.py", "reviewed", report_generator.report_file_path)
+    progress_journal.record("image.png", "skipped", report_generator.report_file_path)
+
+    # Simulate a crash in the middle of the next entry and of its record
+    with open(report_generator.report_file_path, "a") as f:
+        f.write("\n## File: README.md\nTest rep")
+    with open(report_generator.journal_file_path, "a") as f:
+        f.write('{"file": "READ')
+    progress_journal._file.close()
+
+    # Assert that the resumed run reopens the report and knows the reported files
+    report_generator = reports.ReportGenerator(pathlib.Path('tests/fake_repo'), tmp_path, resume=True)
+
+    # Assert that a read-only journal (of a plan) knows the reported files without changing the journal
+    journal_size = report_generator.journal_file_path.stat().st_size
+    read_only_journal = journal.ProgressJournal(report_generator.journal_file_path, read_only=True)
+    assert read_only_journal.is_done("main.py") == True
+    read_only_journal.close(delete=True)
+    assert report_generator.journal_file_path.stat().st_size == journal_size
+
+    progress_journal = journal.ProgressJournal(report_generator.journal_file_path)
+    assert progress_journal.is_done("main.py") == True
+    assert progress_journal.is_done("image.png") == True
+    assert progress_journal.is_done("README.md") == False
+
+    # Assert that the unfinished entry is removed from the report
+    progress_journal.restore_report(report_generator.report_file_path)
+    with open(report_generator.report_file_path, "r") as f:
+        assert f.read() == "\n## File: main.py\nTest report 1\n"
+
+    # Assert that new records follow the valid ones
+    progress_journal.record("README.md", "reviewed", report_generator.report_file_path)
+    assert journal.ProgressJournal(report_generator.journal_file_path).is_done("README.md") == True
+
+    # Assert that the journal is deleted once the analysis is complete
+    progress_journal.close(delete=True)
+    assert report_generator.journal_file_path.exists() == False
+
+    # Assert that a new report is started when there is nothing to resume
+    report_generator = reports.ReportGenerator(pathlib.Path('tests/fake_repo'), tmp_path, resume=True)
+    assert report_generator.journal_file_path.exists() == False
@@ -0,0 +1,70 @@
+
+import json
+import queue
+import logging
+import threading
+import logging.handlers
+
+from codebuddy.modules import logs
+
+
+def make_record(msg, *args, **extra):
+    record = logging.makeLogRecord({"name": "codebuddy.test", "levelno": logging.DEBUG, "levelname": "DEBUG", **extra})
+    record.msg, record.args = msg, args
+
+    return record
+
+
+def test_truncating_formatter():
+    formatter = logs.TruncatingFormatter("%(levelname)s %(message)s", max_size=10)
+
+    # Assert that long messages are cut and short ones are kept
+    assert formatter.format(make_record("Prompt: %s", "x" * 100)) == "DEBUG Prompt: xx... [98 characters truncated]"
+    assert formatter.format(make_record("Done")) == "DEBUG Done"
+
+
+def test_json_formatter():
+    formatter = logs.JSONFormatter(max_size=100)
+
+    # Assert that the record is one JSON object with the extra fields
+    entry = json.loads(formatter.format(make_record("Reviewed %s", "main.py", file="main.py", tokens=42)))
+    assert entry["message"] == "Reviewed main.py"
+    assert entry["level"] == "DEBUG"
+    assert entry["file"] == "main.py"
+    assert entry["tokens"] == 42
+
+
+def test_lazy_queue_handler():
+    formatted_in = []
+
+    class Payload:
+        def __str__(self):
+            formatted_in.append(threading.current_thread().name)
+            return "payload"
+
+    # Records go through a queue to a handler in the listener thread
+    class ListHandler(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.messages = []
+
+        def emit(self, record):
+            self.messages.append(self.format(record))
+
+    log_queue = queue.SimpleQueue()
+    handler = ListHandler()
+    handler.setFormatter(logs.TruncatingFormatter("%(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+
+    logger = logging.getLogger("codebuddy.test_lazy_queue_handler")
+    logger.addHandler(logs.LazyQueueHandler(log_queue))
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+
+    listener.start()
+    logger.debug("Sending %s", Payload())
+    listener.stop()
+
+    # Assert that the message is built by the listener, not by the thread that logged it
+    assert handler.messages == ["Sending payload"]
+    assert len(formatted_in) == 1 and formatted_in[0] != threading.main_thread().name
@@ -0,0 +1,71 @@
+
+import json
+import logging
+
+from codebuddy.modules import api
+from codebuddy.modules import metrics
+
+
+def test_histogram():
+    histogram = metrics.Histogram([0.1, 1, 10])
+    for value in [0.05] * 50 + [0.5] * 45 + [5] * 5:
+        histogram.observe(value)
+
+    # Assert that quantiles fall into the right buckets and within the observed range
+    assert 0.05 <= histogram.quantile(0.5) <= 0.1
+    assert 0.1 <= histogram.quantile(0.95) <= 1
+    assert 1 <= histogram.quantile(0.99) <= 5
+    assert histogram.count == 100
+    assert histogram.counts == [50, 45, 5, 0]
+
+
+def test_run_metrics_export(tmp_path):
+    run_metrics = metrics.RunMetrics([0.1, 1])
+    run_metrics.observe("read", 0.05)
+    run_metrics.observe("read", 0.5)
+    run_metrics.add_usage({"prompt_tokens": 100, "completion_tokens": 20})
+
+    json_path = tmp_path / "metrics.json"
+    prometheus_path = tmp_path / "metrics.prom"
+    run_metrics.save(json_path, prometheus_path)
+
+    # Assert that the JSON file summarizes every stage and counter
+    with open(json_path) as f:
+        data = json.load(f)
+    assert data["stages"]["read"]["count"] == 2
+    assert data["counters"] == {"prompt_tokens": 100, "completion_tokens": 20}
+
+    # Assert that the Prometheus file has cumulative buckets
+    lines = prometheus_path.read_text().splitlines()
+    assert 'codebuddy_stage_seconds_bucket{stage="read",le="0.1"} 1' in lines
+    assert 'codebuddy_stage_seconds_bucket{stage="read",le="+Inf"} 2' in lines
+    assert 'codebuddy_stage_seconds_count{stage="read"} 2' in lines
+    assert "codebuddy_prompt_tokens_total 100" in lines
+
+
+def test_run_metrics_progress(monkeypatch, caplog):
+    monkeypatch.setitem(metrics.METRICS_CONFIG, "progress_interval", 0)
+    run_metrics = metrics.RunMetrics()
+
+    # Assert that the progress line shows the share of done files and the time left
+    with caplog.at_level(logging.INFO):
+        run_metrics.progress(25, 100)
+    assert "Progress: 25/100 file(s) (25.0%)" in caplog.text
+    assert "ETA" in caplog.text
+
+
+def test_lmapi_metrics(mock_api):
+    run_metrics = metrics.RunMetrics()
+    lm_api = api.LMAPI(mock_api.url, metrics=run_metrics)
+
+    lm_api.get_response([{"role": "user", "content": "Hello"}])
+    list(lm_api.stream_response([{"role": "user", "content": "Hello"}]))
+
+    # Assert that both requests are timed and the token usage is counted
+    assert run_metrics.histograms["request"].count == 2
+    assert run_metrics.histograms["ttfb"].count == 2
+    assert run_metrics.counters["requests"] == 2
+    assert run_metrics.counters["completion_tokens"] == 2
+
+    # Assert that the prompt is counted only for the request that reported its tokens
+    assert run_metrics.counters["prompt_characters"] == len("Hello")
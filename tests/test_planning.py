@@ -0,0 +1,186 @@
+
+import json
+import pathlib
+
+from click.testing import CliRunner
+
+from codebuddy import cli
+from codebuddy.modules import inventory
+from codebuddy.modules import journal
+from codebuddy.modules import metrics
+from codebuddy.modules import planning
+
+
+def test_estimator_calibration(tmp_path):
+    path = tmp_path / "calibration.json"
+    estimator = planning.TokenEstimator(path, min_requests=2)
+
+    # Assert that the defaults of the configuration are used before any run
+    assert not estimator.calibrated
+    assert estimator.chars_per_token == planning.CHUNKING_CONFIG["chars_per_token"]
+    assert estimator.completion_tokens == planning.API_CONFIG["max_tokens"]
+
+    # Finish a run in which 3 characters made one token and every response had 100 tokens
+    run_metrics = metrics.RunMetrics()
+    run_metrics.add("requests", 4)
+    run_metrics.add("prompt_characters", 3000)
+    run_metrics.add_usage({"prompt_tokens": 1000, "completion_tokens": 400})
+    for _ in range(4):
+        run_metrics.observe("request", 2.5)
+    estimator.update(run_metrics)
+
+    # Assert that the next run is calibrated from the saved totals
+    estimator = planning.TokenEstimator(path, min_requests=2)
+    assert estimator.calibrated
+    assert estimator.chars_per_token == 3
+    assert estimator.completion_tokens == 100
+    assert estimator.seconds_per_request == 2.5
+    assert estimator.estimate_tokens(30) == 10
+    assert json.loads(path.read_text())["requests"] == 4
+
+
+def test_estimate_review(tmp_path):
+    estimator = planning.TokenEstimator(tmp_path / "calibration.json")
+
+    # Assert that a small file takes one request
+    small = estimator.estimate_review("code", "x = 1\n", ".py")
+    assert small.requests == 1
+    assert small.rounds == 1
+
+    # Assert that a large file takes a request per part and one to combine them
+    large = estimator.estimate_review("code", "".join(f"value_{i} = {i}\n\n" for i in range(3000)), ".py")
+    assert large.requests > 2
+    assert large.rounds == 2
+    assert large.prompt_tokens > small.prompt_tokens * (large.requests - 1)
+
+    # Assert that the projected time is divided between the jobs, but not below the longest task
+    two_requests = metrics.format_duration(2 * planning.PLANNING_CONFIG["seconds_per_request"])
+    summary = planning.summarize_plan([small] * 8, 4, estimator)
+    assert "Requests:          8" in summary
+    assert f"Projected time:    {two_requests}" in summary
+    assert f"Projected time:    {two_requests}" in planning.summarize_plan([large], 100, estimator)
+
+
+def test_order_largest_first():
+    sizes = {pathlib.Path("a"): 10, pathlib.Path("b"): 500, pathlib.Path("c"): 200, pathlib.Path("d"): 400}
+    tasks = [
+        ("code", [pathlib.Path("a")]),
+        ("code", [pathlib.Path("b")]),
+        ("docs", [pathlib.Path("c"), pathlib.Path("d")]),
+    ]
+
+    # Assert that the batch counts with the sum of its files
+    ordered = list(planning.order_largest_first(tasks, sizes.get))
+    assert ordered == [(2, tasks[2]), (1, tasks[1]), (0, tasks[0])]
+
+
+def test_order_file_tasks(tmp_path, monkeypatch):
+    file_inventory = inventory.FileInventory(tmp_path, ["code", "docs"])
+    file_inventory.add("a.py", "code", size=10)
+    file_inventory.add("b.md", "docs", size=500)
+    file_inventory.add("c.py", "code", size=200)
+    files = file_inventory.as_dict()
+    files["code"] = [tmp_path / "d.py"] + list(files["code"])
+    tasks = planning.FileTasks(files)
+
+    # Assert that the tasks are those of the files, in the order of the categories
+    assert len(tasks) == 4
+    assert list(tasks) == [
+        ("code", [tmp_path / "d.py"]),
+        ("code", [tmp_path / "a.py"]),
+        ("code", [tmp_path / "c.py"]),
+        ("docs", [tmp_path / "b.md"]),
+    ]
+    assert tasks[2] == ("code", [tmp_path / "c.py"])
+
+    # Assert that the sizes of the inventory are sorted without creating the paths of its files
+    # (the other lists of files are sized by the function)
+    created = []
+    path = inventory.FileInventory.path
+    monkeypatch.setattr(inventory.FileInventory, "path", lambda self, index: created.append(index) or path(self, index))
+
+    sizes = {tmp_path / "d.py": 300, tmp_path / "a.py": 10, tmp_path / "c.py": 200}
+    ordered = planning.order_largest_first(tasks, sizes.get)
+    assert next(ordered) == (3, ("docs", [tmp_path / "b.md"]))
+    assert created == [1]
+    assert [index for index, _ in ordered] == [0, 2, 1]
+
+
+def test_cli_plan(tmp_path, mock_api, monkeypatch):
+    monkeypatch.setitem(planning.PLANNING_CONFIG, "path", str(tmp_path / "calibration.json"))
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    repository_dir = tmp_path / "repo"
+    repository_dir.mkdir()
+    (repository_dir / "main.py").write_text("print('Hello')\n")
+    (repository_dir / "README.md").write_text("# Hello\n")
+
+    result = CliRunner().invoke(cli, [
+        str(repository_dir), "--api", mock_api.url, "--reports", str(tmp_path / "reports"), "--plan", "--jobs", "2"
+    ])
+    assert result.exit_code == 0
+
+    # Assert that the plan is printed without reviewing anything or leaving a report behind
+    assert "Plan: 2 review task(s) with 2 job(s)" in result.output
+    assert "Requests:          2" in result.output
+    assert mock_api.requests == []
+    assert not (tmp_path / "reports").exists()
+
+    # Assert that the review cache isn't opened either
+    assert not (tmp_path / "home").exists()
+
+
+def test_cli_report_order(tmp_path, mock_api, monkeypatch):
+    monkeypatch.setitem(planning.PLANNING_CONFIG, "path", str(tmp_path / "calibration.json"))
+    repository_dir = tmp_path / "repo"
+    repository_dir.mkdir()
+    (repository_dir / "a.py").write_text("print('a')\n")
+    (repository_dir / "b.py").write_text("print('b')\n" * 50)
+    (repository_dir / "c.py").write_text("print('c')\n" * 20)
+
+    reports = {}
+    for jobs in (1, 4):
+        reports_dir = tmp_path / f"reports_{jobs}"
+        result = CliRunner().invoke(cli, [
+            str(repository_dir), "--api", mock_api.url, "--reports", str(reports_dir), "--no-cache", "--jobs", str(jobs)
+        ])
+        assert result.exit_code == 0
+
+        report = next(reports_dir.glob("*.md")).read_text()
+        reports[jobs] = sorted(["a.py", "b.py", "c.py"], key=report.index)
+
+    # Assert that the number of jobs doesn't change the order of the report
+    assert reports[1] == reports[4] == ["a.py", "b.py", "c.py"]
+
+
+def test_cli_journal_while_reviewing(tmp_path, mock_api, monkeypatch):
+    monkeypatch.setitem(planning.PLANNING_CONFIG, "path", str(tmp_path / "calibration.json"))
+    repository_dir = tmp_path / "repo"
+    repository_dir.mkdir()
+
+    # The files found first are the smallest, so they are reviewed last
+    for index in range(10):
+        (repository_dir / f"file_{index}.py").write_text("print('Hello')\n" * (index + 1))
+
+    # Count the requests sent by the time every file is recorded in the journal
+    requests_at_records = []
+    record = journal.ProgressJournal.record
+
+    def counting_record(self, *args):
+        requests_at_records.append(len(mock_api.requests))
+        record(self, *args)
+
+    monkeypatch.setattr(journal.ProgressJournal, "record", counting_record)
+
+    result = CliRunner().invoke(cli, [
+        str(repository_dir), "--api", mock_api.url, "--reports", str(tmp_path / "reports"), "--no-cache", "--jobs", "2"
+    ])
+    assert result.exit_code == 0
+
+    # Assert that the first files are recorded before the last reviews are requested
+    assert len(requests_at_records) == 10
+    assert requests_at_records[0] < 10
+
+    # Assert that the report lists the files in the order they were found
+    report = next((tmp_path / "reports").glob("*.md")).read_text()
+    names = [f"file_{index}.py" for index in range(10)]
+    assert sorted(names, key=report.index) == sorted(names)
@@ -0,0 +1,26 @@
+
+import pytest
+
+from codebuddy.modules import ratelimit
+
+
+def test_requests_per_second():
+    rate_limiter = ratelimit.RateLimiter(requests_per_second=10)
+
+    # Assert that requests are spaced evenly
+    assert rate_limiter.reserve() == 0
+    assert rate_limiter.reserve() == pytest.approx(0.1, abs=0.01)
+    assert rate_limiter.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+def test_tokens_per_minute():
+    rate_limiter = ratelimit.RateLimiter(tokens_per_minute=600)
+
+    # Assert that requests wait once the bucket is empty (10 tokens per second)
+    assert rate_limiter.reserve(600) == 0
+    assert rate_limiter.reserve(100) == pytest.approx(10, abs=0.1)
+
+    # Assert that unused tokens are given back
+    rate_limiter.refund(200)
+    assert rate_limiter.reserve(0) == 0
+    assert rate_limiter.reserve(100) == 0
@@ -0,0 +1,85 @@
+
+from click.testing import CliRunner
+
+from codebuddy import cli
+from codebuddy.modules import planning
+from codebuddy.modules import render
+from codebuddy.modules import reports
+
+
+REVIEW = """# Review of `main.py`
+
+Found **2 problems**, see [the guide](https://example.com/guide).
+
+## Problems
+- The *loop* never ends
+  - check `i < n`
+1. Unused variable `snake_case_name`
+> Consider __refactoring__
+
+```python
+while True:  # **not bold**
+    pass
+```
+---
+"""
+
+RENDERED = """Review of main.py
+=================
+
+Found 2 problems, see the guide (https://example.com/guide).
+
+Problems
+--------
+• The loop never ends
+  • check i < n
+1. Unused variable snake_case_name
+│ Consider refactoring
+
+    while True:  # **not bold**
+        pass
+────────────────────────────────────────"""
+
+
+def test_render_markdown():
+    # Assert that the markup is removed and the structure is kept
+    assert render.render_markdown(REVIEW) == RENDERED
+    assert reports.ReportGenerator.markdown_to_text(REVIEW) == RENDERED
+
+    # Assert that colors are added with ANSI escape sequences, restoring the outer style after a nested one
+    assert render.render_markdown("**bold `code` text**", color=True) == (
+        "\033[1mbold \033[36mcode\033[0m\033[1m text\033[0m"
+    )
+
+
+def test_markdown_renderer_stream():
+    renderer = render.MarkdownRenderer()
+
+    # Assert that only complete lines are rendered
+    assert renderer.feed("- first **bo") == ""
+    assert renderer.feed("ld**\n- sec") == "• first bold\n"
+
+    # Assert that the last line is rendered when the text ends
+    assert renderer.close() == "• sec\n"
+
+    # Assert that text split into small pieces is rendered like the whole text
+    renderer = render.MarkdownRenderer()
+    pieces = [renderer.feed(REVIEW[i:i + 3]) for i in range(0, len(REVIEW), 3)]
+    assert "".join(pieces) + renderer.close() == RENDERED + "\n"
+
+
+def test_cli_stream_print(tmp_path, mock_api, monkeypatch):
+    monkeypatch.setitem(planning.PLANNING_CONFIG, "path", str(tmp_path / "calibration.json"))
+    repository_dir = tmp_path / "repo"
+    repository_dir.mkdir()
+    (repository_dir / "main.py").write_text("print('hello world')\n")
+    (repository_dir / "bin.txt").write_bytes(bytes(range(256)))
+
+    result = CliRunner().invoke(cli, [
+        str(repository_dir), "--api", mock_api.url, "--reports", str(tmp_path / "reports"), "--no-cache", "--stream", "--print"
+    ])
+    assert result.exit_code == 0
+
+    # Assert that only the reviewed file gets a header, the skipped binary file prints nothing
+    assert f"File: {repository_dir / 'main.py'}" in result.output
+    assert f"File: {repository_dir / 'bin.txt'}" not in result.output
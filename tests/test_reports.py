@@ -69,3 +69,65 @@ def test_report_generator():
     assert result_4 == True
     # Assert that the reports directory no longer exists on disk
     assert report_generator.reports_dir.exists() == False
+
+
+def test_report_generator_stream(tmp_path):
+    # Initialize the ReportGenerator with a temporary directory for reports
+    report_generator = reports.ReportGenerator(pathlib.Path('tests/fake_repo'), tmp_path)
+
+    # Write an entry piece by piece
+    chunks = report_generator.stream_report_entry(
+        pathlib.Path('tests/fake_repo/main.py'),
+        iter(["Test ", "report ", "1"])
+    )
+
+    # Assert that every piece is in the file once it has been yielded
+    assert next(chunks) == "Test "
+    with open(report_generator.report_file_path, "r") as f:
+        assert f.read() == "\n## File: tests/fake_repo/main.py\nTest "
+
+    assert list(chunks) == ["report ", "1"]
+
+    # Assert that the streamed entry has the same format as a regular one
+    with open(report_generator.report_file_path, "r") as f:
+        assert f.read() == "\n## File: tests/fake_repo/main.py\nTest report 1\n"
+
+    def failing_chunks():
+        yield "Test report 2"
+        raise RuntimeError("connection lost")
+
+    # Assert that an interrupted entry is marked in the report
+    with pytest.raises(RuntimeError):
+        list(report_generator.stream_report_entry(pathlib.Path('tests/fake_repo/README.md'), failing_chunks()))
+
+    with open(report_generator.report_file_path, "r") as f:
+        assert f.read().endswith("Test report 2\n\n*Review interrupted: connection lost*\n")
+
+
+def test_report_generator_sort_entries(tmp_path):
+    # Initialize the ReportGenerator with a temporary directory for reports
+    report_generator = reports.ReportGenerator(pathlib.Path('tests/fake_repo'), tmp_path)
+
+    # Add entries out of order, the first two with the same position (like the files of a batch)
+    report_generator.add_report_entry(pathlib.Path('tests/fake_repo/c.py'), "Test report c", position=2)
+    report_generator.add_report_entry(pathlib.Path('tests/fake_repo/d.py'), "Test report d", position=2)
+    report_generator.add_report_entry(pathlib.Path('tests/fake_repo/a.py'), "Test report a", position=0)
+    report_generator.add_report_entry(pathlib.Path('tests/fake_repo/b.py'), "Test report b", position=1)
+
+    # Assert that every entry is written as soon as it is added
+    with open(report_generator.report_file_path, "r") as f:
+        unsorted_data = f.read()
+    assert unsorted_data.index("c.py") < unsorted_data.index("a.py")
+
+    # Assert that the entries are moved into the order of their positions without changing the size of the report
+    assert report_generator.sort_entries() == True
+    with open(report_generator.report_file_path, "r") as f:
+        sorted_data = f.read()
+    assert len(sorted_data) == len(unsorted_data)
+    assert sorted_data == "".join(
+        f"\n## File: tests/fake_repo/{name}.py\nTest report {name}\n" for name in ("a", "b", "c", "d")
+    )
+
+    # Assert that entries in order are left as they are
+    report_generator.add_report_entry(pathlib.Path('tests/fake_repo/e.py'), "Test report e", position=4)
+    assert report_generator.sort_entries() == False
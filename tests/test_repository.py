@@ -1,4 +1,5 @@
 
+import git
 import pytest
 import pathlib
 
@@ -6,6 +7,10 @@ from codebuddy.modules import repository
 from codebuddy.modules.config import ALL_CATEGORIES
 
 
+# Author of the commits in test repositories
+AUTHOR = git.Actor("CodeBuddy", "codebuddy@example.com")
+
+
 def test_repository():
     # Create an instance of RepositoryTools with the path to the fake repository
     repo_tools = repository.RepositoryTools(
@@ -29,3 +34,211 @@ def test_repository():
 
     # Assert that the content of the file matches the expected string
     assert file_data == "print('hello world')"
+
+
+def test_repository_since(tmp_path):
+    # Create a git repository with a few committed files
+    repo = git.Repo.init(tmp_path)
+    for name in ("main.py", "utils.py", "README.md"):
+        (tmp_path / name).write_text(f"# {name}\n")
+    repo.index.add(["main.py", "utils.py", "README.md"])
+    first_commit = repo.index.commit("Initial commit", author=AUTHOR, committer=AUTHOR)
+
+    # Commit a change, then modify and add files without committing
+    (tmp_path / "utils.py").write_text("# changed\n")
+    repo.index.add(["utils.py"])
+    repo.index.commit("Change utils", author=AUTHOR, committer=AUTHOR)
+    (tmp_path / "README.md").write_text("# changed\n")
+    (tmp_path / "new.py").write_text("# new\n")
+
+    # Assert that only files changed since the first commit are categorized
+    repo_tools = repository.RepositoryTools(tmp_path, since=first_commit.hexsha)
+    files = repo_tools.get_files()
+    assert [path.name for path in files.get("code")] == ["new.py", "utils.py"]
+    assert [path.name for path in files.get("docs")] == ["README.md"]
+
+    # Assert that only uncommitted changes are found since HEAD
+    repo_tools = repository.RepositoryTools(tmp_path, since="HEAD")
+    assert [path.name for path in repo_tools.get_files().get("code")] == ["new.py"]
+
+
+def test_repository_ignore_rules(tmp_path, monkeypatch):
+    # Create a repository with nested .gitignore files and ignored trees
+    files = {
+        ".gitignore": "build/\n*.log\n",
+        ".git/info/exclude": "secret.py\n",
+        ".git/hooks/hook.py": "",
+        "main.py": "",
+        "secret.py": "",
+        "debug.log": "",
+        "build/generated.py": "",
+        "node_modules/package/index.js": "",
+        "reports/report.md": "",
+        "src/.gitignore": "ignored.py\n!keep.log\nnode_modules/\n",
+        "src/app.py": "",
+        "src/ignored.py": "",
+        "src/keep.log": "",
+        "src/lib/util.py": "",
+        "src/lib/ignored.py": "",
+        "src/node_modules/package/index.js": "",
+    }
+    for name, content in files.items():
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text(content)
+
+    # Record the directories that are listed
+    listed_dirs = []
+    original_scandir = repository.os.scandir
+
+    def scandir(path):
+        listed_dirs.append(pathlib.Path(path).relative_to(tmp_path).as_posix())
+        return original_scandir(path)
+
+    monkeypatch.setattr(repository.os, "scandir", scandir)
+
+    files = repository.RepositoryTools(tmp_path).get_files()
+
+    # Assert that the ignore rules of all levels are respected
+    assert [path.relative_to(tmp_path).as_posix() for path in files.get("code")] == [
+        "main.py", "node_modules/package/index.js", "src/app.py", "src/lib/util.py"
+    ]
+    assert [path.relative_to(tmp_path).as_posix() for path in files.get("docs")] == ["src/keep.log"]
+
+    # Assert that ignored directories are pruned without listing them
+    assert ".git" not in listed_dirs
+    assert "build" not in listed_dirs
+    assert "reports" not in listed_dirs
+    assert "src/node_modules" not in listed_dirs
+
+
+def test_repository_git_index(tmp_path, monkeypatch):
+    # Create a git repository with tracked, untracked, ignored and deleted files
+    repo = git.Repo.init(tmp_path)
+    for name in (".gitignore", "main.py", "deleted.py", "src/app.py"):
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text("build/\n" if name == ".gitignore" else "")
+    repo.index.add([".gitignore", "main.py", "deleted.py", "src/app.py"])
+    repo.index.commit("Initial commit", author=AUTHOR, committer=AUTHOR)
+
+    (tmp_path / "deleted.py").unlink()
+    (tmp_path / "untracked.py").write_text("")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "generated.py").write_text("")
+
+    # Assert that the directory is not walked
+    def walk_files(self):
+        raise AssertionError("The directory must not be walked")
+
+    monkeypatch.setattr(repository.RepositoryTools, "_walk_files", walk_files)
+
+    # Assert that the files are listed by git
+    files = repository.RepositoryTools(tmp_path).get_files()
+    assert sorted(path.relative_to(tmp_path).as_posix() for path in files.get("code")) == [
+        "main.py", "src/app.py", "untracked.py"
+    ]
+
+    # Assert that only the subtree of a nested directory is listed
+    files = repository.RepositoryTools(tmp_path / "src").get_files()
+    assert files.get("code") == [tmp_path / "src" / "app.py"]
+
+
+def test_clone_options(tmp_path):
+    # Create a repository with two commits, a tag and a large binary file
+    source_dir = tmp_path / "source"
+    repo = git.Repo.init(source_dir)
+    (source_dir / "docs").mkdir(parents=True)
+    (source_dir / "main.py").write_text("print('v1')\n")
+    (source_dir / "docs" / "README.MD").write_text("# Docs\n")
+    (source_dir / "image.bin").write_bytes(b"\0" * 100000)
+    repo.index.add(["main.py", "docs/README.MD", "image.bin"])
+    first_commit = repo.index.commit("Initial commit", author=AUTHOR, committer=AUTHOR)
+    repo.create_tag("v1")
+
+    (source_dir / "main.py").write_text("print('v2')\n")
+    repo.index.add(["main.py"])
+    repo.index.commit("Second commit", author=AUTHOR, committer=AUTHOR)
+
+    # Partial clones must be allowed by the server
+    with repo.config_writer() as config:
+        config.set_value("uploadpack", "allowFilter", "true")
+
+    # Clone the latest commit with only the reviewed files
+    clone_dir = tmp_path / "clone"
+    clone = repository.RepositoryTools.clone_from(
+        source_dir.as_uri(), clone_dir, depth=1, blobless=True, sparse=True
+    )
+
+    # Assert that the history is cut and the binary file is neither checked out nor downloaded
+    assert clone.git.rev_list("--count", "HEAD") == "1"
+    assert (clone_dir / "main.py").read_text() == "print('v2')\n"
+    assert not (clone_dir / "image.bin").exists()
+    objects = clone.git.rev_list("--objects", "--missing=print", "HEAD").splitlines()
+    missing = [line for line in objects if line.startswith("?")]
+    assert missing == ["?" + repo.head.commit.tree["image.bin"].hexsha]
+
+    # Assert that files outside of the sparse checkout are not listed
+    files = repository.RepositoryTools(clone_dir).get_files()
+    assert sorted(path.relative_to(clone_dir).as_posix() for path in files.get("code") + files.get("docs")) == [
+        "docs/README.MD", "main.py"
+    ]
+
+    # Assert that a tag and a commit can be cloned instead of the default branch
+    clone = repository.RepositoryTools.clone_from(source_dir.as_uri(), tmp_path / "tag", depth=1, ref="v1")
+    assert (tmp_path / "tag" / "main.py").read_text() == "print('v1')\n"
+
+    clone = repository.RepositoryTools.clone_from(source_dir.as_uri(), tmp_path / "commit", depth=1, ref=first_commit.hexsha)
+    assert clone.head.commit.hexsha == first_commit.hexsha
+    assert (tmp_path / "commit" / "main.py").read_text() == "print('v1')\n"
+
+
+def test_repository_rev(tmp_path, monkeypatch):
+    # Create a repository with a tagged commit and a later change, then a bare mirror of it
+    source_dir = tmp_path / "source"
+    repo = git.Repo.init(source_dir)
+    (source_dir / "src").mkdir(parents=True)
+    (source_dir / "src" / "main.py").write_text("print('v1')\r\n")
+    (source_dir / "README.md").write_text("# Docs\n")
+    (source_dir / "image.png").write_bytes(b"\x89PNG\0")
+    repo.index.add(["src/main.py", "README.md", "image.png"])
+    repo.index.commit("Initial commit", author=AUTHOR, committer=AUTHOR)
+    repo.create_tag("v1")
+
+    (source_dir / "src" / "main.py").write_text("print('v2')\n")
+    (source_dir / "src" / "utils.py").write_text("pass\n")
+    repo.index.add(["src/main.py", "src/utils.py"])
+    repo.index.commit("Second commit", author=AUTHOR, committer=AUTHOR)
+
+    mirror_dir = tmp_path / "mirror.git"
+    git.Repo.clone_from(source_dir.as_uri(), mirror_dir, mirror=True)
+
+    # The working tree must never be read
+    monkeypatch.setattr(repository, "read_text", None)
+
+    # Assert that the files of both revisions are read from the git objects of the mirror
+    old_tools = repository.RepositoryTools(mirror_dir, rev="v1")
+    new_tools = repository.RepositoryTools(mirror_dir, rev="HEAD")
+
+    assert old_tools.get_files().get("code") == [mirror_dir / "src" / "main.py"]
+    assert new_tools.get_files().get("code") == [mirror_dir / "src" / "main.py", mirror_dir / "src" / "utils.py"]
+    assert old_tools.get_files().get("docs") == [mirror_dir / "README.md"]
+
+    assert old_tools.get_file_data(mirror_dir / "src" / "main.py") == "print('v1')\n"
+    assert new_tools.get_file_data(mirror_dir / "src" / "main.py") == "print('v2')\n"
+    assert new_tools.get_file_size(mirror_dir / "src" / "utils.py") == 5
+
+    # Assert that all files are read by one git process
+    process = new_tools._git.cat_file_all
+    assert new_tools.get_file_data(mirror_dir / "src" / "utils.py") == "pass\n"
+    assert new_tools._git.cat_file_all is process
+
+    # Assert that only the files changed between the revisions are listed with since
+    changed_tools = repository.RepositoryTools(mirror_dir, since="v1", rev="HEAD")
+    assert changed_tools.get_files().get("code") == [mirror_dir / "src" / "main.py", mirror_dir / "src" / "utils.py"]
+    assert changed_tools.get_files().get("docs") == []
+
+    # Assert that an unknown revision is an error
+    with pytest.raises(git.GitCommandError):
+        repository.RepositoryTools(mirror_dir, rev="missing")
+
+    for repo_tools in (old_tools, new_tools, changed_tools):
+        repo_tools.close()
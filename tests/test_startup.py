@@ -0,0 +1,54 @@
+
+import re
+import sys
+import pathlib
+import subprocess
+
+
+# Root directory of the project, with the codebuddy.py script
+PROJECT_DIR = pathlib.Path(__file__).resolve().parent.parent
+
+# Dependencies that must not be loaded before the analysis starts
+HEAVY_MODULES = ["git", "requests", "httpx", "pathspec"]
+
+# Maximum time in milliseconds for importing the package (measured around 40 ms)
+IMPORT_BUDGET_MS = 150
+
+
+def run_help(*options):
+    # Show the help of the CLI with the given interpreter options
+    return subprocess.run(
+        [sys.executable, *options, "codebuddy.py", "--help"],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+
+def test_help_does_not_load_heavy_modules():
+    # List the modules loaded by the time the help is shown
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, runpy; sys.argv = ['codebuddy.py', '--help']\n"
+         "try:\n    runpy.run_path('codebuddy.py', run_name='__main__')\nexcept SystemExit:\n    pass\n"
+         "print(' '.join(sys.modules), file=sys.stderr)"],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    loaded = set(result.stderr.split())
+
+    # Assert that the help is shown without the dependencies of the analysis
+    assert "Usage:" in result.stdout
+    assert [module for module in HEAVY_MODULES if module in loaded] == []
+
+
+def test_import_time_budget():
+    # The last line of -X importtime is the cumulative time of the top-level package
+    result = run_help("-X", "importtime")
+    match = re.search(r"\|\s*(\d+)\s*\|\s*src\s*$", result.stderr, re.MULTILINE)
+
+    # Assert that the package is imported within the budget
+    assert match is not None
+    assert int(match.group(1)) / 1000 < IMPORT_BUDGET_MS